@@ -0,0 +1,84 @@
+#   bench_fade.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+#   Measures fade frames per second of the list and numpy engines
+#   at 512, 4096 and 32768 channels and checks that both engines
+#   compute the same levels.
+#
+#   python3 bench/bench_fade.py [seconds per measurement]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pylx"))
+
+from LXCues import LXCue, LXLiveCue, numpy
+
+CHANNELS = (512, 4096, 32768)
+
+#####
+#     fadingCue returns a live cue partway into a fade between two random looks
+#####
+
+def fadingCue(channels, engine):
+    random.seed(channels)
+    livecue = LXLiveCue(channels, 512, engine)
+    a = LXCue(channels)
+    b = LXCue(channels)
+    for i in range(channels):
+        a.livestate[i] = random.uniform(0, 100)
+        b.livestate[i] = random.choice([0, random.uniform(0, 100)])
+    livecue.prepareFade(a)
+    livecue.fadeFrame(1.0, 1.0)
+    livecue.prepareFade(b)
+    return livecue
+
+#####
+#     fadeStates returns the levels of several frames of the fade
+#####
+
+def fadeStates(livecue):
+    states = []
+    for k in range(11):
+        livecue.fadeFrame(k/10.0, (k*0.07) % 1)
+        states.append([float(level) for level in livecue.livestate])
+    return states
+
+def framesPerSecond(livecue, seconds):
+    frames = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        livecue.fadeFrame(0.3, 0.6)
+        frames += 1
+    return frames / (time.perf_counter() - start)
+
+def main(seconds):
+    engines = ["list"]
+    if numpy != None:
+        engines.append("numpy")
+    else:
+        print("numpy is not installed, only the list engine is measured")
+    identical = True
+    print("channels  " + "".join("%14s" % (e + " fps") for e in engines))
+    for channels in CHANNELS:
+        states = []
+        fps = []
+        for engine in engines:
+            livecue = fadingCue(channels, engine)
+            states.append(fadeStates(livecue))
+            fps.append(framesPerSecond(livecue, seconds))
+        same = all(s == states[0] for s in states)
+        identical = identical and same
+        print("%8d  " % channels + "".join("%14.0f" % f for f in fps) + ("" if same else "  levels differ"))
+    return identical
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    sys.exit(0 if main(seconds) else 1)
@@ -0,0 +1,83 @@
+#   bench_osc_decode.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+#   Measures OSCListener.decodeMessage in messages per second on one core
+#   for typical messages and checks the 50k messages per second target.
+#   Then sends 50000 messages in one second through a socket and the reactor
+#   and counts how many reach the delegate.
+#
+#   python3 bench/bench_osc_decode.py [port]
+
+import os
+import socket
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "pylx"))
+
+from OSCListener import OSCListener
+
+TARGET = 50000          # messages per second
+
+def oscString(s):
+    b = s.encode('utf-8')
+    return b + bytes(4 - len(b) % 4)
+
+MESSAGES = [
+    ("/1/dmx/12 f", oscString("/1/dmx/12") + oscString(",f") + struct.pack(">f", 0.75)),
+    ("/cue/12/start si", oscString("/cue/12/start") + oscString(",si") + oscString("go") + struct.pack(">i", 1)),
+    ("/0/dmx ib (512 byte blob)", oscString("/0/dmx") + oscString(",ib") + struct.pack(">ii", 1, 512) + bytes(512)),
+]
+
+def decodeRate(listener, message, count=200000):
+    data = bytearray(message)
+    n = len(data)
+    start = time.perf_counter()
+    for i in range(count):
+        listener.decodeMessage(data, 0, n)
+    return count / (time.perf_counter() - start)
+
+class Counter(object):
+
+    def __init__(self):
+        self.received = 0
+
+    def receivedOSC(self, addressPattern, args):
+        self.received += 1
+
+def socketRate(port, message, count=TARGET):
+    listener = OSCListener()
+    counter = Counter()
+    listener.startListening(port, counter)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    start = time.perf_counter()
+    for i in range(count):
+        sender.sendto(message, ("127.0.0.1", port))
+        if i % 50 == 0:
+            while time.perf_counter() - start < i / count:      # paced over one second
+                pass
+    time.sleep(0.5)
+    listener.stopListening()
+    sender.close()
+    return counter.received
+
+def main(port):
+    listener = OSCListener()
+    ok = True
+    for name, message in MESSAGES:
+        rate = decodeRate(listener, message)
+        ok = ok and rate >= TARGET
+        print("%-28s %8.0f msg/s" % (name, rate))
+    received = socketRate(port, MESSAGES[0][1])
+    print("socket and reactor: %d of %d messages received in one second" % (received, TARGET))
+    return ok
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 17688
+    sys.exit(0 if main(port) else 1)
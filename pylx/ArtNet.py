@@ -10,11 +10,14 @@
 
 
 import socket
+import struct
 import threading
 import time
 import ipaddress
+import heapq
 from select import select
 from CTNetUtil import CTNetUtil
+from CTReactor import CTReactor
 
 ##################################################################################
 #                               DMXInterface
@@ -24,12 +27,27 @@ from CTNetUtil import CTNetUtil
 ##################################################################################
 
 class DMXInterface(object):
+
+    MAX_PACKET = 2048       # receive size, larger than any DMX over UDP packet
+    RING_SIZE = 8           # number of receive buffers
     
     def __init__(self):
         self.send_thread = None
-        self.listen_thread = None
         self.lock = threading.Lock()
+        self.send_event = threading.Event()     # set to wake the send thread
+        self.sending = False
+        self.listening = False
+        self.refresh_interval = 1.0     # keep-alive, unchanged output is re-sent this often
         self.last_send_time = 0.0
+        self.frames_sent = 0            # frames written to the network or device
+        self.frames_suppressed = 0      # frames not sent because nothing changed
+        self.frame = DMXFrameBuffer()   # hands frames from the render thread to the send thread
+        self.transmitter = None     # DMXTransmitter for network interfaces
+        self.input = None           # DMXInputMerge that receives DMX input
+        self.ring = [memoryview(bytearray(DMXInterface.MAX_PACKET)) for i in range(DMXInterface.RING_SIZE)]
+        self.ringindex = 0
+        self.data = None            # memoryview of the packet being processed
+        self.recdaddr = None
         self.ok = False
 
 ########################################
@@ -43,22 +61,57 @@ class DMXInterface(object):
 
 #########################################
 #
-#   setDMXValue   OVERRIDE THIS METHOD
+#   setDMXValue
 #      set a single slot in the DMX output stream
+#      address is 1 to the size of the frame
 #
 #########################################
     def setDMXValue(self, address, value):
-        print ("SetDMXValue")
+        self.frame.setValue(address-1, value)
 
 #########################################
 #
-#   setDMXValues   OVERRIDE THIS METHOD
+#   setDMXValues
 #      set values for all DMX slots
+#      values is copied into the frame buffer's back buffer and published,
+#      the send thread picks up the newest frame when it transmits
+#      the length of values is the length of the frame, slots past its
+#      end are not sent (each protocol pads to its minimum length)
 #
 #########################################
     def setDMXValues(self, values):
-        print ("setDMXValues")
-        self.sending = False
+        self.frame.write(values)
+
+#########################################
+#
+#   getDMXValue
+#      returns the value (0-255) of a slot in the last frame written
+#
+#########################################
+    def getDMXValue(self, address):
+        return self.frame.value(address-1)
+
+########################################
+#
+#   setRefreshInterval
+#      sets the keep-alive time in seconds
+#      Art-Net nodes may stop output if they receive nothing for 4 seconds
+#
+#########################################
+    def setRefreshInterval(self, seconds):
+        if seconds <= 0 or seconds > 4.0:
+            seconds = 1.0
+        self.refresh_interval = seconds
+        self.send_event.set()
+
+########################################
+#
+#   statsString
+#      returns a description of the frame counters
+#
+#########################################
+    def statsString(self):
+        return "sent " + str(self.frames_sent) + " suppressed " + str(self.frames_suppressed) + " skipped " + str(self.frame.skipped)
 
 ########################################
 #
@@ -68,6 +121,7 @@ class DMXInterface(object):
 #########################################
     def startSending(self):
         self.sending = True
+        self.send_event.clear()
         if self.send_thread is None:
             self.send_thread = threading.Thread(target=self.send)
             self.send_thread.daemon = True
@@ -77,41 +131,106 @@ class DMXInterface(object):
 #
 #   send
 #      method to be attached to a thread (don't call directly)
-#      periodically calls sendDMXNow,
-#      you can call sendDMXNow directly to force an immediate update
+#      calls transmitFrame when a new frame has been published
+#      calls refreshDMX if nothing has been sent for refresh_interval
+#      waits on send_event which is set by sendDMXNow and stopSending
 #
 #########################################
     def send(self):
         while self.sending:
             st = time.time() - self.last_send_time
-            if  st >= 2:
+            if self.frame.fresh or st >= self.refresh_interval:
                 try:
-                    self.sendDMXNow()
+                    self.transmitFrame(not self.frame.fresh)
                 except:
                     self.sending = False
             else:
-                time.sleep(2-st)
+                self.send_event.wait(self.refresh_interval-st)
+                self.send_event.clear()
         self.send_thread = None
         self.sending = False
 
 #########################################
 #
-#   sendDMXNow   OVERRIDE THIS METHOD
-#      sends a packet containing DMX data
+#   refreshDMX
+#      sends the current DMX data even if it has not changed
+#      (keep-alive)
+#
+#########################################
+    def refreshDMX(self):
+        self.transmitFrame(True)
+
+#########################################
+#
+#   sendDMXNow
+#      sends the newest frame if it has changed
+#      if the send thread is running, it is woken to send the frame
+#      so that the caller (the render thread) never waits for output
 #
 #########################################
     def sendDMXNow(self):
-        print ("sendDMXNow")
+        if self.send_thread != None:
+            self.send_event.set()
+        else:
+            self.transmitFrame(False)
+
+#########################################
+#
+#   transmitFrame   OVERRIDE THIS METHOD
+#      takes the newest frame from self.frame (if there is one)
+#      and sends what has changed, or everything if refresh is True
+#      called by only one thread at a time (the send thread once it is running)
+#
+#########################################
+    def transmitFrame(self, refresh):
+        print ("transmitFrame")
+
+#########################################
+#
+#   blankDroppedSlots is called by copyFrame when universe u is shortened to length
+#   nodes hold the last level of a slot that is no longer sent, so the dropped
+#   slots are zeroed and sent once at the old length before the packet shrinks
+#   returns the length to send
+#   for subclasses with per-universe send_buffers, lengths, changed and blanking lists
+#   start is the offset of the first slot in the packet
+#
+#########################################
+    def blankDroppedSlots(self, u, start, length):
+        old = self.lengths[u]
+        if length < old:
+            buffer = self.send_buffers[u]
+            if any(buffer[start+length:start+old]):
+                buffer[start+length:start+old] = bytes(old-length)
+                self.changed[u] = True
+                self.blanking[u] = True
+                return old
+        return length
+
+#########################################
+#
+#   packetKey returns the transmitter key for the packet of universe u
+#   a packet blanking dropped slots is never replaced by the next (shorter) one
+#
+#########################################
+    def packetKey(self, u):
+        if self.blanking[u]:
+            self.blanking[u] = False
+            return None
+        return u
 
 #########################################
 #
 #   stopSending
-#      ends the sending thread by setting a flag
+#      ends the sending thread by clearing the sending flag
+#      and setting send_event, then waits for the thread to exit
 #
 #########################################
     def stopSending(self):
-        while self.send_thread != None:
-            self.sending = False
+        self.sending = False
+        self.send_event.set()
+        thread = self.send_thread
+        if thread != None and thread != threading.current_thread():
+            thread.join()
 
 #########################################
 #
@@ -122,52 +241,54 @@ class DMXInterface(object):
     def close(self):
         self.stopSending()
         self.stopListening()
+        if self.transmitter != None:
+            self.transmitter.stop()
         self.udpsocket.close()
 
 #########################################
 #
-#   startListening creates a thread that runs the listen() method
+#   startListening registers the socket with the shared reactor
+#   readPacket is called by the reactor thread as soon as a packet arrives
 #
 #########################################
     
     def startListening(self):
-        self.listening = True
-        if ( self.listen_thread is None ):
-            self.listen_thread = threading.Thread(target=self.listen)
-            self.listen_thread.daemon = True
-            self.listen_thread.start()
+        if not self.listening:
+            self.listening = True
+            CTReactor.shared().register(self.udpsocket, self.readPacket)
 
 #########################################
 #
-#   stopListening sets a flag which will cause the listen loop to end on the next pass
+#   stopListening removes the socket from the reactor
 #   setting the delegate to None prevents messages from being sent after stopListening
 #   is called.
 #
 #########################################
     def stopListening(self):
         self.delegate = None
-        self.listening = False
+        if self.listening:
+            self.listening = False
+            CTReactor.shared().unregister(self.udpsocket)
         
 #########################################
 #
-#   listen contains a loop that runs while the self.listening flag is True
-#   listen uses select to determine if there is data available from the port
-#   if there is, packetReceived is called
-#   if not, the thread sleeps for a tenth of a second
+#   readPacket reads the available packets and calls packetReceived for each
+#   packets are received into the next buffer of a ring of preallocated buffers
+#   self.data is a memoryview of the packet in its buffer, it stays valid
+#   until RING_SIZE more packets have been received
+#   only the reactor thread reads, so there is no lock
 #
 #########################################
-    def listen(self):
-        input = [self.udpsocket]
-
-        while self.listening:
-            inputready,outputready,exceptready = select(input,[],[],0)
-            if ( len(inputready) == 1 ):
-                with self.lock:
-                    self.data, self.recdaddr = self.udpsocket.recvfrom(256)
-                self.packetReceived()
-            else:
-                time.sleep(0.1)
-        self.listen_thread = None
+    def readPacket(self):
+        for i in range(DMXInterface.RING_SIZE):
+            view = self.ring[self.ringindex]
+            try:
+                n, self.recdaddr = self.udpsocket.recvfrom_into(view)
+            except (BlockingIOError, InterruptedError):
+                return
+            self.ringindex = (self.ringindex + 1) % DMXInterface.RING_SIZE
+            self.data = view[0:n]
+            self.packetReceived()
 
 #########################################
 #
@@ -178,11 +299,296 @@ class DMXInterface(object):
     def packetReceived(self):
         print ( self.data )
 
+##################################################################################
+#                               DMXFrameBuffer
+#
+#           Triple buffer that hands complete DMX frames from the
+#           render thread to the send thread.
+#
+#           The writer fills the back buffer with one slice copy and then
+#           publishes it by swapping it with the pending buffer.  The reader
+#           takes the pending buffer by swapping it with the front buffer,
+#           which it owns until its next take.  So the writer never writes
+#           a buffer that is being sent and a frame is only ever seen whole.
+#           If the writer publishes again before the reader takes, the
+#           older pending frame is replaced (counted in skipped).
+#           Each buffer has a length, the number of slots written to it.
+#
+#           The lock is only held to swap indexes, never while copying
+#           or sending, so neither side waits for the other.
+#           There should be one writer thread and one reader thread.
+#
+##################################################################################
+
+class DMXFrameBuffer(object):
+
+    def __init__(self, size=512):
+        self.swaplock = threading.Lock()
+        self.frames = [bytearray(size) for i in range(3)]
+        self.lengths = [size, size, size]   # slots in use in each buffer
+        self.back = 0           # index of the buffer being written
+        self.pending = 1        # index of the newest published frame
+        self.front = 2          # index of the frame being sent
+        self.last = 1           # index of the last frame written (pending or front)
+        self.fresh = False      # True if pending has not been taken
+        self.published = 0
+        self.skipped = 0        # frames replaced before they were taken
+
+    def size(self):
+        return len(self.frames[self.back])
+
+#########################################
+#
+#   write copies values into the back buffer and publishes it
+#   the length of the frame is len(values)
+#   if it is longer than the buffers, they grow
+#
+#########################################
+    def write(self, values):
+        n = len(values)
+        if n > self.size():
+            self.resize(n)
+        self.frames[self.back][0:n] = values
+        self.lengths[self.back] = n
+        self.publish()
+
+#########################################
+#
+#   setValue changes a single slot (index 0 based) of the last frame
+#   and publishes the result
+#
+#########################################
+    def setValue(self, index, value):
+        if index >= self.size():
+            self.resize(index+1)
+        back = self.frames[self.back]
+        back[:] = self.frames[self.last]
+        back[index] = value
+        self.lengths[self.back] = max(self.lengths[self.last], index+1)
+        self.publish()
+
+    def value(self, index):
+        if index < self.lengths[self.last]:
+            return self.frames[self.last][index]
+        return 0
+
+    def publish(self):
+        with self.swaplock:
+            if self.fresh:
+                self.skipped += 1
+            self.back, self.pending = self.pending, self.back
+            self.last = self.pending
+            self.fresh = True
+            self.published += 1
+
+#########################################
+#
+#   take returns a memoryview of the newest published frame (its length
+#   is the frame's length) or None if nothing has been published since
+#   the last take
+#   the returned buffer is not written until the next take
+#
+#########################################
+    def take(self):
+        with self.swaplock:
+            if not self.fresh:
+                return None
+            self.front, self.pending = self.pending, self.front
+            self.last = self.front
+            self.fresh = False
+            return memoryview(self.frames[self.front])[0:self.lengths[self.front]]
+
+#########################################
+#
+#   resize makes all three buffers size slots (writer thread only)
+#   the reader keeps the buffer it already took
+#
+#########################################
+    def resize(self, size):
+        with self.swaplock:
+            last = self.frames[self.last]
+            frames = [bytearray(size) for i in range(3)]
+            n = min(size, len(last))
+            for frame in frames:
+                frame[0:n] = last[0:n]
+            self.frames = frames
+            self.lengths = [min(size, l) for l in self.lengths]
+
+##################################################################################
+#                               DMXTransmitter
+#
+#           Sends finished packets from its own thread so that the render
+#           thread never waits for network I/O.
+#
+#           Packets are posted with a key (for instance a universe).  If a
+#           packet with the same key has not been sent yet, it is replaced,
+#           so a slow network drops stale frames instead of queueing them.
+#           The lock only protects the pending packets, it is never held
+#           while sending.  The socket is non-blocking.  An error sending to
+#           one target is counted for that target and the next target is sent.
+#
+##################################################################################
+
+class DMXTransmitter(object):
+
+    def __init__(self, udpsocket):
+        self.udpsocket = udpsocket
+        self.lock = threading.Lock()
+        self.pending = {}               # key -> (packet, list of (ip, port) targets)
+        self.serial = 0                 # makes unique keys for packets that must all be sent
+        self.wake_event = threading.Event()
+        self.transmit_thread = None
+        self.running = False
+        self.packets_sent = 0
+        self.errors = {}                # (ip, port) -> [error count, last error]
+
+#########################################
+#
+#   start creates the transmit thread
+#   stop ends it after sending what is pending
+#
+#########################################
+    def start(self):
+        self.running = True
+        if self.transmit_thread is None:
+            self.transmit_thread = threading.Thread(target=self.transmit)
+            self.transmit_thread.daemon = True
+            self.transmit_thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wake_event.set()
+        thread = self.transmit_thread
+        if thread != None and thread != threading.current_thread():
+            thread.join()
+
+#########################################
+#
+#   post queues packet to be sent to each (ip, port) in targets
+#   replaces an unsent packet with the same key
+#   the replacement moves to the end so packets go out in the order posted
+#   (a sync packet always follows the universes posted before it)
+#   if key is None, the packet is always sent
+#
+#########################################
+    def post(self, key, packet, targets):
+        with self.lock:
+            if key == None:
+                key = ("once", self.serial)
+                self.serial += 1
+            else:
+                self.pending.pop(key, None)
+            self.pending[key] = (packet, targets)
+        self.wake_event.set()
+
+#########################################
+#
+#   transmit is attached to the transmit thread (don't call directly)
+#   takes everything pending and sends it without holding the lock
+#
+#########################################
+    def transmit(self):
+        while self.running or len(self.pending) > 0:
+            self.wake_event.wait()
+            self.wake_event.clear()
+            with self.lock:
+                batch = self.pending
+                self.pending = {}
+            for packet, targets in batch.values():
+                for target in targets:
+                    self.sendPacket(packet, target)
+        self.transmit_thread = None
+
+#########################################
+#
+#   sendPacket sends one packet to one target
+#   if the socket buffer is full, waits at most 2ms for it to drain
+#
+#########################################
+    def sendPacket(self, packet, target):
+        try:
+            try:
+                self.udpsocket.sendto(packet, target)
+            except BlockingIOError:
+                select([], [self.udpsocket], [], 0.002)
+                self.udpsocket.sendto(packet, target)
+            self.packets_sent += 1
+        except OSError as e:
+            self.targetError(target, e)
+
+    def targetError(self, target, e):
+        if target in self.errors:
+            self.errors[target][0] += 1
+            self.errors[target][1] = e
+        else:
+            self.errors[target] = [1, e]
+            print ("Send error ", target[0], e)
+
+##################################################################################
+#                               DMXInterfaceGroup
+#
+#           Sends the same output frame through several interfaces
+#           (for instance Art-Net and sACN) so the frame is rendered once
+#
+##################################################################################
+
+class DMXInterfaceGroup(DMXInterface):
+
+    def __init__(self, interfaces):
+        super().__init__()
+        self.interfaces = interfaces
+        self.ok = all(i.ok for i in interfaces)
+
+    def setDMXValue(self, address, value):
+        for i in self.interfaces:
+            i.setDMXValue(address, value)
+
+    def setDMXValues(self, values):
+        for i in self.interfaces:
+            i.setDMXValues(values)
+
+    def sendDMXNow(self):
+        for i in self.interfaces:
+            i.sendDMXNow()
+
+    def getDMXValue(self, address):
+        return self.interfaces[0].getDMXValue(address)
+
+    def setRefreshInterval(self, seconds):
+        for i in self.interfaces:
+            i.setRefreshInterval(seconds)
+
+    def startSending(self):
+        for i in self.interfaces:
+            i.startSending()
+
+    def stopSending(self):
+        for i in self.interfaces:
+            i.stopSending()
+
+    def statsString(self):
+        return "\n".join(type(i).__name__ + " " + i.statsString() for i in self.interfaces)
+
+    def close(self):
+        for i in self.interfaces:
+            i.close()
+
 ##################################################################################
 #                               ArtNetInterface
 #
 #           Implements Art-Net output
 #
+#           Output can span several consecutive universes.  DMX values
+#           are set as one frame of universes*512 slots.  Universe i of the
+#           frame is sent to Port-Address net/subnet/universe + i
+#           and has its own ArtDmx buffer and sequence counter.
+#
+#           When sync is active, every ArtDmx of a frame's batch carries the
+#           same frame sequence number and an ArtSync follows the batch so
+#           that nodes output all universes of the frame together.
+#           sync="auto" sends ArtSync only to nodes whose ArtPollReply
+#           shows Art-Net 3/4 support, "on" always sends it, "off" never.
+#
 ##################################################################################
 
 class ArtNetInterface(DMXInterface):
@@ -194,11 +600,24 @@ class ArtNetInterface(DMXInterface):
 #
 #########################################
 
-    def __init__(self, iface_ip, target="auto", net=0, subnet=0, univ=0):
+    MAX_UNIVERSES = 64
+    ARTNET_HEADER = struct.Struct("<8sH")         # ID, OpCode (little endian)
+    ARTNET_ID = b"Art-Net\x00"
+    ARTDMX_HEADER = struct.Struct("<BBHBB")       # Sequence, Physical, Port-Address, Length hi/lo (at 12)
+
+    def __init__(self, iface_ip, target="auto", net=0, subnet=0, univ=0, universes=1, sync="auto"):
         super().__init__()
-        self.seqcounter = 0
+        self.handlers = {                           # OpCode -> method called by packetReceived
+            0x5000: self.artDMXReceived,
+            0x2000: self.sendArtPollReply,
+            0x2100: self.artPollReplyReceived
+        }
+        self.ignored = {}                           # OpCode -> count of packets with no handler
         self.prcounter = 0
-        self.target_list = []
+        self.sync = sync
+        self.frame_sequence = 0     # sequence shared by a synchronized batch
+        self.nodes = ArtNetNodeTable(self.port(), self)    # nodes found by ArtPoll
+        self.broadcast_addresses = {}       # ip -> broadcast address for poll replies
         self.localip = iface_ip
         if ( target == "auto" ):
              self.unicast_ip = None
@@ -216,10 +635,14 @@ class ArtNetInterface(DMXInterface):
         
         self.setupSocket()
         self.setupSendBuffer()
+        self.setUniverseCount(universes)
+        self.frame.resize(self.universes*512)
         self.setupArtPollBuffer()
         self.setupArtPollReplyBuffer()
+        self.setupArtSyncBuffer()
         
-        self.startListening()
+        if self.ok:
+            self.startListening()
 
 ########################################
 #
@@ -236,7 +659,17 @@ class ArtNetInterface(DMXInterface):
         self.artnet_subnet = 0x0F & sn
 
     def setArtnetUniverse(self, u):
-        self.artnet_universe = 0x07 & u
+        self.artnet_universe = 0x0F & u
+
+########################################
+#
+#   portAddress returns the 15 bit Port-Address (net/subnet/universe)
+#   for universe index i of the output frame
+#
+#########################################
+    def portAddress(self, i=0):
+        base = (self.artnet_net << 8) | (self.artnet_subnet << 4) | self.artnet_universe
+        return (base + i) & 0x7FFF
 
 ########################################
 #
@@ -265,7 +698,8 @@ class ArtNetInterface(DMXInterface):
             self.udpsocket.bind(("0.0.0.0",self.port()))
             
             self.udpsocket.setblocking(False)
-            self.udpsocket.settimeout(1)
+            self.transmitter = DMXTransmitter(self.udpsocket)
+            self.transmitter.start()
             self.ok = True
          except Exception as e:
             print ("Socket Error ", e)
@@ -273,30 +707,60 @@ class ArtNetInterface(DMXInterface):
 ########################################
 #
 #   setupSendBuffer
-#   pre-fill header info for sending DMX packets
-#   send_buffer also holds DMX data for output
+#   creates the list of ArtDmx packet buffers, one for each universe
+#   send_buffer is the first universe's buffer
 #
 #########################################
     def setupSendBuffer(self):
-        self.send_buffer = bytearray(529)
-        try:
-            self.send_buffer[0:6] = "Art-Net"
-        except:
-            self.send_buffer[0:6] = bytes("Art-Net", 'utf-8')
-            #python 3
-        self.send_buffer[7] = 0
-        self.send_buffer[8] = 0      #opcode l/h
-        self.send_buffer[9] = 0x50
-        self.send_buffer[10] = 0     #version h/l
-        self.send_buffer[11] = 14
-        self.send_buffer[12] = 0     #sequence
-        self.send_buffer[13] = 0     #physical
-        self.send_buffer[14] = self.artnet_net # 7bits
-        self.send_buffer[15] = self.artnet_universe | (self.artnet_subnet << 4)  #subnet upper 4 bits - universe lower 4 bits
-        self.send_buffer[16] = 2     #dmxcount h/l
-        self.send_buffer[17] = 0
-        for i in range(512):
-            self.send_buffer[i+18] = 0
+        self.send_buffers = []
+        self.seqcounters = []
+        self.changed = []           # True if universe has changed since it was sent
+        self.last_sent = []         # time.time() each universe was last sent
+        self.lengths = []           # slots sent in each universe's ArtDmx packet
+        self.blanking = []          # True if the packet zeroes slots dropped from the frame
+        self.setUniverseCount(1)
+        self.send_buffer = self.send_buffers[0]
+
+########################################
+#
+#   newSendBuffer
+#   pre-fill header info for sending DMX packets to Port-Address
+#   the buffer also holds DMX data for output
+#
+#########################################
+    def newSendBuffer(self, portaddress):
+        buffer = bytearray(530)
+        buffer[0:8] = bytes("Art-Net\x00", 'utf-8')
+        buffer[8] = 0      #opcode l/h
+        buffer[9] = 0x50
+        buffer[10] = 0     #version h/l
+        buffer[11] = 14
+        buffer[12] = 0     #sequence
+        buffer[13] = 0     #physical
+        buffer[14] = portaddress & 0xFF            #SubUni subnet upper 4 bits - universe lower 4 bits
+        buffer[15] = (portaddress >> 8) & 0x7F     #Net 7bits
+        buffer[16] = 2     #dmxcount h/l
+        buffer[17] = 0
+        return buffer
+
+########################################
+#
+#   setUniverseCount
+#   adds buffers so that there is one for each of n universes
+#   (buffers are not removed so that their sequence continues)
+#
+#########################################
+    def setUniverseCount(self, n):
+        if n > ArtNetInterface.MAX_UNIVERSES:
+            n = ArtNetInterface.MAX_UNIVERSES
+        while len(self.send_buffers) < n:
+            self.send_buffers.append(self.newSendBuffer(self.portAddress(len(self.send_buffers))))
+            self.seqcounters.append(0)
+            self.changed.append(True)
+            self.last_sent.append(0.0)
+            self.lengths.append(512)
+            self.blanking.append(False)
+        self.universes = max(n, 1)
 
 ########################################
 #
@@ -319,6 +783,22 @@ class ArtNetInterface(DMXInterface):
         self.artpoll_buffer[12] = 6     #talk to me
         self.artpoll_buffer[13] = 0
 
+########################################
+#
+#   setupArtSyncBuffer
+#   pre-fill ArtSync packet
+#
+#########################################
+    def setupArtSyncBuffer(self):
+        self.artsync_buffer = bytearray(14)
+        self.artsync_buffer[0:8] = bytes("Art-Net\x00", 'utf-8')
+        self.artsync_buffer[8] = 0      #opcode l/h
+        self.artsync_buffer[9] = 0x52
+        self.artsync_buffer[10] = 0     #version h/l
+        self.artsync_buffer[11] = 14
+        self.artsync_buffer[12] = 0     #aux1
+        self.artsync_buffer[13] = 0     #aux2
+
 ########################################
 #
 #   setupArtPollReplyBuffer
@@ -374,87 +854,162 @@ class ArtNetInterface(DMXInterface):
 #########################################
     def send(self):
         while self.sending:
-            st = time.time() - self.last_send_time
-            if  st >= 2:
+            rt = self.refreshDue()
+            if self.frame.fresh or rt <= 0:
                 try:
-                    self.sendDMXNow()
+                    self.transmitFrame(rt <= 0)
                 except:
                     self.sending = False
             else:
                 pt = time.time() - self.last_poll_time
                 if  pt >= 4:
-                    self.removeExpiredTargets()
+                    self.nodes.expire()
                     self.sendArtPoll()
                     self.last_poll_time = time.time()
                 else:
-                    time.sleep(2-st)
+                    self.send_event.wait(min(rt, 4-pt))
+                    self.send_event.clear()
         self.send_thread = None
         self.sending = False
 
 ########################################
 #
 #   updateCounter
-#   increment packet sequence counter
+#   increment packet sequence counter of universe index u
+#   zero is reserved to mean sequence is disabled
 #
 #########################################
-    def updateCounter(self):
-        self.seqcounter += 1
-        if self.seqcounter > 255:
-            self.seqcounter = 0
-        self.send_buffer[12] = self.seqcounter
+    def updateCounter(self, u=0):
+        c = self.seqcounters[u] + 1
+        if c > 255:
+            c = 1
+        self.seqcounters[u] = c
+        self.send_buffers[u][12] = c
 
 ########################################
 #
-#   sendDMXNow
-#   updates the counter and sends ArtDMX packet
+#   transmitFrame
+#   copies the newest frame into the ArtDmx packet buffers and
+#   sends an ArtDmx packet for each universe that has changed
+#   since it was last sent, unchanged universes are counted as suppressed
+#   if refresh is True, also sends each universe that has not been
+#   sent for refresh_interval (keep-alive)
+#
+#   if any of the batch's targets use sync, the whole batch gets one
+#   frame sequence number and is followed by an ArtSync to those targets
 #
 #########################################
-    def sendDMXNow(self):
-        self.updateCounter()
+    def transmitFrame(self, refresh):
+        now = time.time()
         with self.lock:
-            if ( self.unicast_ip == None ):
-                for n in self.target_list:
-                    self.udpsocket.sendto(self.send_buffer, (n.address, self.port()))
-            else:
-                self.udpsocket.sendto(self.send_buffer, ( self.unicast_ip, self.port()))
-        self.last_send_time = time.time()
+            frame = self.frame.take()
+            if frame != None:
+                self.copyFrame(frame)
+            batch = []
+            synctargets = set()
+            for u in range(self.universes):
+                if self.changed[u] or ( refresh and now - self.last_sent[u] >= self.refresh_interval ):
+                    self.changed[u] = False
+                    self.last_sent[u] = now
+                    targets = self.targetsForUniverse(u)
+                    synctargets.update(self.syncTargets(u))
+                    batch.append((u, targets))
+                elif not refresh:
+                    self.frames_suppressed += 1
+            if len(synctargets) > 0:
+                self.frame_sequence += 1
+                if self.frame_sequence > 255:
+                    self.frame_sequence = 1
+            for u, targets in batch:
+                if len(synctargets) > 0:
+                    self.seqcounters[u] = self.frame_sequence
+                    self.send_buffers[u][12] = self.frame_sequence
+                else:
+                    self.updateCounter(u)
+                self.transmitter.post(self.packetKey(u), bytes(self.send_buffers[u][0:18+self.lengths[u]]), targets)
+                self.frames_sent += 1
+            if len(synctargets) > 0:
+                self.transmitter.post("sync", bytes(self.artsync_buffer), list(synctargets))
+        self.last_send_time = now
 
 ########################################
 #
-#   setDMXValue sets slot directly in DMX packet buffer
+#   copyFrame copies a frame of one or more universes of 512 slots
+#   into the ArtDmx packet buffers (send thread, lock held)
+#   a universe is marked as changed if its slots or its length are different
+#   each universe is sent with the slots of the frame that fall in it,
+#   rounded up to an even number of at least 2 (the ArtDmx minimum)
 #
-#   setDMXLevel converts level (0-100) to (0-255) and 
-#      sets slot directly in DMX packet buffer
+#########################################
+    def copyFrame(self, frame):
+        n = (len(frame)+511) // 512
+        if n > self.universes:
+            self.setUniverseCount(n)
+        for u in range(self.universes):
+            s = u*512
+            count = max(0, min(512, len(frame)-s))
+            buffer = self.send_buffers[u]
+            if buffer[18:18+count] != frame[s:s+count]:
+                buffer[18:18+count] = frame[s:s+count]
+                self.changed[u] = True
+            length = max(2, count + (count & 1))
+            if length != count:
+                buffer[18+count:18+length] = bytes(length-count)
+            length = self.blankDroppedSlots(u, 18, length)
+            if length != self.lengths[u]:
+                self.lengths[u] = length
+                buffer[16] = length >> 8       #dmxcount h/l
+                buffer[17] = length & 0xFF
+                self.changed[u] = True
+
+########################################
+#
+#   syncTargets
+#   returns the targets of universe index u that should receive ArtSync
 #
 #########################################
-    def setDMXValue(self, address, value):
-        with self.lock:
-            self.send_buffer[address+17] = value
+    def syncTargets(self, u):
+        if ( self.sync == "on" ):
+            return self.targetsForUniverse(u)
+        if ( self.sync == "off" or self.unicast_ip != None ):
+            return []
+        return self.nodes.sync_routes.get(self.portAddress(u), ())
 
-    def setDMXLevel(self, address, level):
-        self.send_buffer[address+17] = ArtNetInterface.level2dmx(level)
+########################################
+#
+#   refreshDue
+#   returns seconds until a universe needs a keep-alive refresh
+#
+#########################################
+    def refreshDue(self):
+        oldest = min(self.last_sent[0:self.universes])
+        return oldest + self.refresh_interval - time.time()
 
 ########################################
 #
-#   setDMXValues sets slots directly in DMX packet buffer
+#   targetsForUniverse
+#   returns (ip, port) targets to send universe index u
+#   (one lookup in the node table's routing map)
 #
 #########################################
-    def setDMXValues(self, values):
-        with self.lock:
-            for i in range (len(values)):
-                self.send_buffer[18+i] = values[i]
+    def targetsForUniverse(self, u):
+        if ( self.unicast_ip == None ):
+            return self.nodes.routes.get(self.portAddress(u), ())
+        return [( self.unicast_ip, self.port())]
 
 ########################################
 #
-#   getDMXValue returns slot directly from DMX packet buffer (0-255)
-#   getDMXLevel returns level (0-100) from DMX packet buffer 
+#   setDMXLevel converts level (0-100) to (0-255) and 
+#      sets slot in the frame buffer (address is 1 to universes*512)
+#
+#   getDMXLevel returns level (0-100) from the last frame written
 #
 #########################################
-    def getDMXValue(self, address):
-        return self.send_buffer[address+17]
+    def setDMXLevel(self, address, level):
+        self.setDMXValue(address, ArtNetInterface.level2dmx(level))
 
     def getDMXLevel(self, address):
-        return ArtNetInterface.dmx2level(self.send_buffer[address+17])
+        return ArtNetInterface.dmx2level(self.getDMXValue(address))
 
 ########################################
 #
@@ -469,20 +1024,21 @@ class ArtNetInterface(DMXInterface):
 
 ########################################
 #
-#   packetReceived called when listen() thread receives data received at Art-Net port
+#   packetReceived called by readPacket (on the reactor thread) when data is received at Art-Net port
+#   the header is unpacked in place and the OpCode selects the handler from self.handlers
+#   other OpCodes (for instance another controller's ArtSync) are counted in self.ignored
 #
 #########################################
     def packetReceived(self):
-        if ( self.data[0:7] == bytes("Art-Net", 'utf-8')):
-            opcode =  self.data[8] + 256 * self.data[9]
-            if ( opcode == 0x5000 ):
-                self.artDMXReceived()
-            elif ( opcode == 0x2000 ):
-                self.sendArtPollReply()
-            elif ( opcode == 0x2100 ):
-                self.artPollReplyReceived()
+        if ( len(self.data) < 10 ):
+            return
+        artid, opcode = ArtNetInterface.ARTNET_HEADER.unpack_from(self.data)
+        if ( artid == ArtNetInterface.ARTNET_ID ):
+            handler = self.handlers.get(opcode)
+            if ( handler != None ):
+                handler()
             else:
-                print ( "unsupported opcode ", opcode )
+                self.ignored[opcode] = self.ignored.get(opcode, 0) + 1
 
 ########################################
 #
@@ -490,8 +1046,7 @@ class ArtNetInterface(DMXInterface):
 #
 #########################################
     def sendArtPoll(self):
-        with self.lock:
-            self.udpsocket.sendto(self.artpoll_buffer, ("255.255.255.255", self.port()))
+        self.transmitter.post(None, bytes(self.artpoll_buffer), [("255.255.255.255", self.port())])
         self.last_poll_time = time.time()
 
 ########################################
@@ -508,108 +1063,243 @@ class ArtNetInterface(DMXInterface):
         status = "#0001 [" + str(self.prcounter) + "] LXWeb2DMX OK " 
         self.pollreply_buffer[108:108+len(status)] = bytes(status, 'utf-8')  #long name
 
-########################################
-#
-#   replyMatchesNetwork
-#      returns 1 if poll reply matches one port's 
-#      output from network universe to self.artnet_universe
-#
-#########################################
-    def replyMatchesNetwork(self):
-        if ( (self.data[174] & 0x80) != 0 ):    #node's port 1 can output from network
-            if ( self.data[190] == self.artnet_universe ):
-                return 1
-        elif ( (self.data[175] & 0x80) != 0 ):
-            if ( self.data[191] == self.artnet_universe ):
-                return 1
-        elif ( (self.data[176] & 0x80) != 0 ):
-            if ( self.data[192] == self.artnet_universe ):
-                return 1
-        elif ( (self.data[177] & 0x80) != 0 ):
-            if ( self.data[193] == self.artnet_universe ):
-                return 1
-        return 0
-
 ########################################
 #
 #   sendArtPollReply ->send reply to Art-Net poll
 #   reply to broadcast address of ArtPoll sender
+#   the broadcast address is looked up once for each sender
 #
 #########################################
     def sendArtPollReply(self):
         self.updatePollReplyCounter()
-        netbroadcastip = CTNetUtil.findBroadcastAddress(self.recdaddr[0])
-        with self.lock:
-            self.udpsocket.sendto(self.pollreply_buffer, (netbroadcastip, self.port()))
+        ip = self.recdaddr[0]
+        netbroadcastip = self.broadcast_addresses.get(ip)
+        if ( netbroadcastip == None ):
+            netbroadcastip = CTNetUtil.findBroadcastAddress(ip)
+            self.broadcast_addresses[ip] = netbroadcastip
+        self.transmitter.post(None, bytes(self.pollreply_buffer), [(netbroadcastip, self.port())])
 
 ########################################
 #
-#   artPollReplyReceived-> if poll matches out output, set target ip address for ArtDMX
+#   artPollReplyReceived-> add or update the node in the node table
+#   its ports that output one of our universes become targets for ArtDMX
 #
 #########################################
     def artPollReplyReceived(self):
-        if ( self.data[26:35] != self.namebytes ):
-            if ( self.data[18] == self.artnet_net ):  # matches net, subnet
-                if ( self.data[19] == self.artnet_subnet ):
-                    if ( self.replyMatchesNetwork() == 1 ):
-                        self.foundNode(self.recdaddr[0])
+        if ( len(self.data) < 207 ):
+            return
+        if ( self.data[26:35] != self.namebytes and self.unicast_ip == None ):
+            self.nodes.replyReceived(self.recdaddr[0], self.data)
 
 ########################################
 #
 #   artDMXReceived
+#      passes the DMX data to the input merge if the ArtDmx is for one
+#      of this interface's universes and it is not from this computer
+#      the sequence (byte 12) lets the input detect late and lost packets
 #
 #########################################
     def artDMXReceived(self):
-        if ( self.recd_from_local() == 0 ):
-            print (" Art DMX ", self.recdaddr[0])
+        if ( self.input == None or self.recd_from_local() == 1 ):
+            return
+        data = self.data
+        if ( len(data) < 20 ):
+            return
+        sequence, physical, pa, lenhi, lenlo = ArtNetInterface.ARTDMX_HEADER.unpack_from(data, 12)
+        length = (lenhi << 8) | lenlo
+        if ( length > 512 or 18 + length > len(data) ):
+            return
+        u = (pa & 0x7FFF) - self.portAddress(0)
+        if ( u >= 0 and u < self.universes ):
+            self.input.receivedDMX(self.recdaddr[0], u, data[18:18+length], sequence)
 
 ########################################
 #
-#   foundNode
-#      append to target list, remove broadcast ip 
-#      if node previously found, update polltime
+#   nodeAdded, nodeRemoved
+#      called by the node table when a node is found or expires
 #
 #########################################
-    def foundNode( self, ipaddr ):
-        if (self.unicast_ip == None):
-            x = self.targetWithAddress(ipaddr)
-            if ( x == None ):
-                self.target_list.append(ArtNetNode(ipaddr))
-                print( "added node: ", ipaddr )
-            else:
-                x.pollReceived()
-
-    def targetWithAddress(self, ipaddr):
-        for n in self.target_list:
-            if ( n.address == ipaddr ):
-                return n
-        return None
-
-    def removeExpiredTargets(self):
-        expired = []
-        for n in self.target_list:
-            if ( n.expired() == 1 ):
-                expired.append(n)
-        for n in expired:
-            self.target_list.remove(n)
-            print("removed node with address ", n.address)
+    def nodeAdded(self, node):
+        print( "added node: ", node.address, node.shortname )
+
+    def nodeRemoved(self, node):
+        print("removed node with address ", node.address)
 
 ##################################################################################
 #                               ArtNetNode
 #
-#           encapsulates artnet node's ipaddress from ArtPoll and the time it last polled
+#           A node (or one bind index of a node with more than 4 ports)
+#           decoded from its ArtPollReply, the time it last replied
+#           and the set of Port-Addresses that its ports output
+#           sync is True if the node should receive ArtSync
 #
 ##################################################################################
 class ArtNetNode(object):
 
-    def __init__(self, ipaddr):
+    EXPIRE_TIME = 12.0      # seconds without a poll reply before the node is removed
+    # ArtPollReply through Status2
+    REPLY = struct.Struct("<8sH4sH2sBB2sBBH18s64s64s2s4s4s4s4s4sBBB3xB6s4sBB")
+
+    def __init__(self, ipaddr, bindindex=1):
         self.address = ipaddr
+        self.bindindex = bindindex
+        self.portaddresses = set()
+        self.sync = False
         self.polltime = time.time()
-    
-    def pollReceived(self):
+
+#########################################
+#
+#   replyReceived decodes an ArtPollReply
+#   replies shorter than the Art-Net 4 size are padded with zeros
+#
+#########################################
+    def replyReceived(self, data):
+        if ( len(data) < ArtNetNode.REPLY.size ):
+            data = bytes(data).ljust(ArtNetNode.REPLY.size, b"\x00")
+        ( artid, opcode, ip, self.udpport, version, net, sub, oem, self.ubea, self.status1,
+          self.esta, shortname, longname, report, numports, self.porttypes, self.goodinput,
+          self.goodoutput, self.swin, self.swout, self.acnpriority, self.swmacro, self.swremote,
+          self.style, mac, bindip, bindindex, self.status2 ) = ArtNetNode.REPLY.unpack_from(data)
+        self.version = int.from_bytes(version, 'big')
+        self.oem = int.from_bytes(oem, 'big')
+        self.netswitch = net & 0x7F
+        self.subswitch = sub & 0x0F
+        self.shortname = ArtNetNode.nameString(shortname)
+        self.longname = ArtNetNode.nameString(longname)
+        self.report = ArtNetNode.nameString(report)
+        self.numports = int.from_bytes(numports, 'big')
+        self.mac = mac.hex(":")
+        self.bindip = socket.inet_ntoa(bindip)
+        portaddresses = set()
+        for i in range(4):
+            if ( (self.porttypes[i] & 0x80) != 0 ):    #port can output from network
+                portaddresses.add((self.netswitch << 8) | (self.subswitch << 4) | (self.swout[i] & 0x0F))
+        self.portaddresses = portaddresses
+        # 15 bit Port-Address support means Art-Net 3 or 4
+        # (older nodes would latch ArtDmx and ignore ArtSync anyway)
+        self.sync = ( self.status2 & 0x08 ) != 0
         self.polltime = time.time()
-        
-    def expired(self):
-        if ( time.time()-self.polltime > 12 ):
-            return 1
-        return 0
\ No newline at end of file
+
+    def nameString(b):
+        return b.split(b"\x00")[0].decode('utf-8', 'replace')
+
+    def outputsPortAddress(self, pa):
+        return pa in self.portaddresses
+
+    def expireTime(self):
+        return self.polltime + ArtNetNode.EXPIRE_TIME
+
+##################################################################################
+#                               ArtNetNodeTable
+#
+#           The nodes found by ArtPoll, keyed by (ip address, bind index)
+#
+#           Nodes are expired with a heap of (expire time, key) so that
+#           expire() only looks at nodes that may have timed out.
+#           Each reply pushes a new entry, entries for nodes that have
+#           replied since are skipped when they reach the top.
+#
+#           routes and sync_routes map a Port-Address to a tuple of
+#           (ip, port) targets.  When a node's ports change, new maps are
+#           made with only those Port-Addresses recalculated and replaced
+#           in one assignment, so the transmit side reads them without a lock.
+#
+##################################################################################
+class ArtNetNodeTable(object):
+
+    def __init__(self, port, delegate=None):
+        self.port = port
+        self.delegate = delegate        # informed by nodeAdded(node) and nodeRemoved(node)
+        self.lock = threading.Lock()
+        self.nodes = {}                 # (ip, bindindex) -> ArtNetNode
+        self.expiry = []                # heap of (expire time, key)
+        self.pa_nodes = {}              # Port-Address -> set of node keys
+        self.routes = {}                # Port-Address -> tuple of (ip, port)
+        self.sync_routes = {}           # Port-Address -> tuple of (ip, port) of sync nodes
+
+#########################################
+#
+#   replyReceived adds or updates the node that sent the ArtPollReply in data
+#
+#########################################
+    def replyReceived(self, ipaddr, data):
+        bindindex = data[211] if len(data) > 211 else 0
+        key = (ipaddr, max(bindindex, 1))
+        added = None
+        with self.lock:
+            node = self.nodes.get(key)
+            if node == None:
+                node = ArtNetNode(ipaddr, key[1])
+                self.nodes[key] = node
+                added = node
+            oldports = node.portaddresses
+            oldsync = node.sync
+            node.replyReceived(data)
+            heapq.heappush(self.expiry, (node.expireTime(), key))
+            for pa in oldports - node.portaddresses:
+                self.pa_nodes[pa].discard(key)
+            for pa in node.portaddresses - oldports:
+                self.pa_nodes.setdefault(pa, set()).add(key)
+            if oldsync != node.sync:
+                self.updateRoutes(oldports | node.portaddresses)
+            else:
+                self.updateRoutes(oldports ^ node.portaddresses)
+        if added != None and self.delegate != None:
+            self.delegate.nodeAdded(added)
+
+#########################################
+#
+#   expire removes nodes that have not replied for EXPIRE_TIME
+#
+#########################################
+    def expire(self, now=None):
+        if now == None:
+            now = time.time()
+        removed = []
+        with self.lock:
+            while len(self.expiry) > 0 and self.expiry[0][0] <= now:
+                t, key = heapq.heappop(self.expiry)
+                node = self.nodes.get(key)
+                if node != None and node.expireTime() <= now:
+                    del self.nodes[key]
+                    for pa in node.portaddresses:
+                        self.pa_nodes[pa].discard(key)
+                    removed.append(node)
+            if len(removed) > 0:
+                self.updateRoutes(set().union(*[n.portaddresses for n in removed]))
+        if self.delegate != None:
+            for node in removed:
+                self.delegate.nodeRemoved(node)
+
+#########################################
+#
+#   updateRoutes makes new routing maps with the targets of the
+#   Port-Addresses in pas recalculated (lock held)
+#   a node with several bind indexes is a single target
+#
+#########################################
+    def updateRoutes(self, pas):
+        if len(pas) == 0:
+            return
+        routes = dict(self.routes)
+        sync_routes = dict(self.sync_routes)
+        for pa in pas:
+            targets = set()
+            synctargets = set()
+            for key in self.pa_nodes.get(pa, ()):
+                targets.add((key[0], self.port))
+                if self.nodes[key].sync:
+                    synctargets.add((key[0], self.port))
+            ArtNetNodeTable.setRoute(routes, pa, targets)
+            ArtNetNodeTable.setRoute(sync_routes, pa, synctargets)
+        self.routes = routes
+        self.sync_routes = sync_routes
+
+    def setRoute(routes, pa, targets):
+        if len(targets) > 0:
+            routes[pa] = tuple(targets)
+        else:
+            routes.pop(pa, None)
+
+    def nodeList(self):
+        return list(self.nodes.values())
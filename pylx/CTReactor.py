@@ -0,0 +1,127 @@
+#   CTReactor.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+
+import selectors
+import socket
+import threading
+
+
+##################################################################################
+#                               CTReactor
+#
+#           One thread that waits for input on many sockets using selectors
+#           (epoll on Linux) and calls the registered callback as soon as
+#           data arrives.  While idle, the thread is blocked and uses no CPU.
+#
+#           CTReactor.shared() returns the reactor used by the Art-Net, OSC
+#           and web server listeners
+#
+##################################################################################
+
+class CTReactor(object):
+
+    shared_reactor = None
+
+#########################################
+#
+#   shared returns the application's reactor, creating it if needed
+#
+#########################################
+    @classmethod
+    def shared(cls):
+        if cls.shared_reactor is None:
+            cls.shared_reactor = CTReactor()
+        return cls.shared_reactor
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.reactor_thread = None
+        self.running = False
+        # writing to wake_send interrupts select so registrations take effect
+        self.wake_recv, self.wake_send = socket.socketpair()
+        self.wake_recv.setblocking(False)
+        self.wake_send.setblocking(False)
+        self.selector.register(self.wake_recv, selectors.EVENT_READ, self.drainWakeup)
+
+#########################################
+#
+#   register calls callback() on the reactor thread whenever sock is readable
+#   starts the reactor thread if it is not already running
+#
+#########################################
+    def register(self, sock, callback):
+        with self.lock:
+            self.selector.register(sock, selectors.EVENT_READ, callback)
+        self.start()
+        self.wake()
+
+#########################################
+#
+#   unregister stops watching sock
+#   after unregister returns, the socket can be closed
+#
+#########################################
+    def unregister(self, sock):
+        with self.lock:
+            try:
+                self.selector.unregister(sock)
+            except (KeyError, ValueError):
+                pass
+        self.wake()
+
+#########################################
+#
+#   start and stop the reactor thread
+#
+#########################################
+    def start(self):
+        with self.lock:
+            self.running = True
+            if self.reactor_thread is None:
+                self.reactor_thread = threading.Thread(target=self.run)
+                self.reactor_thread.daemon = True
+                self.reactor_thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wake()
+
+    def wake(self):
+        try:
+            self.wake_send.send(b'\x00')
+        except OSError:
+            pass        # wake pipe full, select will return anyway
+
+    def drainWakeup(self):
+        try:
+            while self.wake_recv.recv(256):
+                pass
+        except OSError:
+            pass
+
+#########################################
+#
+#   run is attached to the reactor thread (don't call directly)
+#   blocks in select until a registered socket is readable
+#
+#########################################
+    def run(self):
+        while self.running:
+            events = self.selector.select()
+            for key, mask in events:
+                with self.lock:
+                    registered = key.fd in self.selector.get_map()
+                if registered:
+                    try:
+                        key.data()
+                    except Exception as e:
+                        print ("Reactor callback error ", e)
+        with self.lock:
+            self.reactor_thread = None
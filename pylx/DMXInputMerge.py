@@ -0,0 +1,261 @@
+#   DMXInputMerge.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+    # numpy is optional, without it the merge uses map(max, ...)
+
+##################################################################################
+#                               DMXInputSource
+#
+#           The last DMX received from one source for one universe
+#           along with its priority, sequence and packet counters
+#
+##################################################################################
+
+class DMXInputSource(object):
+
+    SEQUENCE_WINDOW = 20        # a sequence this far behind the last is out of order
+
+    def __init__(self, sourceid, universe, now, timeout, name=None):
+        self.sourceid = sourceid        # for instance the sender's ip address
+        self.universe = universe        # universe index in the output frame
+        self.timeout = timeout          # seconds without a packet before the source is dropped
+        self.name = name                # shown instead of sourceid if not None
+        self.priority = 100             # only the highest priority sources of a universe are merged
+        self.data = bytearray(512)
+        self.sequence = -1              # last accepted sequence, -1 before the first packet
+        self.lasttime = now             # time.perf_counter() of the last accepted packet
+        self.packets = 0                # packets accepted
+        self.lost = 0                   # packets missing from the sequence
+        self.outoforder = 0             # late or duplicate packets discarded
+
+#########################################
+#
+#   acceptSequence returns False if sequence is a late or duplicate packet
+#   sequence 0 means that the sender does not use sequence numbers
+#   if skipzero is True the sequence wraps from 255 to 1 (Art-Net)
+#   otherwise zero is a sequence number (sACN)
+#
+#########################################
+    def acceptSequence(self, sequence, skipzero=True):
+        if sequence == 0 and skipzero:
+            return True
+        if self.sequence < 0:
+            self.sequence = sequence
+            return True
+        diff = (sequence - self.sequence) & 0xFF
+        if diff == 0 or diff > 255 - DMXInputSource.SEQUENCE_WINDOW:
+            self.outoforder += 1
+            return False
+        if skipzero and sequence < self.sequence:
+            diff -= 1
+        if diff > 1:
+            self.lost += diff - 1
+        self.sequence = sequence
+        return True
+
+#########################################
+#
+#   received copies data, slots not included are set to zero
+#
+#########################################
+    def received(self, data, now):
+        n = len(data)
+        self.data[0:n] = data
+        if n < 512:
+            self.data[n:512] = bytes(512-n)
+        self.lasttime = now
+        self.packets += 1
+
+    def statsString(self):
+        if self.name != None:
+            s = self.name
+        else:
+            s = str(self.sourceid)
+        return s + " universe " + str(self.universe+1) + " priority " + str(self.priority) + " packets " + str(self.packets) + " lost " + str(self.lost) + " out of order " + str(self.outoforder)
+
+##################################################################################
+#                               DMXInputMerge
+#
+#           Merges DMX input from up to max_sources sources per universe
+#           into the frame of universes*512 slots that is sent to output
+#
+#           In each universe, only the sources with the highest priority
+#           are merged and they are merged HTP.  (Art-Net sources all have
+#           the default priority, sACN sources send their priority.)
+#
+#           receivedDMX is called by a receiving thread (the reactor)
+#           it only copies the data and marks the universe as changed.
+#           update is called by the render loop every frame, it drops sources
+#           that have timed out and re-merges only the changed universes.
+#           mergeInto is called when the output frame is written.
+#
+##################################################################################
+
+class DMXInputMerge(object):
+
+    TIMEOUT = 10.0          # default seconds without a packet before a source is dropped
+
+    def __init__(self, universes=1, max_sources=4, timeout=TIMEOUT):
+        self.max_sources = max_sources
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.sources = {}           # (sourceid, universe) -> DMXInputSource
+        self.universe_sources = {}  # universe -> list of its DMXInputSource
+        self.dirty = set()          # universes that need to be merged
+        self.rejected = 0           # packets from sources over max_sources
+        self.replaced = 0           # sources dropped for a higher priority source
+        self.universes = 0
+        self.setUniverseCount(universes)
+
+#########################################
+#
+#   setUniverseCount sizes the merged frame for n universes
+#
+#########################################
+    def setUniverseCount(self, n):
+        with self.lock:
+            if n > self.universes:
+                frame = bytearray(n*512)
+                if self.universes > 0:
+                    frame[0:len(self.frame)] = self.frame
+                self.frame = frame
+                if numpy != None:
+                    self.frameview = numpy.frombuffer(self.frame, dtype=numpy.uint8)
+                self.universes = n
+
+#########################################
+#
+#   receivedDMX accepts data (up to 512 slots) for universe index
+#   from the source identified by sourceid
+#   timeout is for this source, None uses the merge's timeout
+#   a new source for a universe with max_sources replaces the lowest
+#   priority source if its priority is higher, otherwise it is rejected
+#   returns False if the packet is discarded
+#
+#########################################
+    def receivedDMX(self, sourceid, universe, data, sequence=0, skipzero=True, priority=100, timeout=None, name=None):
+        if universe >= self.universes:
+            self.setUniverseCount(universe+1)
+        now = time.perf_counter()
+        key = (sourceid, universe)
+        with self.lock:
+            src = self.sources.get(key)
+            if src == None:
+                usources = self.universe_sources.setdefault(universe, [])
+                if len(usources) >= self.max_sources:
+                    # a full universe only makes room for a higher priority source
+                    # by dropping its lowest priority source (the stalest of those)
+                    lowest = min(usources, key=lambda s: (s.priority, s.lasttime))
+                    if priority <= lowest.priority:
+                        self.rejected += 1
+                        return False
+                    self.removeSource(lowest)
+                    self.replaced += 1
+                if timeout == None:
+                    timeout = self.timeout
+                src = DMXInputSource(sourceid, universe, now, timeout, name)
+                self.sources[key] = src
+                usources.append(src)
+            if not src.acceptSequence(sequence, skipzero):
+                return False
+            src.received(data, now)
+            src.priority = priority
+            self.dirty.add(universe)
+        return True
+
+#########################################
+#
+#   dropSource removes a source immediately
+#   (for instance when it has sent a stream terminated packet)
+#
+#########################################
+    def dropSource(self, sourceid, universe):
+        with self.lock:
+            src = self.sources.get((sourceid, universe))
+            if src != None:
+                self.removeSource(src)
+
+    def removeSource(self, src):
+        del self.sources[(src.sourceid, src.universe)]
+        self.universe_sources[src.universe].remove(src)
+        self.dirty.add(src.universe)
+
+#########################################
+#
+#   update is called by the render loop with the time of the frame
+#   returns True if the merged frame has changed
+#
+#########################################
+    def update(self, now):
+        if len(self.sources) == 0 and len(self.dirty) == 0:
+            return False
+        with self.lock:
+            for src in [s for s in self.sources.values() if now - s.lasttime > s.timeout]:
+                self.removeSource(src)
+            if len(self.dirty) == 0:
+                return False
+            for u in self.dirty:
+                self.mergeUniverse(u)
+            self.dirty.clear()
+        return True
+
+#########################################
+#
+#   mergeUniverse combines the highest priority sources of universe u HTP
+#
+#########################################
+    def mergeUniverse(self, u):
+        s = u*512
+        self.frame[s:s+512] = bytes(512)
+        usources = self.universe_sources.get(u, [])
+        if len(usources) == 0:
+            return
+        top = max(src.priority for src in usources)
+        for src in usources:
+            if src.priority == top:
+                if numpy != None:
+                    numpy.maximum(self.frameview[s:s+512], numpy.frombuffer(src.data, dtype=numpy.uint8), out=self.frameview[s:s+512])
+                else:
+                    self.frame[s:s+512] = bytes(map(max, self.frame[s:s+512], src.data))
+
+#########################################
+#
+#   mergeInto merges the input HTP into buffer (the output frame)
+#   returns the number of slots of buffer that include input
+#   (0 if there are no sources)
+#
+#########################################
+    def mergeInto(self, buffer):
+        if len(self.sources) == 0:
+            return 0
+        n = min(len(buffer), len(self.frame))
+        if numpy != None:
+            out = numpy.frombuffer(buffer, dtype=numpy.uint8, count=n)
+            numpy.maximum(out, self.frameview[0:n], out=out)
+        else:
+            buffer[0:n] = bytes(map(max, buffer[0:n], self.frame[0:n]))
+        return n
+
+#########################################
+#
+#   statsString returns a line describing each source
+#
+#########################################
+    def statsString(self):
+        with self.lock:
+            lines = [src.statsString() for src in self.sources.values()]
+        if self.rejected > 0 or self.replaced > 0:
+            lines.append("rejected " + str(self.rejected) + " replaced " + str(self.replaced))
+        return "\n".join(lines)
@@ -8,6 +8,7 @@
 #
 
 import threading
+import time
 #   requires pyserial download from: https://pypi.python.org/pypi/pyserial
 import serial
 
@@ -22,54 +23,299 @@ import sys
 from ArtNet import DMXInterface
 
 
-
 class DMXUSBProInterface(DMXInterface):
+
+    RECONNECT_INTERVAL = 2.0    # seconds between attempts to reopen a lost widget
+    MIN_SLOTS = 24              # the widget requires at least 24 slots
+    WRITE_TIMEOUT = 1.0         # a write that takes longer than this fails
+    READ_TIMEOUT = 0.1          # the reader thread checks for stopListening this often
+    RECEIVED_DMX = 5            # label of a Received DMX Packet message
+    RECEIVE_ON_CHANGE = 8       # label of the message that sets the receive mode
     
     def __init__(self, com_port=3):
-        self.send_thread = None
-        self.lock = threading.Lock()
-        self.last_send_time = 0.0
-        self.buffer = bytearray(517)
+        super().__init__()
+        self.com_port = com_port
+        self.buffer = bytearray(518)
         # start code
         self.buffer[0] = 0x7E
         # send DMX
         self.buffer[1] = 6
-        # size LSB
-        self.buffer[2] = 0
+        # size LSB (DMX start code + 512 slots = 513)
+        self.buffer[2] = 1
         # size MSB
         self.buffer[3] = 2
         # DMX start
         self.buffer[4] = 0
         
         # end code
-        self.buffer[516] = 0xE7
-        self.ok = False
+        self.buffer[517] = 0xE7
+        self.length = 512           # slots in the Send DMX packet
+        self.changed = True
         self.widget = None
-        try:
-            self.widget = serial.Serial(com_port, 57600)
+        self.last_connect_time = 0.0
+        self.connect_error = None
+        self.reconnects = 0         # times the widget was reopened after an error
+        self.write_errors = 0
+        self.write_time = 0.0       # total seconds spent in widget.write
+        self.write_max = 0.0        # longest write in seconds
+        self.frame_rate = 0.0       # frames written per second, updated every second
+        self.rate_start = time.time()
+        self.rate_frames = 0
+        self.read_thread = None
+        self.parser = DMXUSBProParser(self.messageReceived)
+        self.input_packets = 0      # Received DMX Packet messages
+        self.input_errors = 0       # received with the overrun or overflow status bits set
+        if self.connect():
             print ("Widget Connected!")
             self.ok = True
-        except:
-            print ("Could not open serial connection", sys.exc_info()[0])
-            tkmsg_box.showinfo("Error opening serial connection ", sys.exc_info()[0])
-        
+        else:
+            print ("Could not open serial connection", self.connect_error)
+            tkmsg_box.showinfo("Error opening serial connection ", self.connect_error)
 
-    def setDMXValue(self, address, value):
-        with self.lock:
-            self.buffer[5+address] = value
-        
-    def setDMXValues(self, values):
-        with self.lock:
-            for i in range (len(values)):
-                self.buffer[5+i] = values[i]
-        
+    # opens the serial port, returns True if successful
+    # com_port can be a device path such as /dev/ttyUSB0 (or a pseudo-terminal)
+    def connect(self):
+        self.last_connect_time = time.time()
+        try:
+            self.widget = serial.Serial(self.com_port, 57600, timeout=DMXUSBProInterface.READ_TIMEOUT,
+                                        write_timeout=DMXUSBProInterface.WRITE_TIMEOUT)
+        except Exception as e:
+            self.connect_error = e
+            self.widget = None
+            return False
+        self.changed = True
+        if self.listening:
+            self.sendReceiveMode()
+        return True
+
+    # the writer thread is the send thread of DMXInterface
+    # sendDMXNow only wakes it (starting it if necessary)
+    # so that the render thread never waits for the serial port
+    # frames published while a write is in progress are replaced by newer ones
     def sendDMXNow(self):
-        if self.widget != None:
+        if self.send_thread is None:
+            self.startSending()
+        self.send_event.set()
+
+    # takes the newest frame from the frame buffer (setDMXValues)
+    # the widget outputs the first universe of the frame
+    # with as many slots as the frame has (at least MIN_SLOTS) so that
+    # a short frame is written in less time and the DMX refresh rate is higher
+    # only writes to the widget if the DMX data has changed or refresh is True
+    # if the widget has been lost, tries to reopen it every RECONNECT_INTERVAL
+    def transmitFrame(self, refresh):
+        with self.lock:
+            frame = self.frame.take()
+            if frame != None:
+                self.copyFrame(frame)
+            if self.widget is None:
+                if time.time() - self.last_connect_time >= DMXUSBProInterface.RECONNECT_INTERVAL:
+                    if self.connect():
+                        self.reconnects += 1
+                        print ("Widget Reconnected")
+            if self.changed or refresh:
+                if self.widget != None:
+                    self.writeBuffer()
+                self.last_send_time = time.time()
+            else:
+                self.frames_suppressed += 1
+
+    # copies the first universe of frame into the Send DMX packet (lock held)
+    def copyFrame(self, frame):
+        n = min(len(frame), 512)
+        if self.buffer[5:5+n] != frame[0:n]:
+            self.buffer[5:5+n] = frame[0:n]
+            self.changed = True
+        length = max(n, DMXUSBProInterface.MIN_SLOTS)
+        if length != n:
+            self.buffer[5+n:5+length] = bytes(length-n)
+        if length < self.length and any(self.buffer[5+length:5+self.length]):
+            # fixtures hold the last level of a slot that is no longer sent
+            # so dropped slots are zeroed and sent once at the old length
+            self.buffer[5+length:5+self.length] = bytes(self.length-length)
+            self.changed = True
+            length = self.length
+        if length != self.length:
+            self.length = length
+            self.buffer[2] = (length+1) & 0xFF      # size includes the DMX start code
+            self.buffer[3] = (length+1) >> 8
+            self.changed = True
+
+    # writes the DMX packet and updates the stats (lock held)
+    # an error closes the widget so that transmitFrame reconnects
+    def writeBuffer(self):
+        st = time.perf_counter()
+        try:
+            end = 5 + self.length
+            self.buffer[end] = 0xE7
+            self.widget.write(memoryview(self.buffer)[0:end+1])
+        except:
+            print ("Widget write failed", sys.exc_info()[1])
+            self.write_errors += 1
+            self.closeWidget()
+            self.last_connect_time = time.time()
+            return
+        wt = time.perf_counter() - st
+        self.write_time += wt
+        if wt > self.write_max:
+            self.write_max = wt
+        self.changed = False
+        self.frames_sent += 1
+        self.rate_frames += 1
+        now = time.time()
+        if now - self.rate_start >= 1.0:
+            self.frame_rate = self.rate_frames / (now - self.rate_start)
+            self.rate_start = now
+            self.rate_frames = 0
+
+    def closeWidget(self):
+        widget = self.widget
+        self.widget = None
+        self.changed = True
+        try:
+            widget.close()
+        except:
+            pass
+
+    def statsString(self):
+        s = super().statsString() + " fps " + str(round(self.frame_rate, 1))
+        if self.frames_sent > 0:
+            s += " write avg " + str(round(1000*self.write_time/self.frames_sent, 2)) + "ms max " + str(round(1000*self.write_max, 2)) + "ms"
+        s += " errors " + str(self.write_errors) + " reconnects " + str(self.reconnects)
+        if self.listening:
+            s += " received " + str(self.input_packets) + " receive errors " + str(self.input_errors) + " resyncs " + str(self.parser.resyncs)
+        if self.widget is None:
+            s += " (disconnected)"
+        return s
+
+    # startListening asks the widget to send every DMX packet it receives
+    # and starts a thread that reads widget messages
+    # received DMX is merged into the output by self.input (DMXInputMerge) as universe 1
+    def startListening(self):
+        if not self.listening:
+            self.listening = True
             with self.lock:
-                self.widget.write(self.buffer)
+                if self.widget != None:
+                    self.sendReceiveMode()
+            self.read_thread = threading.Thread(target=self.read)
+            self.read_thread.daemon = True
+            self.read_thread.start()
+
+    def stopListening(self):
+        self.listening = False
+        thread = self.read_thread
+        if thread != None and thread != threading.current_thread():
+            thread.join()
+        self.read_thread = None
+
+    # sets receive mode 0, send always (lock held)
+    def sendReceiveMode(self):
+        try:
+            self.widget.write(bytes([0x7E, DMXUSBProInterface.RECEIVE_ON_CHANGE, 1, 0, 0, 0xE7]))
+        except:
+            print ("Widget write failed", sys.exc_info()[1])
+
+    # method attached to the reader thread (don't call directly)
+    # passes whatever has arrived to the parser, which calls messageReceived
+    # for each complete message.  If the widget is lost, waits for the
+    # send thread to reconnect it.
+    def read(self):
+        while self.listening:
+            widget = self.widget
+            if widget is None:
+                time.sleep(DMXUSBProInterface.READ_TIMEOUT)
+                continue
+            try:
+                data = widget.read(max(1, widget.in_waiting))
+            except:
+                with self.lock:
+                    if self.widget is widget:
+                        print ("Widget read failed", sys.exc_info()[1])
+                        self.closeWidget()
+                continue
+            if len(data) > 0:
+                self.parser.feed(data)
+
+    # called by the parser on the reader thread
+    # a Received DMX Packet has a status byte, the start code and the slots
+    def messageReceived(self, label, data):
+        if label != DMXUSBProInterface.RECEIVED_DMX or len(data) < 2:
+            return
+        if data[0] != 0:
+            self.input_errors += 1
+            return
+        self.input_packets += 1
+        if data[1] == 0 and self.input != None:
+            self.input.receivedDMX(self.com_port, 0, data[2:], name="USB Pro " + str(self.com_port))
 
     def close(self):
         self.stopSending()
-        if self.widget != None:
-            self.widget.close()
-            self.widget = None
\ No newline at end of file
+        self.stopListening()
+        with self.lock:
+            if self.widget != None:
+                self.closeWidget()
+
+
+#################################################################
+#
+#   DMXUSBProParser splits the bytes read from the widget into messages
+#
+#   A message is 0x7E, label, data length LSB and MSB, data, 0xE7.
+#   feed can be given any number of bytes, a partial message is kept
+#   until the rest arrives.  Bytes before a 0x7E are discarded and
+#   if a message's length is too long or it does not end with 0xE7,
+#   its 0x7E is discarded and the parser resynchronizes on the next one.
+#
+#################################################################
+
+class DMXUSBProParser(object):
+
+    START = 0x7E
+    END = 0xE7
+    MAX_DATA = 600              # longest message data the widget sends
+
+    def __init__(self, delegate):
+        self.delegate = delegate    # called with (label, data) for each message
+        self.buffer = bytearray()
+        self.messages = 0
+        self.resyncs = 0            # times bytes were discarded to find the next message
+
+    def feed(self, data):
+        buf = self.buffer
+        buf += data
+        n = len(buf)
+        i = 0
+        resync = False                      # True after discarding a bad message's start
+        while True:
+            s = buf.find(DMXUSBProParser.START, i)
+            if s < 0:
+                s = n
+            if s > i and not resync:
+                self.resyncs += 1           # bytes that are not part of a message
+            resync = False
+            if s == n:
+                i = n
+                break
+            if n - s < 4:
+                i = s
+                break
+            length = buf[s+2] | (buf[s+3] << 8)
+            if length > DMXUSBProParser.MAX_DATA:
+                self.resyncs += 1
+                resync = True
+                i = s + 1
+                continue
+            end = s + 4 + length
+            if end >= n:
+                i = s
+                break
+            if buf[end] != DMXUSBProParser.END:
+                self.resyncs += 1
+                resync = True
+                i = s + 1
+                continue
+            self.messages += 1
+            self.delegate(buf[s+1], buf[s+4:end])
+            i = end + 1
+        if i > 0:
+            del buf[0:i]
@@ -7,13 +7,24 @@
 #  https://www.claudeheintzdesign.com/lx/opensource.html
 
 from ArtNet import ArtNetInterface
-from OSC import OSCInterface
+from OSC import OSCInterface, OSCTrigger
+from OSCListener import OSCScheduler
+from OSCDispatcher import OSCDispatcher
 from LXPatch import LXPatch
 from LXChannelDisplay import LXChannelDisplay
+from LXRenderLoop import LXRenderLoop
+from LXFadeCurve import LXFadeCurve
+from LXMerge import LXMerge
 import threading
 import time
 from operator import attrgetter
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+    # numpy is optional, without it the livecue uses the list fade engine
+
 #################################################################
 #
 #     The LXCues class represents a list of cues.
@@ -25,30 +36,53 @@ from operator import attrgetter
 #     a patch for translating channels to dimmers
 #     livecue interface is set separately from __init__
 #
+#     LXCues has an LXRenderLoop that evaluates fades, follows
+#     and level changes at a fixed frame rate
+#
+#     The livecue is playback 1.  Additional playbacks (LXPlayback)
+#     fade through the same cues independently.
+#     Each frame, an LXMerge combines the playbacks HTP or LTP
+#     and the merged levels are written to the livecue's output
+#
 #################################################################
             
 class LXCues:
 
-    def __init__(self, channels, dimmers):
+    def __init__(self, channels, dimmers, engine="auto"):
         self.cues = []                          # list of cues
+        self.cuenumbers = None                  # cue number -> cue, rebuilt by cueForNumber when None
         self.channels = channels                    # number of channels in all cues
         self.current = None                     # the current cue
         self.next = None                        # the next cue
         self.delegate = None                        # delegate
-        self.livecue = LXLiveCue(channels, dimmers) # LXLiveCue can fade between cues
+        self.livecue = LXLiveCue(channels, dimmers, engine) # LXLiveCue can fade between cues
+        self.engine = engine
+        self.merge = LXMerge(channels, engine)          # combines livecue and playbacks
+        self.merge.addPlayback(self.livecue)
+        self.playbacks = {}                             # LXPlayback by number (2 and up)
+        self.renderloop = LXRenderLoop(self)            # calls renderFrame at fixed rate
+        self.oscscheduler = OSCScheduler(self, self.renderloop.wake)   # OSC bundles, dispatched by renderFrame
 
         self.oscinterface = OSCInterface()
+        self.oscdispatcher = OSCDispatcher()            # OSC address -> handler
+        self.registerOSCAddresses()
         
 #####
 #     cueForNumber returns a cue matching the number
-#     
+#     cues are looked up in a dictionary that is rebuilt after the list changes
 #####
         
     def cueForNumber(self, number):
-        for cue in self.cues:
-            if cue.number == float(number):
-                return cue
-        return None
+        cuenumbers = self.cuenumbers
+        if cuenumbers == None:
+            cuenumbers = {}
+            for cue in reversed(self.cues):     # the first cue with a number is found
+                cuenumbers[cue.number] = cue
+            self.cuenumbers = cuenumbers
+        try:
+            return cuenumbers.get(float(number))
+        except ValueError:
+            return None
 
 #####
 #     createCueForNumber returns a cue matching the number
@@ -63,6 +97,7 @@ class LXCues:
             q = LXCue(self.channels)
             q.number = float(number)
             self.cues.append(q)
+            self.cuenumbers = None
         return q
         
 #####
@@ -72,6 +107,7 @@ class LXCues:
         
     def removeCue(self, cue):
         self.cues.remove(cue)
+        self.cuenumbers = None
         
 #####
 #     putCuesInOrder sorts the cues by number
@@ -136,6 +172,7 @@ class LXCues:
         if newcue != None:
             self.cues.append(newcue)
             self.cues.sort(key=attrgetter('number'))
+            self.cuenumbers = None
             self.current = newcue
         return True
 
@@ -158,6 +195,9 @@ class LXCues:
         s = "Ident 3:0\n"
         s += self.livecue.patch.patchString()
         s += self.livecue.patch.optionString()
+        s += self.merge.ltpString()
+        for curve in LXFadeCurve.customCurves():
+            s += curve.defString()
         for cue in self.cues:
             s += cue.asciiString()
         s += "enddata\n"
@@ -210,9 +250,10 @@ class LXCues:
 #     startFadingToCue will use the live cue to start a fade to "cue"
 #     or, if no cue is specified, it will start a fade to the next cue
 #     after the current cue in the list    
+#     starttime is passed when a follow is started from fadeComplete
 #####
         
-    def startFadingToCue(self, cue=None):
+    def startFadingToCue(self, cue=None, starttime=None):
         if cue == None:
             cue = self.next
         if cue == None:
@@ -221,9 +262,11 @@ class LXCues:
                 if len(self.cues) > 0:
                     cue = self.cues[0]
         if cue != None:
-            self.livecue.startFadeToCue(cue, self)
-            if cue.oscstring != None:
-                self.oscinterface.sendOSCFromString(cue.oscstring);
+            self.livecue.startFadeToCue(cue, self, starttime)
+            if starttime == None:
+                self.renderloop.wake()      # GO renders without waiting for the next frame
+            if len(cue.osctriggers) > 0:
+                self.oscinterface.sendTriggers(cue.osctriggers)
             self.current = cue
             self.next = self.nextCueAfterCue(self.current)
 
@@ -269,12 +312,76 @@ class LXCues:
         if self.livecue.stopped == True:
                 self.next = self.current
         if self.livecue.followtime >= 0:
-            self.startFadingToCue()
+            self.startFadingToCue(None, self.livecue.completetime)
         else:
             self.livecue.delegate = None
             if self.delegate != None:
                 self.delegate.fadeComplete()
 
+#####
+#     playback returns the LXPlayback with number (2 and up) creating it if needed
+#     returns None if number is out of range
+#####
+
+    def playback(self, number):
+        number = int(number)
+        if number < 2 or number > LXMerge.MAX_PLAYBACKS:
+            return None
+        pb = self.playbacks.get(number)
+        if pb == None:
+            livecue = LXLiveCue(self.channels, 0, self.engine)
+            if self.merge.addPlayback(livecue) < 0:
+                return None
+            pb = LXPlayback(self, number, livecue)
+            self.playbacks[number] = pb
+        return pb
+
+#####
+#     setLTP sets a channel to merge LTP (True) or HTP (False)
+#     
+#####
+
+    def setLTP(self, channel, ltp=True):
+        self.merge.setLTP(channel, ltp)
+        self.livecue.setNeedsOutput()
+
+#####
+#     renderFrame() is called by the render loop every frame
+#     first, OSC bundles that are due are applied (all of a bundle's messages in the same frame)
+#     each playback advances its fade, then, if any changed
+#     or if the DMX input changed, the merged levels are written to the output
+#####
+
+    def renderFrame(self, now):
+        self.oscscheduler.dispatchDue(time.perf_counter())
+        changed = False
+        for livecue in self.merge.playbacks:
+            if livecue.renderFrame(now):
+                changed = True
+        if self.livecue.input != None and self.livecue.input.update(now):
+            changed = True
+        if changed:
+            self.livecue.writeToInterface(self.merge.mergeFrame())
+
+#####
+#     startRendering starts the render loop at rate frames per second
+#     
+#####
+
+    def startRendering(self, rate=44.0):
+        self.renderloop.setRate(rate)
+        self.renderloop.start()
+
+#####
+#     stopRendering stops the render loop
+#     
+#####
+
+    def stopRendering(self):
+        self.renderloop.stop()
+        self.oscscheduler.stop()
+        self.oscinterface.stop()
+
 #####
 #     startLiveOutput starts the live cue's output interface sending DMX
 #     
@@ -298,7 +405,7 @@ class LXCues:
 #####
         
     def setMasterLevel(self, level=100.0):
-        self.livecue.master = level/100.0
+        self.livecue.setMaster(level)
         
 #####
 #     patchAddressToChannel calls the live cue's patchAddressToChannel method
@@ -330,47 +437,225 @@ class LXCues:
 #####
         
     def updateDisplay(self, display):
+        levels = self.merge.levels
         for i in range(display.beginIndex(), display.endIndex()):
-            display.setLevel(i+1, int(self.livecue.livestate[i]*self.livecue.master))
+            display.setLevel(i+1, int(levels[i]*self.livecue.master))
 
 #####
-#     receivedOSC
+#     receivedOSC passes the message to the handler registered for its address
 #     
 #####
             
     def receivedOSC(self, addressPattern, args):
-        parts = addressPattern.split('/')
-        if len(parts) == 4:
-            if parts[2] == "dmx":
-                if len(args) >= 1:
-                    dim = int(parts[1])*512 + int(parts[3]) + 1
-                    self.livecue.setDimmerLevel(dim, args[0]*100)
-                    self.delegate.updateDisplay()
+        self.oscdispatcher.dispatch(addressPattern, args)
+
+#####
+#     registerOSCAddresses registers the OSC handlers with the dispatcher
+#     "*" parts are passed to the handler in params
+#       /<universe>/dmx/<slot> level(0-1)   sets a dimmer (universe and slot from 0)
+#       /<universe>/dmx/<slot> levels       sets a block of dimmers starting at slot
+#       /<universe>/dmx levels              sets a block of dimmers starting at slot 0
+#       /channel/<channel> levels           sets a block of channels starting at channel
+#           levels are several level(0-1) arguments or a blob of level(0-255) bytes
+#           a block is applied in one write followed by one display update
+#       /cue/<number>/start                 starts a fade to the cue
+#       /cmd.lxconsole/GO (STOP, BACK) 1    presses a command button
+#       /cmd.lxconsole/<command> 1          other commands
+#       /key.lxconsole/<key> 1              presses a key
+#####
+
+    def registerOSCAddresses(self):
+        d = self.oscdispatcher
+        d.register("/*/dmx/*", self.oscDimmer)
+        d.register("/*/dmx", lambda params, args: self.oscDimmer(params + ("0",), args))
+        d.register("/channel/*", self.oscChannel)
+        d.register("/cue/*/start", self.oscCueStart)
+        d.register("/cmd.lxconsole/GO", lambda params, args: self.oscCommand(args, "go_cmd"))
+        d.register("/cmd.lxconsole/STOP", lambda params, args: self.oscCommand(args, "stop_cmd"))
+        d.register("/cmd.lxconsole/BACK", lambda params, args: self.oscCommand(args, "back_cmd"))
+        d.register("/cmd.lxconsole/*", self.oscExternalCommand)
+        d.register("/key.lxconsole/*", self.oscKey)
+
+    def oscDimmer(self, params, args):
+        if len(args) >= 1:
+            try:
+                universe = int(params[0])
+                slot = int(params[1])
+            except ValueError:
                 return
-            if parts[1] == "cue":
-                if parts[3] == "start":
-                    q = self.cueForNumber(parts[2])
-                    if q != None:
-                        self.startFadingToCue(q)
-        elif len(parts) == 3:
-            if parts[1] == "cmd.lxconsole":
-                if (self.delegate != None) and (args[0] > 0 ):
-                    if parts[2] == "GO":
-                        self.delegate.go_cmd()
-                        return
-                    if parts[2] == "STOP":
-                        self.delegate.stop_cmd()
-                        return
-                    if parts[2] == "BACK":
-                        self.delegate.back_cmd()
-                        return
-                    self.delegate.external_cmd(parts[2], args[0])
-                    return;
-            if parts[1] == "key.lxconsole":
-                if (self.delegate != None) and (args[0] > 0 ):
-                    self.delegate.external_key(parts[2])
-                    
-        
+            dim = universe*512 + slot + 1
+            if universe < 0 or slot < 0 or dim > self.livecue.patch.addresses:
+                return
+            if len(args) == 1 and LXCues.isLevel(args[0]):
+                self.livecue.setDimmerLevel(dim, args[0]*100)
+            else:
+                levels = LXCues.oscLevels(args)
+                if levels is None:
+                    return
+                self.livecue.setDimmerLevels(dim, levels)
+            self.oscDisplayChanged()
+
+    def oscChannel(self, params, args):
+        if len(args) >= 1:
+            try:
+                first = int(params[0]) - 1
+            except ValueError:
+                return
+            levels = LXCues.oscLevels(args)
+            if levels is None:
+                return
+            count = min(len(levels), len(self.livecue.livestate) - first)
+            if first < 0 or count <= 0:
+                return
+            self.livecue.setNewLevels(range(first, first+count), levels[0:count])
+            self.oscDisplayChanged()
+
+#####
+#     oscLevels converts the arguments of a block message to levels (0-100)
+#     from a blob of bytes (0-255) or from numeric arguments (0-1)
+#     returns None if an argument is not a level (T and F decode to bool, which is an int)
+#####
+
+    def isBlob(arg):
+        return isinstance(arg, (bytes, bytearray, memoryview))
+
+    def isLevel(arg):
+        return isinstance(arg, (int, float)) and not isinstance(arg, bool)
+
+    def oscLevels(args):
+        if LXCues.isBlob(args[0]):
+            if numpy != None:
+                return numpy.frombuffer(args[0], dtype=numpy.uint8) * (100/255)
+            return [b * (100/255) for b in args[0]]
+        for a in args:
+            if not LXCues.isLevel(a):
+                return None
+        return [min(max(a*100, 0), 100) for a in args]
+
+#####
+#     oscDisplayChanged asks the delegate for a display update
+#     asynchronous updates are coalesced so a stream of level messages
+#     does not redraw the display for each one
+#####
+
+    def oscDisplayChanged(self):
+        if self.delegate != None:
+            if hasattr(self.delegate, "updateDisplayAsynch"):
+                self.delegate.updateDisplayAsynch()
+            else:
+                self.delegate.updateDisplay()
+
+    def oscCueStart(self, params, args):
+        q = self.cueForNumber(params[0])
+        if q != None:
+            self.startFadingToCue(q)
+
+#####
+#     osc button messages act when their argument is greater than zero (pressed)
+#####
+
+    def oscPressed(self, args):
+        return (self.delegate != None) and (len(args) > 0) and (args[0] > 0)
+
+    def oscCommand(self, args, method):
+        if self.oscPressed(args):
+            getattr(self.delegate, method)()
+
+    def oscExternalCommand(self, params, args):
+        if self.oscPressed(args) and hasattr(self.delegate, "external_cmd"):
+            self.delegate.external_cmd(params[0], args[0])
+
+    def oscKey(self, params, args):
+        if self.oscPressed(args):
+            self.delegate.external_key(params[0])
+
+
+#################################################################
+#
+#     The LXPlayback class is an additional playback of the cues
+#     in an LXCues.  It has its own live cue, current and next cue
+#     so that its fades and follows run independently of the
+#     main playback and of each other.
+#
+#################################################################
+
+class LXPlayback:
+
+    def __init__(self, cues, number, livecue):
+        self.cues = cues                # LXCues containing the cues
+        self.number = number            # playback number
+        self.livecue = livecue          # live cue added to the cues' merge
+        self.current = None
+        self.next = None
+        self.releasing = False
+
+#####
+#     go starts a fade to cue
+#     or, if no cue is specified, to the next cue
+#     starttime is passed when a follow is started from fadeComplete
+#####
+
+    def go(self, cue=None, starttime=None):
+        if cue == None:
+            cue = self.next
+        if cue == None:
+            cue = self.cues.nextCueAfterCue(self.current)
+        if cue != None:
+            self.releasing = False
+            self.livecue.startFadeToCue(cue, self, starttime)
+            if starttime == None:
+                self.cues.renderloop.wake()
+            self.current = cue
+            self.next = self.cues.nextCueAfterCue(self.current)
+
+#####
+#     stop holds the fade where it is
+#####
+
+    def stop(self):
+        self.livecue.stopped = True
+        if self.livecue.fading:
+            self.livecue.followtime = -1
+            self.livecue.stopFading()
+
+#####
+#     release fades the playback out in time seconds
+#     when the fade is complete, its LTP channels return to playback 1
+#####
+
+    def release(self, time=0):
+        blank = LXCue(self.cues.channels)
+        blank.uptime = time
+        blank.downtime = time
+        self.releasing = True
+        self.livecue.startFadeToCue(blank, self, None, False)
+        self.cues.renderloop.wake()
+        self.current = None
+        self.next = None
+
+#####
+#     fade callbacks from the live cue
+#     the cues' delegate is only asked to update the display
+#####
+
+    def fadeStarted(self):
+        return
+
+    def fadeProgress(self):
+        self.cues.fadeProgress()
+
+    def fadeComplete(self):
+        if self.releasing:
+            self.releasing = False
+            self.cues.merge.releasePlayback(self.livecue.index)
+            self.livecue.setNeedsOutput()
+        if self.livecue.stopped == True:
+            self.next = self.current
+        if self.livecue.followtime >= 0:
+            self.go(None, self.livecue.completetime)
+        else:
+            self.livecue.delegate = None
+            self.cues.fadeProgress()
 
 #################################################################
 #
@@ -389,7 +674,8 @@ class LXCue:
         self.waituptime = 0             # wait time for increasing levels
         self.waitdowntime = 0           # wait time for decreasing levels
         self.followtime = -1            # time for followon (-1 is no follow)
-        self.oscstring = None;
+        self.curve = "linear"           # name of LXFadeCurve used to fade into the cue
+        self.osctriggers = []           # OSCTriggers sent when the cue is run
         
         if  cue == None:
             self.livestate = []         # list of floating point levels
@@ -405,7 +691,7 @@ class LXCue:
     def copyLevelsFromCue(self, cue):
         self.livestate = []
         for i in range(len(cue.livestate)):
-            self.livestate.append(cue.livestate[i])
+            self.livestate.append(float(cue.livestate[i]))
 
 #####
 #     setNewLevel sets a level of a channel in the livestate
@@ -491,8 +777,10 @@ class LXCue:
     def asciiString(self):
         s = self.descriptionString("\n") + "\n"
         s = s + self.levelsString()
-        if self.oscstring != None:
-            s = s + "$$OSCstring " + self.oscstring + "\n"
+        if self.curve != "linear":
+            s = s + "$$curve " + self.curve + "\n"
+        for trigger in self.osctriggers:
+            s = s + "$$OSCstring " + trigger.string + "\n"
         return s
         
 #####
@@ -519,14 +807,35 @@ class LXCue:
         return s
         
 #####
-#     oscString returns a the OSCstring or None
+#     oscString returns the OSC strings or None
 #####
             
     def oscString(self):
-        if self.oscstring != None:
-            return "Cue " + str(self.number) + " " + self.oscstring
+        if len(self.osctriggers) > 0:
+            return "Cue " + str(self.number) + " " + " ".join(t.string for t in self.osctriggers)
         return None 
 
+#####
+#     setOSCStrings replaces the cue's OSC triggers with a list of ip:port~address strings
+#     addOSCString adds one trigger
+#     each message is encoded here so running the cue only has to send it
+#     a string that is not a valid trigger is ignored and False is returned
+#####
+
+    def setOSCStrings(self, strings):
+        self.osctriggers = []
+        ok = True
+        for string in strings:
+            ok = self.addOSCString(string) and ok
+        return ok
+
+    def addOSCString(self, string):
+        trigger = OSCTrigger.fromString(string)
+        if trigger == None:
+            return False
+        self.osctriggers.append(trigger)
+        return True
+
 #################################################################
 #
 #     the LXLiveCue class is an LXCue that can fade from one state to another
@@ -535,20 +844,37 @@ class LXCue:
             
 class LXLiveCue (LXCue):
     
-    def __init__(self, channels, addresses):
+    def __init__(self, channels, addresses, engine="auto"):
         LXCue.__init__(self, channels)
-        self.initialstate = []      # list of floating point levels at start of fade
-        self.deltastate = []        # list of difference in level for fade
-        for i in range(channels):
-            self.deltastate.append(0.0)
-            self.initialstate.append(0.0)
+        # the array engine keeps the fade state in numpy arrays so that
+        # each pass of the fade loop is a few vector operations
+        # instead of a python loop over every channel
+        self.vectorized = ( numpy != None ) and ( engine != "list" )
+        if self.vectorized:
+            self.livestate = numpy.zeros(channels)      # float64 so results match list engine
+            self.initialstate = numpy.zeros(channels)
+            self.deltastate = numpy.zeros(channels)
+            self.upmask = numpy.zeros(channels, dtype=bool)   # True where deltastate > 0
+        else:
+            self.initialstate = []      # list of floating point levels at start of fade
+            self.deltastate = []        # list of difference in level for fade
+            for i in range(channels):
+                self.deltastate.append(0.0)
+                self.initialstate.append(0.0)
         
         self.output = None          # should be set to instance of ArtNetInterface
-        self.fading = False         # flag which causes fade loop to repeat until done
-        self.fade_thread = None     # thread for running fade() loop
+        self.input = None           # DMXInputMerge merged HTP with the output
+        self.fading = False         # flag which causes renderFrame to advance the fade
+        self.starttime = 0.0        # perf_counter time when the fade started
+        self.completetime = 0.0     # perf_counter time when the last fade finished
+        self.needsoutput = False    # flag which causes renderFrame to write a static look
+        self.lock = threading.RLock()   # protects fade state from GO/level changes during a frame
         self.delegate = None        # object to inform when fade is complete
         self.master = 1.0           # master level for output
         self.stopped = False
+        self.fadecurve = None       # LXFadeCurve applied to fade progress, None for linear
+        self.merge = None           # LXMerge this is a playback of
+        self.index = 0              # playback index in the merge
         
         self.patch = LXPatch(channels, addresses)
         self.output = None
@@ -569,26 +895,44 @@ class LXLiveCue (LXCue):
 #     writeToInterface() copies values from floating point list
 #     to buffer and sends them to the output interface
 #     here is where the patch translates channels to addresses
+#     levels are the merged levels of all playbacks, default is the livestate
+#     DMX input, if any, is merged HTP after the patch
+#     the frame ends at the highest patched address (or includes all of the input)
 #####
     
-    def writeToInterface(self):
+    def writeToInterface(self, levels=None):
+        if levels is None:
+            levels = self.livestate
         if self.output:
             try:
-                buffer = self.patch.byteArrayFromFloatList(self.livestate, self.master)
-                self.output.setDMXValues(buffer)    # dmx 0-255 levels written to self.output
+                buffer = self.patch.byteArrayFromFloatList(levels, self.master)
+                slots = self.patch.highestAddress()
+                if self.input != None:
+                    slots = max(slots, self.input.mergeInto(buffer))
+                # dmx 0-255 levels written to self.output, only up to the highest address in use
+                self.output.setDMXValues(memoryview(buffer)[0:slots])
                 self.output.sendDMXNow()
             except:
                 print ("Could not write to DMX output")
 
+#####       
+#     setNeedsOutput() causes the current live state to be written
+#     to the interface on the next frame of the render loop
+#####
+
+    def setNeedsOutput(self):
+        self.needsoutput = True
+
 #####       
 #     prepareFade() sets the initialstate and deltastate lists
 #     this means that calculating the livestate during the fade 
 #     is simply initial + delta * fade_progress
 #     when progress is 0.0, live is initialstate
 #     when progress is 1.0, live is newstate
+#     if claim is True, the channels that change become LTP owned by this playback
 #####
         
-    def prepareFade(self, cue, delegate=None):
+    def prepareFade(self, cue, delegate=None, claim=True):
         self.delegate = delegate
         self.number = cue.number
         self.uptime = cue.uptime
@@ -596,89 +940,146 @@ class LXLiveCue (LXCue):
         self.waituptime = cue.waituptime
         self.waitdowntime = cue.waitdowntime
         self.followtime = cue.followtime
-        for i in range(len(self.livestate)-1):
-            self.deltastate[i] = cue.livestate[i] - self.livestate[i]
-            self.initialstate[i] = self.livestate[i]
+        self.curve = cue.curve
+        self.fadecurve = LXFadeCurve.curveNamed(cue.curve)
+        if self.vectorized:
+            numpy.copyto(self.initialstate, self.livestate)
+            numpy.subtract(numpy.asarray(cue.livestate, dtype=numpy.float64), self.livestate, out=self.deltastate)
+            numpy.greater(self.deltastate, 0, out=self.upmask)
+        else:
+            for i in range(len(self.livestate)):
+                self.deltastate[i] = cue.livestate[i] - self.livestate[i]
+                self.initialstate[i] = self.livestate[i]
+        if claim and self.merge != None:
+            self.merge.claimChanges(self.index, self.deltastate)
 
 #####           
-#     fade() should be called on a separate thread after prepareFade()
+#     renderFrame() is called by the render loop once every frame
+#     now is the time.perf_counter() deadline of the frame
+#
+#     if fading, the fade is advanced to now
+#     returns True if the live state has changed and needs to be output
+#     delegate callbacks are made after the lock is released so that
+#     the delegate can start another fade (followtime) or update the display
+#####
+
+    def renderFrame(self, now):
+        progress = False
+        complete = False
+        with self.lock:
+            delegate = self.delegate
+            changed = self.needsoutput
+            self.needsoutput = False
+            if self.fading:
+                complete = self.fadeStep(now)
+                progress = True
+                changed = True
+        if delegate != None:
+            if progress:
+                delegate.fadeProgress()
+            if complete:
+                delegate.fadeComplete()        # may start another fade if followtime
+        return changed
+
+#####           
+#     fadeStep() calculates the live state for time now
 #     
-#     Each pass through the fade loop, a new live state is calculated.
 #     The progress of the fade (0.0 to 1.0) is determined by
 #     dividing the elapsed time by the fade time
 #     separate progress is calculated for channels that are increasing (uptime)
 #     and channels that are decreasing (downtime)
+#     the cue's fade curve, if any, is applied to each progress by table lookup
 #     then the new live state is calculated as initial + delta * fade_progress
-#     this is also multiplied by the master level (0.0-1.0) before
+#     the master level (0.0-1.0) is applied by the patch when
 #     the new live state is written to the interface
-#     the loop continues while the elapsed time is less than both the up and down times
+#     the fade continues while the elapsed time is less than both the up and down times
+#     or until the follow time is reached.
+#
+#     returns True when the fade is complete
 #####
             
-    def fade(self):
-        starttime = time.time();
-        etime = 0;
-        while self.fading:
-            etime = time.time()-starttime
-            if etime - self.waituptime > 0:
-                if self.uptime > 0:
-                    upprogress = (etime - self.waituptime)/self.uptime
-                    if upprogress > 1.0:
-                        upprogress = 1.0
-                else:
+    def fadeStep(self, now):
+        etime = now - self.starttime
+        if etime - self.waituptime > 0:
+            if self.uptime > 0:
+                upprogress = (etime - self.waituptime)/self.uptime
+                if upprogress > 1.0:
                     upprogress = 1.0
             else:
-                upprogress = 0.0
-            if etime - self.waitdowntime > 0:
-                if self.downtime > 0:
-                    downprogress = (etime - self.waitdowntime)/self.downtime
-                    if downprogress > 1.0:
-                        downprogress = 1.0
-                else:
+                upprogress = 1.0
+        else:
+            upprogress = 0.0
+        if etime - self.waitdowntime > 0:
+            if self.downtime > 0:
+                downprogress = (etime - self.waitdowntime)/self.downtime
+                if downprogress > 1.0:
                     downprogress = 1.0
             else:
-                downprogress = 0.0
-                
-            for i in range(len(self.livestate)-1):
+                downprogress = 1.0
+        else:
+            downprogress = 0.0
+        if self.fadecurve != None:
+            upprogress = self.fadecurve.valueAt(upprogress)
+            downprogress = self.fadecurve.valueAt(downprogress)
+            
+        self.fadeFrame(upprogress, downprogress)
+        
+        self.fading = ((etime - self.waituptime) < self.uptime) or ((etime - self.waitdowntime) < self.downtime)
+        self.completetime = now
+        if self.followtime >= 0:
+            if etime >= self.followtime:
+                # a follow starts on time even if the frame was late
+                self.fading = False
+                self.completetime = self.starttime + self.followtime
+        return not self.fading
+
+#####
+#     fadeFrame() calculates a new live state from the fade progress
+#     channels that are increasing use upprogress,
+#     channels that are decreasing use downprogress
+#     the array engine does this for all channels in a few vector operations
+#####
+
+    def fadeFrame(self, upprogress, downprogress):
+        if self.vectorized:
+            progress = numpy.where(self.upmask, upprogress, downprogress)
+            numpy.multiply(progress, self.deltastate, out=progress)
+            numpy.add(self.initialstate, progress, out=self.livestate)
+        else:
+            for i in range(len(self.livestate)):
                 if self.deltastate[i] > 0:
                     self.livestate[i] = (self.initialstate[i] + upprogress * self.deltastate[i])
                 else:
                     self.livestate[i] = (self.initialstate[i] + downprogress * self.deltastate[i])
-            self.writeToInterface()
-            if self.delegate != None:
-                self.delegate.fadeProgress()
-            
-            self.fading = ((etime - self.waituptime) < self.uptime) or ((etime - self.waitdowntime) < self.downtime)
-            if self.followtime >= 0:
-                self.fading = self.fading and  ( etime < self.followtime )
-            if self.fading:
-                time.sleep(0.025)   #max 40 times per sec for DMX
-                
-        self.fade_thread = None
-        if self.delegate != None:
-            self.delegate.fadeComplete()        # may start another fade if followtime
 
 #####       
-#     startFading() creates a new thread which will loop until the fade is finished
-#     Or, until self.fading is set to false
+#     startFading() sets the fading flag so that the render loop
+#     advances the fade each frame until it is finished
+#     or, until self.fading is set to false
+#     starttime is used to chain a follow to the end of the previous fade
 #####
         
-    def startFading(self):
-        self.fading = True;
-        if self.fade_thread is None:
-            self.fade_thread = threading.Thread(target=self.fade)
-            self.fade_thread.daemon = True
-            self.fade_thread.start()
+    def startFading(self, starttime=None):
+        with self.lock:
+            if starttime == None:
+                starttime = time.perf_counter()
+            self.starttime = starttime
+            self.fading = True
         if self.delegate != None:
             self.delegate.fadeStarted()
 
 #####   
-#     stopFading() sets the fading flag to false and waits for the 
-#     fade loop to exit and the current fade thread to end
+#     stopFading() clears the fading flag so the render loop leaves the
+#     live state where it is.  The delegate is told the fade is complete.
 #####
     
     def stopFading(self):
-        while self.fade_thread != None:
+        with self.lock:
+            wasfading = self.fading
             self.fading = False
+            delegate = self.delegate
+        if wasfading and delegate != None:
+            delegate.fadeComplete()
             
 ######      
 #     startFadeToCue() stops the current fade (if necessary)
@@ -686,13 +1087,14 @@ class LXLiveCue (LXCue):
 #     cue times and then starts the fade
 #####
             
-    def startFadeToCue(self, cue, delegate=None):
-        if self.fading:
-            self.delegate = None
-            self.stopFading()
-        self.prepareFade(cue, delegate)
-        self.stopped = False
-        self.startFading()
+    def startFadeToCue(self, cue, delegate=None, starttime=None, claim=True):
+        with self.lock:
+            if self.fading:
+                self.delegate = None
+                self.stopFading()
+            self.prepareFade(cue, delegate, claim)
+            self.stopped = False
+        self.startFading(starttime)
 
 #####   
 #     setMaster(level) converts a percentage 0-100 into the master 0.0-1.0 for
@@ -701,20 +1103,72 @@ class LXLiveCue (LXCue):
         
     def setMaster(self, level):
         self.master = level / 100.0
+        self.needsoutput = True
 
 #####       
 #     setNewLevel() changes the level of a channel in the livestate
 #     or, if fading, it modifies the fade so that the channel remains at the new level
+#     the change is output by the render loop on its next frame
 #####
             
     def setNewLevel(self, channel, level):
-        if not self.fading:
-            self.livestate[int(channel)-1] = float(level)
-            self.writeToInterface()
+        with self.lock:
+            if self.merge != None:
+                self.merge.claimChannel(self.index, int(channel)-1)
+            if not self.fading:
+                self.livestate[int(channel)-1] = float(level)
+                self.needsoutput = True
+            else:
+                self.deltastate[int(channel)-1] = 0                 # stop changing
+                self.initialstate[int(channel)-1] = float(level)    # set new state on the
+                                                                    # next pass through loop
+
+#####
+#     setNewLevels() is setNewLevel() for a block of channels in one write
+#     indexes is a list (or numpy array) of channel indexes (0 based)
+#     and levels has a level (0-100) for each index
+#####
+
+    def setNewLevels(self, indexes, levels):
+        if len(indexes) == 0:
+            return
+        if self.vectorized:
+            indexes = numpy.asarray(indexes, dtype=numpy.intp)
+            levels = numpy.asarray(levels, dtype=numpy.float64)
+        with self.lock:
+            if self.merge != None:
+                self.merge.claimChannels(self.index, indexes)
+            if self.vectorized:
+                if not self.fading:
+                    self.livestate[indexes] = levels
+                    self.needsoutput = True
+                else:
+                    self.deltastate[indexes] = 0
+                    self.initialstate[indexes] = levels
+            else:
+                if not self.fading:
+                    for c, level in zip(indexes, levels):
+                        self.livestate[c] = float(level)
+                    self.needsoutput = True
+                else:
+                    for c, level in zip(indexes, levels):
+                        self.deltastate[c] = 0
+                        self.initialstate[c] = float(level)
+
+#####
+#     setDimmerLevels sets the channels patched to count dimmers starting at dimmer
+#     levels has a level (0-100) for each dimmer, unpatched dimmers are skipped
+#####
+
+    def setDimmerLevels(self, dimmer, levels):
+        channels = self.patch.channelIndexesForDimmers(dimmer, len(levels))
+        if self.vectorized:
+            channels = numpy.array(channels, dtype=numpy.intp)
+            patched = channels >= 0
+            self.setNewLevels(channels[patched], numpy.asarray(levels, dtype=numpy.float64)[patched])
         else:
-            self.deltastate[int(channel)-1] = 0                 # stop changing
-            self.initialstate[int(channel)-1] = float(level)    # set new state on the
-                                                                # next pass through loop
+            indexes = [i for i in range(len(channels)) if channels[i] >= 0]
+            self.setNewLevels([channels[i] for i in indexes], [levels[i] for i in indexes])
             
 #####
 #     patchAddressToChannel calls the patch's patchAddressToChannel method
@@ -9,12 +9,14 @@
 from LXCues import LXCue
 from LXCues import LXCues
 from USITTAsciiParser import USITTAsciiParser
+from LXFadeCurve import LXFadeCurve
 
 class LXCuesAsciiParser (USITTAsciiParser):
 
-	def __init__(self, channels, dimmers, interface):
+	def __init__(self, channels, dimmers, interface, engine="auto"):
 		USITTAsciiParser.__init__(self)
-		self.cues = LXCues(channels, dimmers)
+		self.success = False
+		self.cues = LXCues(channels, dimmers, engine)
 		#default is 1-1 patch, start blank
 		self.cues.clearPatch()
 		self.cues.livecue.output = interface;
@@ -68,11 +70,26 @@ class LXCuesAsciiParser (USITTAsciiParser):
 		
 	def doOSCstringForCue(self, cue, string):
 		q = self.cues.createCueForNumber(cue)
-		q.oscstring = string
+		if not q.addOSCString(string):		# each $$OSCstring line adds a trigger
+			self.addMessage("bad $$OSCstring (ignored)")
+		
+	def doCurveForCue(self, cue, curve):
+		q = self.cues.createCueForNumber(cue)
+		q.curve = curve
 		
 	def keywordMfgForCue(self, keyword):
 		if keyword == "$$OSCstrin":
 			self.doKeywordOSCstringForCue()
+		elif keyword == "$$curve":
+			self.doKeywordCurveForCue()
+		return True
+		
+	def doKeywordCurveForCue(self):
+		if len(self.tokens) == 2:
+			if self.tokens[1] == "linear" or LXFadeCurve.curveNamed(self.tokens[1]) != None:
+				self.doCurveForCue(self.cue, self.tokens[1])
+				return True
+		self.addMessage("bad $$curve (ignored)")
 		return True
 		
 	def doKeywordOSCstringForCue(self,):
@@ -87,18 +104,40 @@ class LXCuesAsciiParser (USITTAsciiParser):
 	def recognizedMfgBasic(self, keyword):
 		if keyword == "$$dimoption":
 			return True
+		if keyword == "$$curvedef":
+			return True
+		if keyword == "$$ltp":
+			return True
 		return False
 		
 	def keywordMfgBasic(self, keyword):
 		if keyword == "$$dimoption":
 			if len(self.tokens) == 3:
 				self.cues.setOptionForAddress(int(self.tokens[1]), int(self.tokens[2]))
+		elif keyword == "$$curvedef":
+			if len(self.tokens) < 4 or not LXFadeCurve.defineCurve(self.tokens[1], self.tokens[2:]):
+				self.addMessage("bad $$curvedef (ignored)")
+		elif keyword == "$$ltp":
+			for t in self.tokens[1:]:
+				if t.isdigit() and int(t) > 0 and int(t) <= self.cues.channels:
+					self.cues.setLTP(int(t))
+				else:
+					self.addMessage("bad $$ltp channel (ignored)")
 		return True
 		
 	def parseFile(self, path):
 		f = open(path, 'r')
 		fs = f.read()
 		f.close()
-		self.success = USITTAsciiParser.processString(self,fs)
+		# the show only has the curves it defines, the previous show keeps
+		# its curves if this one cannot be read
+		previous = LXFadeCurve.customCurves()
+		LXFadeCurve.removeCustomCurves()
+		self.success = False
+		try:
+			self.success = USITTAsciiParser.processString(self,fs)
+		finally:
+			if not self.success:
+				LXFadeCurve.restoreCustomCurves(previous)
 		self.cues.putCuesInOrder()
 		return self.message
\ No newline at end of file
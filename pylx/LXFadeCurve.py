@@ -0,0 +1,135 @@
+#   LXFadeCurve.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+import math
+
+#################################################################
+#
+#     The LXFadeCurve class maps the linear progress of a fade (0.0-1.0)
+#     to a shaped progress (0.0-1.0) using a precomputed table.
+#     Applying a curve during a fade is a single table lookup.
+#
+#     Built-in curves are linear, scurve, exp (slow start) and log (fast start).
+#     Custom curves are defined by evenly spaced points in percent
+#     and are saved in the show file with $$curvedef.
+#
+#################################################################
+
+class LXFadeCurve:
+
+    RESOLUTION = 4096           # table has RESOLUTION+1 entries
+    curves = {}                 # name -> LXFadeCurve
+    
+    def __init__(self, name, function, points=None):
+        self.name = name
+        self.points = points    # percent values of a custom curve, otherwise None
+        self.table = []
+        for i in range(LXFadeCurve.RESOLUTION+1):
+            self.table.append(float(function(i/LXFadeCurve.RESOLUTION)))
+        self.table[0] = 0.0
+        self.table[LXFadeCurve.RESOLUTION] = 1.0
+
+#####
+#     valueAt returns the curve's value for progress p (0.0-1.0)
+#####
+
+    def valueAt(self, p):
+        return self.table[int(p * LXFadeCurve.RESOLUTION + 0.5)]
+
+#####
+#     defString returns the $$curvedef line for a custom curve
+#####
+
+    def defString(self):
+        if self.points == None:
+            return ""
+        s = "$$curvedef " + self.name
+        for p in self.points:
+            s += " " + str(p)
+        return s + "\n"
+
+#####
+#     curveNamed returns the curve with name
+#     linear or an unknown name returns None, meaning no curve is applied
+#####
+
+    def curveNamed(name):
+        if name in LXFadeCurve.curves:
+            return LXFadeCurve.curves[name]
+        return None
+
+    def curveNames():
+        return ["linear"] + sorted(LXFadeCurve.curves.keys())
+
+#####
+#     addCurve registers a curve from a function of progress
+#####
+
+    def addCurve(name, function):
+        LXFadeCurve.curves[name] = LXFadeCurve(name, function)
+
+#####
+#     defineCurve registers a custom curve from a list of two or more
+#     evenly spaced percent values (first value is at 0.0, last is at 1.0)
+#     values in between are interpolated
+#     returns False (and defines nothing) if a value is not a number
+#     or name is a built-in curve
+#####
+
+    def defineCurve(name, points):
+        if len(points) < 2 or name == "linear":
+            return False
+        if name in LXFadeCurve.curves and LXFadeCurve.curves[name].points == None:
+            return False
+        values = []
+        for p in points:
+            try:
+                v = float(p)
+            except ValueError:
+                return False
+            if not math.isfinite(v):
+                return False
+            values.append(v)
+        segments = len(values) - 1
+        def interpolate(x):
+            i = min(int(x * segments), segments - 1)
+            f = x * segments - i
+            return (values[i] + f * (values[i+1] - values[i])) / 100.0
+        curve = LXFadeCurve(name, interpolate, points)
+        LXFadeCurve.curves[name] = curve
+        return True
+
+#####
+#     customCurves returns the list of curves defined from points
+#####
+
+    def customCurves():
+        result = []
+        for name in sorted(LXFadeCurve.curves.keys()):
+            if LXFadeCurve.curves[name].points != None:
+                result.append(LXFadeCurve.curves[name])
+        return result
+
+#####
+#     removeCustomCurves leaves only the built-in curves (before a show is read)
+#     restoreCustomCurves replaces the custom curves with a list from customCurves
+#####
+
+    def removeCustomCurves():
+        for curve in LXFadeCurve.customCurves():
+            del LXFadeCurve.curves[curve.name]
+
+    def restoreCustomCurves(curves):
+        LXFadeCurve.removeCustomCurves()
+        for curve in curves:
+            LXFadeCurve.curves[curve.name] = curve
+
+
+LXFadeCurve.addCurve("scurve", lambda x: 0.5 - 0.5 * math.cos(math.pi * x))
+LXFadeCurve.addCurve("exp", lambda x: (math.exp(4.0 * x) - 1.0) / (math.exp(4.0) - 1.0))
+LXFadeCurve.addCurve("log", lambda x: 1.0 - (math.exp(4.0 * (1.0 - x)) - 1.0) / (math.exp(4.0) - 1.0))
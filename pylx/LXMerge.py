@@ -0,0 +1,189 @@
+#   LXMerge.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+    # numpy is optional, without it the merge loops over every channel
+
+#################################################################
+#
+#     The LXMerge class combines the live states of several
+#     playbacks (LXLiveCue) into one list of channel levels.
+#
+#     Channels merge HTP (highest takes precedence) unless they
+#     are set to LTP (latest takes precedence).
+#     An LTP channel takes its level from the playback that last
+#     moved it, either by fading to a cue or by a level change.
+#     This is tracked by the owner list which holds the index of
+#     that playback for each channel.
+#
+#     With numpy, the merge is one maximum per playback and, if there
+#     are LTP channels, one masked copy per playback.
+#     The LTP masks are only rebuilt when ownership changes.
+#
+#     With a single playback, levels is that playback's livestate
+#     so there is nothing to merge.
+#
+#################################################################
+
+class LXMerge:
+
+    MAX_PLAYBACKS = 8
+
+    def __init__(self, channels, engine="auto"):
+        self.channels = channels
+        self.vectorized = ( numpy != None ) and ( engine != "list" )
+        self.playbacks = []             # list of LXLiveCue, replaced (not modified) when one is added
+        self.levels = None              # merged levels
+        self.hasltp = False             # True if any channel is LTP
+        self.ownerchanged = True        # LTP masks need to be rebuilt
+        self.ownermasks = []            # per playback, True where it supplies an LTP channel
+        if self.vectorized:
+            self.mergedstate = numpy.zeros(channels)
+            self.ltp = numpy.zeros(channels, dtype=bool)
+            self.owner = numpy.zeros(channels, dtype=numpy.intp)
+        else:
+            self.mergedstate = [0.0] * channels
+            self.ltp = [False] * channels
+            self.owner = [0] * channels
+
+#####
+#     addPlayback adds a live cue to the merge and returns its index
+#     or -1 if there are already MAX_PLAYBACKS
+#####
+
+    def addPlayback(self, livecue):
+        index = len(self.playbacks)
+        if index >= LXMerge.MAX_PLAYBACKS:
+            return -1
+        livecue.merge = self
+        livecue.index = index
+        if self.vectorized:
+            self.ownermasks.append(numpy.zeros(self.channels, dtype=bool))
+        self.ownerchanged = True
+        if index == 0:
+            self.levels = livecue.livestate
+        else:
+            self.levels = self.mergedstate
+        self.playbacks = self.playbacks + [livecue]
+        return index
+
+#####
+#     setLTP sets a channel (1 based) to merge LTP (ltp=True) or HTP
+#####
+
+    def setLTP(self, channel, ltp=True):
+        self.ltp[int(channel)-1] = ltp
+        self.hasltp = any(self.ltp)
+        self.ownerchanged = True
+
+    def isLTP(self, channel):
+        return bool(self.ltp[int(channel)-1])
+
+#####
+#     ltpChannels returns a list of the LTP channel numbers
+#####
+
+    def ltpChannels(self):
+        return [i+1 for i in range(self.channels) if self.ltp[i]]
+
+#####
+#     ltpString returns $$ltp lines listing the LTP channels for the show file
+#####
+
+    def ltpString(self):
+        s = ""
+        chans = self.ltpChannels()
+        for i in range(0, len(chans), 16):
+            s += "$$ltp " + " ".join(str(c) for c in chans[i:i+16]) + "\n"
+        return s
+
+#####
+#     claimChannel makes playback index the owner of a channel (0 based)
+#####
+
+    def claimChannel(self, index, c):
+        if self.owner[c] != index:
+            self.owner[c] = index
+            self.ownerchanged = True
+
+#####
+#     claimChannels makes playback index the owner of a list of channels (0 based)
+#####
+
+    def claimChannels(self, index, indexes):
+        if self.vectorized:
+            self.owner[indexes] = index
+        else:
+            for c in indexes:
+                self.owner[c] = index
+        self.ownerchanged = True
+
+#####
+#     claimChanges makes playback index the owner of the channels
+#     where deltastate (from LXLiveCue.prepareFade) is not zero
+#####
+
+    def claimChanges(self, index, deltastate):
+        if self.vectorized:
+            self.owner[numpy.not_equal(deltastate, 0)] = index
+        else:
+            for c in range(self.channels):
+                if deltastate[c] != 0:
+                    self.owner[c] = index
+        self.ownerchanged = True
+
+#####
+#     releasePlayback returns the channels owned by playback index
+#     to the first playback
+#####
+
+    def releasePlayback(self, index):
+        if self.vectorized:
+            self.owner[self.owner == index] = 0
+        else:
+            for c in range(self.channels):
+                if self.owner[c] == index:
+                    self.owner[c] = 0
+        self.ownerchanged = True
+
+#####
+#     mergeFrame combines the playbacks' livestates and returns the merged levels
+#     it is called by the render loop when any playback has changed
+#####
+
+    def mergeFrame(self):
+        playbacks = self.playbacks
+        if len(playbacks) < 2:
+            return self.levels
+        levels = self.mergedstate
+        if self.vectorized:
+            numpy.copyto(levels, playbacks[0].livestate)
+            for i in range(1, len(playbacks)):
+                numpy.maximum(levels, playbacks[i].livestate, out=levels)
+            if self.hasltp:
+                if self.ownerchanged:
+                    self.ownerchanged = False
+                    for i in range(len(playbacks)):
+                        numpy.equal(self.owner, i, out=self.ownermasks[i])
+                        numpy.logical_and(self.ownermasks[i], self.ltp, out=self.ownermasks[i])
+                for i in range(len(playbacks)):
+                    numpy.copyto(levels, playbacks[i].livestate, where=self.ownermasks[i])
+        else:
+            for c in range(self.channels):
+                if self.ltp[c] and self.owner[c] < len(playbacks):
+                    levels[c] = playbacks[self.owner[c]].livestate[c]
+                else:
+                    lv = playbacks[0].livestate[c]
+                    for i in range(1, len(playbacks)):
+                        if playbacks[i].livestate[c] > lv:
+                            lv = playbacks[i].livestate[c]
+                    levels[c] = lv
+        return levels
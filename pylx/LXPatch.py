@@ -6,6 +6,12 @@
 #  see license included with this distribution or
 #  https://www.claudeheintzdesign.com/lx/opensource.html
 
+try:
+	import numpy
+except ImportError:
+	numpy = None
+	# without numpy the compiled patch is applied with a single python loop
+
 
 class LXPatchableAddress:
 
@@ -75,38 +81,194 @@ class LXPatchList:
 				return True
 		return False
 		
+#################################################################
+#
+#	LXCompiledPatch is a flat form of the patch used to make output frames
+#	there is one entry for each patched address:
+#		index		channel (list index) that controls the address
+#					always on addresses use index == channels, a fixed 100% level
+#		address		output slot (buffer index)
+#		level		proportional level of the address
+#		nomaster	True if the master is not applied to the address
+#		row			row of LUT that translates 0-255 into the option's output
+#
+#################################################################
+
+class LXCompiledPatch:
+
+	# LUT rows: 0 normal, 1 non-dim, 2 always on, 3 no master, 4 unknown option (off)
+	LUT = [bytes(range(256)), bytes([0]+[255]*255), bytes(range(256)), bytes(range(256)), bytes(256)]
+
+	def __init__(self, patch):
+		self.channels = len(patch.patch)
+		self.index = []
+		self.address = []
+		self.level = []
+		self.nomaster = []
+		self.row = []
+		self.highest = 0		# highest patched address (1 based), 0 if none
+		self.channelfor = [-1] * patch.addresses	# channel index for each address, -1 if none
+		for i in range (self.channels):
+			for pa in patch.patch[i].list:
+				if pa.number >= 0 and pa.number < patch.addresses:
+					self.highest = max(self.highest, pa.number+1)
+					if self.channelfor[pa.number] < 0:
+						self.channelfor[pa.number] = i
+					self.address.append(pa.number)
+					self.level.append(pa.level)
+					if pa.option == 2:
+						self.index.append(self.channels)
+					else:
+						self.index.append(i)
+					self.nomaster.append(pa.option == 2 or pa.option == 3)
+					if pa.option >= 0 and pa.option <= 3:
+						self.row.append(pa.option)
+					else:
+						self.row.append(4)
+		self.master = None
+		self.scale = None
+		if numpy != None:
+			self.index = numpy.array(self.index, dtype=numpy.intp)
+			self.address = numpy.array(self.address, dtype=numpy.intp)
+			self.level = numpy.array(self.level, dtype=numpy.float64)
+			self.nomaster = numpy.array(self.nomaster, dtype=bool)
+			self.row = numpy.array(self.row, dtype=numpy.intp)
+			self.lut = numpy.array([list(r) for r in LXCompiledPatch.LUT], dtype=numpy.uint8)
+			self.levels = numpy.zeros(self.channels+1)
+			self.levels[self.channels] = 100.0
+
+#####
+#	scaleForMaster returns master*level for each address
+#	(just level for addresses with options that ignore the master)
+#	it is only recalculated when the master changes
+#####
+
+	def scaleForMaster(self, master):
+		if master != self.master:
+			if numpy != None:
+				self.scale = numpy.where(self.nomaster, self.level, master*self.level)
+			else:
+				self.scale = []
+				for k in range(len(self.level)):
+					if self.nomaster[k]:
+						self.scale.append(self.level[k])
+					else:
+						self.scale.append(master*self.level[k])
+			self.master = master
+		return self.scale
+
+#####
+#	writeFrame fills buffer with dmx values for the list of channel levels
+#	with numpy this is one gather/scale/round/clip/lookup pass
+#	the result is identical to LXPatchableAddress.dmxForLevel
+#####
+
+	def writeFrame(self, buffer, fl, master):
+		scale = self.scaleForMaster(master)
+		if numpy != None:
+			self.levels[0:self.channels] = fl
+			x = scale * self.levels[self.index]
+			x /= 100.0
+			x *= 255.0
+			numpy.rint(x, out=x)
+			numpy.clip(x, 0, 255, out=x)
+			view = numpy.frombuffer(buffer, dtype=numpy.uint8)
+			view[self.address] = self.lut[self.row, x.astype(numpy.intp)]
+		else:
+			lut = LXCompiledPatch.LUT
+			for k in range(len(self.index)):
+				i = self.index[k]
+				if i < self.channels:
+					v = round(scale[k]*fl[i]/100.0*255.0)
+				else:
+					v = round(scale[k]*100.0/100.0*255.0)
+				if v < 0:
+					v = 0
+				elif v > 255:
+					v = 255
+				buffer[self.address[k]] = lut[self.row[k]][v]
+
+#################################################################
+#
+#	LXPatch maps channels to addresses
+#	each channel has a LXPatchList of the addresses it controls
+#	the patch is compiled into a LXCompiledPatch when it is needed
+#	to make an output frame after it has changed
+#
+#	addresses are numbered consecutively across universes
+#	address 513 is universe 2 slot 1 (written 2.1)
+#
+#################################################################
+
 class LXPatch:
 
+	SLOTS = 512
+
 	def __init__(self, channels, addresses):
 		self.addresses = addresses
 		self.patch = []
 		for i in range (channels):
 			self.patch.append(LXPatchList(i))
+		self.compiled = None			# rebuilt by compiledPatch when None
+		self.frame = bytearray(addresses)	# reused for every output frame
+		self.blank = bytes(addresses)
 			
 	def unpatchAddress(self, address):
 		for i in range (len(self.patch)):
 			self.patch[i].unpatchAddress(address)
+		self.compiled = None
 			
 	def unpatchAll(self):
 		for i in range (len(self.patch)):
 			self.patch[i].list = []	
+		self.compiled = None
 			
 	def patchAddressToChannel(self, address, channel, level=1.0, option=0):
 		if address > 0 and address <= self.addresses:
 			self.unpatchAddress(address-1)
 			if channel > 0 and channel <= len(self.patch):
 				self.patch[channel-1].patchAddress(address-1, level, option)
+			self.compiled = None
 		
+#####
+#	universes returns the number of 512 slot universes needed for all addresses
+#	the output frame has this many universes
+#####
+
+	def universes(self):
+		return (self.addresses + LXPatch.SLOTS - 1) // LXPatch.SLOTS
+
+#####
+#	addressForString converts "universe.slot" or a plain address to an address
+#	universes are numbered from 1
+#####
+
+	def addressForString(s):
+		parts = str(s).split(".")
+		if len(parts) == 2:
+			return (int(parts[0])-1)*LXPatch.SLOTS + int(parts[1])
+		return int(s)
+
+#####
+#	highestAddress returns the highest patched address (1 based) or 0 if nothing is patched
+#	output frames only need to be this long
+#	it is kept by the compiled patch so it is only recalculated when the patch changes
+#####
+
 	def highestAddress(self):
-		h = 0
+		compiled = self.compiled
+		if compiled != None:
+			return compiled.highest
+		h = -1
 		for i in range (len(self.patch)):
-			h = self.patch[i].hightstAddress(h)
-		return h
+			h = self.patch[i].highestAddress(h)
+		return min(h+1, self.addresses)
 		
 	def setOptionForAddress(self, addr, option, level=-1):
 		for i in range (len(self.patch)):
 			if self.patch[i].setOptionForAddress(addr-1, option, level):
 				break
+		self.compiled = None
 		
 	def patchString(self):
 		ca = []
@@ -153,21 +315,41 @@ class LXPatch:
 			s += "\n"
 		return s
 		
+#####
+#	byteArrayFromFloatList returns a bytearray of dmx values for the channel levels
+#	the same bytearray is reused for each call, it is overwritten by the next frame
+#####
+		
+	def compiledPatch(self):
+		compiled = self.compiled
+		if compiled == None:
+			compiled = LXCompiledPatch(self)
+			self.compiled = compiled
+		return compiled
+
 	def byteArrayFromFloatList(self, fl, master=1.0):
-		ba = bytearray(self.addresses)
-		for j in range(self.addresses):	#zero the bytearray
-			ba[j] = 0
+		compiled = self.compiledPatch()
+		self.frame[:] = self.blank
 		if len(fl) == len(self.patch):		#error if these are not the same length
-			for i in range(len(fl)):
-				pl = self.patch[i]
-				if len(pl.list) > 0:
-					for j in range(len(pl.list)):
-						ba[pl.list[j].number] = pl.list[j].dmxForLevel(fl[i], master)
-		return ba
+			compiled.writeFrame(self.frame, fl, master)
+		return self.frame
 		
 	def channelForDimmer(self, dimmer):
-		for i in range (len(self.patch)):
-			if self.patch[i].containsAddress(dimmer):
-				return i+1
+		channelfor = self.compiledPatch().channelfor
+		if dimmer > 0 and dimmer <= len(channelfor):
+			return channelfor[dimmer-1] + 1
 		return 0
+
+#####
+#	channelIndexesForDimmers returns a list of the channel indexes (0 based)
+#	patched to count dimmers starting at dimmer, -1 for an unpatched dimmer
+#	the list always has count entries, dimmers outside 1 to addresses are -1
+#####
+
+	def channelIndexesForDimmers(self, dimmer, count):
+		channelfor = self.compiledPatch().channelfor
+		first = min(max(dimmer-1, 0), len(channelfor))
+		last = max(min(dimmer-1+count, len(channelfor)), first)
+		before = min(max(first-dimmer+1, 0), count)
+		return [-1] * before + channelfor[first:last] + [-1] * (count-before-last+first)
 			
\ No newline at end of file
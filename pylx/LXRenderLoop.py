@@ -0,0 +1,101 @@
+#   LXRenderLoop.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+import threading
+import time
+
+#################################################################
+#
+#     The LXRenderLoop class runs one long-lived thread that calls
+#     its target's renderFrame(now) method at a fixed rate.
+#
+#     Frames are scheduled on time.perf_counter() deadlines.
+#     Each deadline is the previous deadline plus the frame period
+#     so the time it takes to render a frame does not change the frame rate.
+#     If the loop falls more than a frame behind, the missed frames
+#     are skipped instead of being rendered back to back.
+#
+#     The loop waits on an Event rather than sleeping so that
+#     stop() and wake() take effect immediately.
+#
+#################################################################
+
+class LXRenderLoop:
+
+    def __init__(self, target, rate=44.0):
+        self.target = target            # object with renderFrame(now) method
+        self.render_thread = None
+        self.rendering = False
+        self.wake_event = threading.Event()     # set to end the wait for the next frame
+        self.frames = 0                 # number of frames rendered
+        self.skipped = 0                # number of times the loop fell behind
+        self.setRate(rate)
+
+#####
+#     setRate sets the number of frames per second
+#####
+
+    def setRate(self, rate):
+        if rate <= 0:
+            rate = 44.0
+        self.rate = rate
+        self.period = 1.0/rate
+
+#####
+#     start creates the render thread
+#####
+
+    def start(self):
+        self.rendering = True
+        self.wake_event.clear()
+        if self.render_thread is None:
+            self.render_thread = threading.Thread(target=self.render)
+            self.render_thread.daemon = True
+            self.render_thread.start()
+
+#####
+#     wake renders a frame immediately (for instance after GO)
+#     frames continue at the regular rate from that time
+#####
+
+    def wake(self):
+        self.wake_event.set()
+
+#####
+#     stop ends the render loop and waits for the thread to finish
+#####
+
+    def stop(self):
+        self.rendering = False
+        self.wake_event.set()
+        thread = self.render_thread
+        if thread != None and thread != threading.current_thread():
+            thread.join()
+
+#####
+#     render is the method attached to the render thread (don't call directly)
+#####
+
+    def render(self):
+        deadline = time.perf_counter()
+        while self.rendering:
+            try:
+                self.target.renderFrame(deadline)
+            except Exception as e:
+                print ("Render error ", e)
+            self.frames += 1
+            deadline += self.period
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                if self.wake_event.wait(delay):
+                    self.wake_event.clear()
+                    deadline = time.perf_counter()
+            elif delay < -self.period:
+                self.skipped += 1
+                deadline = time.perf_counter()
+        self.render_thread = None
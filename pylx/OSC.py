@@ -8,45 +8,108 @@
 
 
 import socket
-import threading
-import time
+import struct
+from ArtNet import DMXTransmitter
+
+##################################################################################
+#	OSCInterface
+#
+#	Sends OSC messages.  Packets are posted to a DMXTransmitter which sends
+#	them from its own thread, so the caller (the GO button on the Tk thread)
+#	never waits for name lookup or the socket.
+##################################################################################
 
 class OSCInterface:
 	
 	def __init__(self):
 		self.udpsocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.udpsocket.setblocking(False)
+		self.transmitter = DMXTransmitter(self.udpsocket)
+
+#####
+#	sendPacket posts an encoded packet to be sent to (target_ip, port)
+#	stop ends the sender thread after sending what is pending and closes the socket
+#	packets sent after stop are dropped
+#####
+
+	def sendPacket(self, packet, target):
+		if self.udpsocket.fileno() == -1:
+			return
+		self.transmitter.start()
+		self.transmitter.post(None, packet, [target])
+
+	def stop(self):
+		self.transmitter.stop()
+		self.udpsocket.close()
+
+#####
+#	sendTriggers sends the pre-encoded messages of a list of OSCTriggers
+#####
+
+	def sendTriggers(self, triggers):
+		for trigger in triggers:
+			self.sendPacket(trigger.packet, trigger.target)
 
 	def sendOSC(self, target_ip, port, message):
-		ml = len(message)
-		buffer = bytearray(ml + 1)
-		buffer[ml] = 0
-		buffer[0:ml] = message
-		self.udpsocket.sendto(buffer, (target_ip, port))
+		self.sendPacket(OSCInterface.encodeMessage(message), (target_ip, port))
 		
 	def sendOSCFromString(self, string):
-		cp=string.split("~")
-		if len(cp) == 2:
-			np = cp[0].split(":")
-			if len(np) == 2:
-				self.sendOSC(np[0], int(np[1]), cp[1])
+		trigger = OSCTrigger.fromString(string)
+		if trigger != None:
+			self.sendTriggers([trigger])
 				
 	def sendOSCstring(self, target_ip, port, message, string):
-		ml = len(message) + 1
-		sl = len(string) + 1
-		rl = ml % 4
-		if rl > 0:
-			rl = 4 - rl
-		srl = sl % 4
-		if srl > 0:
-			srl = 4 - srl
-		bl = ml+rl+4+sl+srl
-		buffer = bytearray(bl)
-		for i in range(bl):
-			buffer[i] = 0
-		buffer[0:ml-1] = message
-		ss = ml + rl
-		buffer[ss] = ','
-		buffer[ss+1] = 's'
-		ss += 4
-		buffer[ss:ss+sl-1] = string
-		self.udpsocket.sendto(buffer, (target_ip, port))
\ No newline at end of file
+		self.sendPacket(OSCInterface.encodeMessage(message, [string]), (target_ip, port))
+
+#####
+#	encodeMessage returns the bytes of an OSC message
+#	args may contain str (s), int (i) and float (f) arguments
+#####
+
+	def encodeMessage(address, args=()):
+		tags = ","
+		data = b""
+		for arg in args:
+			if isinstance(arg, str):
+				tags += "s"
+				data += OSCInterface.encodeString(arg)
+			elif isinstance(arg, int):
+				tags += "i"
+				data += struct.pack(">i", arg)
+			else:
+				tags += "f"
+				data += struct.pack(">f", arg)
+		return OSCInterface.encodeString(address) + OSCInterface.encodeString(tags) + data
+
+	def encodeString(s):
+		b = s.encode("utf-8")
+		return b + bytes(4 - (len(b) % 4))		# null terminated, padded to a multiple of 4
+
+##################################################################################
+#	OSCTrigger
+#
+#	An OSC message sent when a cue is run, from a string ip:port~address
+#	The string is parsed and the message encoded when the trigger is created
+#	(the cue is loaded or edited) so that running the cue only posts the packet.
+##################################################################################
+
+class OSCTrigger:
+
+	def __init__(self, string, target, packet):
+		self.string = string		# ip:port~address as saved in the show file
+		self.target = target		# (ip, port)
+		self.packet = packet		# encoded message
+
+#####
+#	fromString returns an OSCTrigger or None if string is not ip:port~address
+#####
+
+	def fromString(string):
+		cp = string.split("~")
+		if len(cp) == 2:
+			np = cp[0].split(":")
+			if len(np) == 2 and len(np[0]) > 0 and np[1].isdigit():
+				port = int(np[1])
+				if port > 0 and port < 65536:
+					return OSCTrigger(string, (np[0], port), OSCInterface.encodeMessage(cp[1]))
+		return None
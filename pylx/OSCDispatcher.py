@@ -0,0 +1,187 @@
+#   OSCDispatcher.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+import re
+
+##################################################################################
+#                               OSCDispatcher
+#
+#           Calls the handler registered for an OSC address
+#
+#           Handlers register an address such as "/cue/*/start".  In a
+#           registered address, a "*" part is a parameter, it matches any
+#           part of a received address, which is passed to the handler.
+#           handler(params, args) is called with a tuple of the parameter
+#           parts (strings) and the message's arguments.
+#
+#           The registered addresses are kept in a trie with one node for
+#           each part, literal parts are found by dictionary lookup.
+#           A received address without wildcards matches at most one handler,
+#           literal parts are tried before parameters.
+#           A received address pattern may use the OSC wildcards
+#           * ? [] {} which are matched against the literal parts of the
+#           registered addresses, calling every handler that matches.
+#           A parameter part matches any received part, so a wildcard part
+#           also reaches it and is passed to the handler as it was received
+#           (the handler ignores a parameter it cannot use, /cue/*/start
+#           calls oscCueStart with "*", which is not a cue number).
+#
+#           Resolved addresses are cached so a repeated address is
+#           one dictionary lookup.  The cache is cleared when it is full
+#           or a handler is registered.
+#
+##################################################################################
+
+class OSCDispatcher(object):
+
+    CACHE_SIZE = 4096
+    WILDCARDS = re.compile(r"[*?\[\]{}]")
+
+    def __init__(self):
+        self.root = OSCAddressNode()
+        self.cache = {}             # received address -> tuple of (handler, params)
+        self.unmatched = 0          # messages with no handler
+
+#########################################
+#
+#   register adds handler for address
+#
+#########################################
+
+    def register(self, address, handler):
+        node = self.root
+        for part in address.split("/")[1:]:
+            if part == "*":
+                if node.param == None:
+                    node.param = OSCAddressNode()
+                node = node.param
+            else:
+                child = node.children.get(part)
+                if child == None:
+                    child = OSCAddressNode()
+                    node.children[part] = child
+                node = child
+        node.handler = handler
+        self.cache = {}
+
+#########################################
+#
+#   dispatch calls the handlers matching address with args
+#   returns False if there is no matching handler
+#
+#########################################
+
+    def dispatch(self, address, args):
+        matches = self.cache.get(address)
+        if matches == None:
+            matches = self.resolve(address)
+            if len(self.cache) >= OSCDispatcher.CACHE_SIZE:
+                self.cache = {}
+            self.cache[address] = matches
+        if len(matches) == 0:
+            self.unmatched += 1
+            return False
+        for handler, params in matches:
+            handler(params, args)
+        return True
+
+#########################################
+#
+#   resolve returns a tuple of (handler, params) for the handlers matching address
+#
+#########################################
+
+    def resolve(self, address):
+        parts = address.split("/")
+        if len(parts) < 2 or parts[0] != "":
+            return ()
+        matches = []
+        wild = OSCDispatcher.WILDCARDS.search(address) != None
+        self.matchNode(self.root, parts, 1, (), matches, wild)
+        return tuple(matches)
+
+    def matchNode(self, node, parts, i, params, matches, wild):
+        if i == len(parts):
+            if node.handler != None:
+                matches.append((node.handler, params))
+            return
+        part = parts[i]
+        if wild and OSCDispatcher.WILDCARDS.search(part) != None:
+            rx = OSCDispatcher.regexForPattern(part)
+            if rx != None:
+                for name, child in node.children.items():
+                    if rx.fullmatch(name):
+                        self.matchNode(child, parts, i+1, params, matches, wild)
+                if node.param != None:
+                    self.matchNode(node.param, parts, i+1, params + (part,), matches, wild)
+            return
+        child = node.children.get(part)
+        if child != None:
+            self.matchNode(child, parts, i+1, params, matches, wild)
+            if len(matches) > 0 and not wild:
+                return
+        if node.param != None:
+            self.matchNode(node.param, parts, i+1, params + (part,), matches, wild)
+
+#########################################
+#
+#   regexForPattern translates one part of an OSC address pattern
+#   to a compiled regular expression, None if the pattern is not valid
+#       ?  any character          *  any sequence of characters
+#       [abc] [a-z]  one of the characters, [!abc] none of them
+#       {foo,bar}  one of the strings
+#
+#########################################
+
+    def regexForPattern(pattern):
+        rx = ""
+        i = 0
+        n = len(pattern)
+        while i < n:
+            c = pattern[i]
+            if c == "?":
+                rx += "."
+            elif c == "*":
+                rx += ".*"
+            elif c == "[":
+                e = pattern.find("]", i+1)
+                if e < 0:
+                    return None
+                chars = pattern[i+1:e]
+                neg = chars.startswith("!")
+                if neg:
+                    chars = chars[1:]
+                rx += "[" + ("^" if neg else "") + re.escape(chars).replace("\\-", "-") + "]"
+                i = e
+            elif c == "{":
+                e = pattern.find("}", i+1)
+                if e < 0:
+                    return None
+                rx += "(?:" + "|".join(re.escape(s) for s in pattern[i+1:e].split(",")) + ")"
+                i = e
+            else:
+                rx += re.escape(c)
+            i += 1
+        try:
+            return re.compile(rx)
+        except re.error:
+            return None
+
+##################################################################################
+#                               OSCAddressNode
+#
+#           One part of the registered addresses
+#
+##################################################################################
+
+class OSCAddressNode(object):
+
+    def __init__(self):
+        self.children = {}          # literal part -> OSCAddressNode
+        self.param = None           # OSCAddressNode for a parameter part
+        self.handler = None         # handler if an address ends here
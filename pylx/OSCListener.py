@@ -10,39 +10,84 @@
 
 
 import socket
+import struct
 import threading
 import time
-from select import select
-import math
-import struct
+import heapq
+from CTReactor import CTReactor
+
+##################################################################################
+#                               OSCListener
+#
+#           Receives OSC messages and passes each one's address pattern
+#           and arguments to delegate.receivedOSC(addressPattern, args)
+#
+#           Packets are received into one preallocated buffer and decoded
+#           in place with struct.  Supported argument types are
+#               i  int32            h  int64            t  timetag (int)
+#               f  float32          d  float64          s  string
+#               b  blob             T  True             F  False
+#               N  None
+#           A blob argument is a memoryview of the receive buffer, it is only
+#           valid until receivedOSC returns (copy it to keep it).
+#           A message with an unknown type tag or that is too short is ignored.
+#
+#           Bundles (including nested bundles) are passed to the scheduler
+#           (OSCScheduler), if there is one, with all the messages of the
+#           packet that have the same timetag in one group.  Without a
+#           scheduler, bundled messages are passed to the delegate immediately.
+#
+##################################################################################
 
 class OSCListener:
+
+    MAX_PACKET = 8192
+    PLANS_SIZE = 256                # type tag strings kept in self.plans
+    RECEIVE_BUFFER = 1 << 20        # requested socket receive buffer size
+    INT32 = struct.Struct(">i")
+    INT64 = struct.Struct(">q")
+    FLOAT32 = struct.Struct(">f")
+    FLOAT64 = struct.Struct(">d")
+    TIMETAG = struct.Struct(">Q")
+    BUNDLE_ID = b"#bundle\x00"
+    FIXED_TAGS = {0x69: "i", 0x66: "f", 0x68: "q", 0x64: "d", 0x74: "Q"}   # type tag -> struct format
+    CONSTANT_TAGS = {0x54: True, 0x46: False, 0x4E: None}                 # T, F, N have no data
     
     def __init__(self):
-        self.listen_thread = None
+        self.listening = False
+        self.buffer = bytearray(OSCListener.MAX_PACKET)
+        self.data = self.buffer
+        self.msglen = 0
+        self.plans = {}         # type tags -> struct.Struct for tags that are all fixed size, else None
+                                # (cleared when full, the tags come from the network)
+        self.ignored = 0        # messages that could not be decoded
+        self.scheduler = None   # OSCScheduler for bundles
 
 #########################################
 #
 #   startListening creates the listening socket
-#   and creates a thread that runs the listen() method
+#   and registers it with the shared reactor
+#   which calls readPacket as soon as a message arrives
 #
 #########################################
     
-    def startListening(self, port, delegate=None):
+    def startListening(self, port, delegate=None, scheduler=None):
         self.udpsocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # room for bursts of messages (for instance a fader bank) while the reactor is busy
+            self.udpsocket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, OSCListener.RECEIVE_BUFFER)
+        except OSError:
+            pass
         self.udpsocket.bind(('',port))
         self.udpsocket.setblocking(False)
-        self.udpsocket.settimeout(1)
         self.delegate = delegate
+        self.scheduler = scheduler
         self.listening = True
-        if self.listen_thread is None:
-            self.listen_thread = threading.Thread(target=self.listen)
-            self.listen_thread.daemon = True
-            self.listen_thread.start()
+        CTReactor.shared().register(self.udpsocket, self.readPacket)
 
 #########################################
 #
-#   stopListening sets a flag which will cause the listen loop to end on the next pass
+#   stopListening removes the socket from the reactor and closes it
 #   setting the delegate to None prevents messages from being sent after stopListening
 #   is called.
 #
@@ -50,173 +95,372 @@ class OSCListener:
             
     def stopListening(self):
         self.delegate = None
-        self.listening = False
+        if self.listening:
+            self.listening = False
+            CTReactor.shared().unregister(self.udpsocket)
+            self.udpsocket.close()
         
 #########################################
 #
-#   listen contains a loop that runs while the self.listening flag is True
-#   listen uses select to determine if there is data available from the port
-#   if there is, packetReceived is called
-#   if not, the thread sleeps for a tenth of a second
+#   readPacket reads the available packets and calls packetReceived for each
 #
 #########################################
         
-    def listen(self):
-        input = [self.udpsocket]
-
+    def readPacket(self):
         while self.listening:
-            inputready,outputready,exceptready = select(input,[],[],0)
-            if ( len(inputready) == 1 ):
-                self.data,addr = self.udpsocket.recvfrom(256)
-                self.msglen = len(self.data)
-                self.packetReceived()
-            else:
-                time.sleep(0.1)
-    
-        self.udpsocket.close()
-        self.listen_thread = None
+            try:
+                self.msglen, addr = self.udpsocket.recvfrom_into(self.buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            self.packetReceived()
 
 #########################################
 #
-#   packetReceived calls processMessageAt for each complete OSC message
-#   contained in the packet
+#   packetReceived decodes the OSC message or bundle in the packet
+#   and passes it to the delegate or the scheduler
 #
 #########################################
     
     def packetReceived(self):
-        dataindex = 0
-        while ( (dataindex >= 0 ) and ( dataindex < self.msglen ) ):
-            dataindex = self.processMessageAt(dataindex);
+        if self.data[0:8] == OSCListener.BUNDLE_ID:
+            self.bundleReceived()
+            return
+        msg = self.decodeMessage(self.data, 0, self.msglen)
+        if msg == None:
+            self.ignored += 1
+        elif self.delegate != None:
+            self.delegate.receivedOSC(msg[0], msg[1])
 
 #########################################
 #
-#   process message extracts the addressPattern
-#   and argument list from the OSC message
+#   bundleReceived groups the messages of a bundle packet by timetag
+#   and posts each group to the scheduler
+#   blobs are copied because the messages outlive the receive buffer
 #
-#   currently the only supported arguments are floats and integers and strings
+#########################################
+
+    def bundleReceived(self):
+        messages = []
+        if not self.decodeBundle(self.data, 0, self.msglen, OSCScheduler.IMMEDIATE, messages):
+            self.ignored += 1
+            return
+        groups = {}
+        for timetag, msg in messages:
+            args = msg[1]
+            for i in range(len(args)):
+                if isinstance(args[i], memoryview):
+                    args[i] = bytes(args[i])
+            groups.setdefault(timetag, []).append(msg)
+        for timetag, group in groups.items():
+            if self.scheduler != None:
+                self.scheduler.post(timetag, group)
+            elif self.delegate != None:
+                for msg in group:
+                    self.delegate.receivedOSC(msg[0], msg[1])
+
+#########################################
 #
-#   returns the index at the end of the complete message
+#   decodeBundle decodes the bundle in data[start:end]
+#   appending (timetag, (addressPattern, args)) to messages for each message
+#   a nested bundle with an immediate timetag uses the enclosing bundle's timetag
+#   returns False if the bundle is not valid
 #
 #########################################
 
-    def processMessageAt(self, si):
-        oi = 0;
-        dl = 0;
-        zl = self.nextZero(si)
-        
-        #insure that string will terminate with room for 4 bytes of type definition
-        if zl + 4 < self.msglen: 
-            addressPattern = self.stringFrom(si)
-            if addressPattern.startswith('/'):
-                # determine the current index for the type character
-                tl = self.nextIndexForString(addressPattern,si)
-                
-                # determine the current index for the data location
-                dl = self.nextIndexForIndex(self.nextZero(tl))
-                
-                # if there's space for at least one argument, start a loop extracting
-                # arguments defined in the type string an adding them to the args list
-                if dl+4 <= self.msglen:
-                    if self.data[tl] == ',':
-                        tl += 1
-                    args = []
-                    done = False
-                    while ( not done) and ( (dl+4) <= self.msglen ):
-                        if self.data[tl] == '\x00':
-                            done = True
-                        elif self.data[tl] == 'f':
-                            a = struct.unpack_from('>f', self.data, dl)
-                            args.append(float(a[0]))
-                            dl += 4
-                        elif self.data[tl] == 'i':
-                            a = struct.unpack_from('>i', self.data, dl)
-                            args.append(int(a[0]))
-                        elif self.data[tl] == 's':
-                            es = nextZero(dl)
-                            if es <= self.msglen:
-                                a = self.stringFrom(dl)
-                                args.append(a)
-                                dl = nextIndexForIndex(es)
-                            else:
-                                done = True
-                                oi = -1
-                        else:   #unrecognized argument don't know length
-                            done = True
-                            oi = -1
-                        tl += 1
-                    
-                    # when done with the argument extraction loop, notify the delegate
-                    if self.delegate != None:
-                        self.delegate.receivedOSC(addressPattern, args)
-                    #else:
-                        #print addressPattern
-                        #print self.args
-                else: #no arguments but an address pattern, notify delegate
-                    oi = -1
-                    if self.delegate != None:
-                        self.delegate.receivedOSC(addressPattern, [])
-        else:
-            oi = -1
-            
-        if oi != -1:
-            oi = dl     #dl could point to another message within the packet
-        
-        return oi   
+    def decodeBundle(self, data, start, end, outer, messages):
+        if end - start < 16 or data[start:start+8] != OSCListener.BUNDLE_ID:
+            return False
+        timetag = OSCListener.TIMETAG.unpack_from(data, start+8)[0]
+        if timetag == OSCScheduler.IMMEDIATE:
+            timetag = outer
+        i = start + 16
+        while i + 4 <= end:
+            size = OSCListener.INT32.unpack_from(data, i)[0]
+            s = i + 4
+            if size <= 0 or s + size > end:
+                return False
+            if data[s] == 0x23:             # '#' nested bundle
+                if not self.decodeBundle(data, s, s + size, timetag, messages):
+                    return False
+            else:
+                msg = self.decodeMessage(data, s, s + size)
+                if msg != None:
+                    messages.append((timetag, msg))
+                else:
+                    self.ignored += 1
+            i = s + size
+        return True
 
 #########################################
 #
-#   nextZero searches for the next null character in the data starting at index si
+#   decodeMessage decodes the OSC message in data[start:end]
+#   data is a bytearray or bytes
+#   returns (addressPattern, args) or None if the message is not valid
 #
 #########################################
-        
-    def nextZero(self, si):
-        i = si
-        notfound = True
-        s = ''
-        while notfound and i<self.msglen:
-            if self.data[i] == '\x00':
-                notfound = False
-            else:
-                i += 1
-        return i
+
+    def decodeMessage(self, data, start, end):
+        if end - start < 4 or data[start] != 0x2F:          # '/'
+            return None
+        z = data.find(0, start, end)
+        if z < 0:
+            return None
+        address = data[start:z].decode('utf-8', 'replace')
+        ti = start + OSCListener.padded(z + 1 - start)
+        if ti >= end or data[ti] != 0x2C:                   # ',' no type tags, no arguments
+            return (address, [])
+        tz = data.find(0, ti, end)
+        if tz < 0:
+            return None
+        tags = bytes(data[ti+1:tz])
+        di = start + OSCListener.padded(tz + 1 - start)
+        plan = self.plans.get(tags, 0)
+        if plan == 0:
+            plan = OSCListener.planForTags(tags)
+            if len(self.plans) >= OSCListener.PLANS_SIZE:
+                self.plans = {}
+            self.plans[tags] = plan
+        if plan != None:
+            if di + plan.size > end:
+                return None
+            return (address, list(plan.unpack_from(data, di)))
+        args = OSCListener.decodeArguments(data, tags, di, end)
+        if args == None:
+            return None
+        return (address, args)
 
 #########################################
 #
-#   nextIndexForString determines a 4 byte padded index
-#   for the length of the string starting from si
+#   planForTags returns a struct.Struct that unpacks all of the arguments
+#   if every type tag is a fixed size number, otherwise None
 #
 #########################################
-        
-    def nextIndexForString(self, s, start):
-        ml = math.trunc(len(s) / 4) + 1;
-        return start + (ml*4);
-        
+
+    def planForTags(tags):
+        fmt = ">"
+        for tag in tags:
+            f = OSCListener.FIXED_TAGS.get(tag)
+            if f == None:
+                return None
+            fmt += f
+        return struct.Struct(fmt)
+
 #########################################
 #
-#   nextIndexForIndex determines a 4 byte padded index
-#   starting from i
+#   decodeArguments decodes arguments for tags starting at data[di]
+#   returns the list of arguments or None if a tag is unknown
+#   or the data is too short
 #
 #########################################
-        
-    def nextIndexForIndex(self, i):
-        ml = math.trunc(i / 4) + 1;
-        return ml*4;
+
+    def decodeArguments(data, tags, di, end):
+        args = []
+        for tag in tags:
+            if tag == 0x69:             # i
+                if di + 4 > end:
+                    return None
+                args.append(OSCListener.INT32.unpack_from(data, di)[0])
+                di += 4
+            elif tag == 0x66:           # f
+                if di + 4 > end:
+                    return None
+                args.append(OSCListener.FLOAT32.unpack_from(data, di)[0])
+                di += 4
+            elif tag == 0x73:           # s
+                z = data.find(0, di, end)
+                if z < 0:
+                    return None
+                args.append(data[di:z].decode('utf-8', 'replace'))
+                di += OSCListener.padded(z + 1 - di)
+            elif tag == 0x62:           # b
+                if di + 4 > end:
+                    return None
+                n = OSCListener.INT32.unpack_from(data, di)[0]
+                if n < 0 or di + 4 + n > end:
+                    return None
+                args.append(memoryview(data)[di+4:di+4+n])
+                di += 4 + OSCListener.padded(n)
+            elif tag in OSCListener.CONSTANT_TAGS:
+                args.append(OSCListener.CONSTANT_TAGS[tag])
+            elif tag == 0x68:           # h
+                if di + 8 > end:
+                    return None
+                args.append(OSCListener.INT64.unpack_from(data, di)[0])
+                di += 8
+            elif tag == 0x64:           # d
+                if di + 8 > end:
+                    return None
+                args.append(OSCListener.FLOAT64.unpack_from(data, di)[0])
+                di += 8
+            elif tag == 0x74:           # t
+                if di + 8 > end:
+                    return None
+                args.append(OSCListener.TIMETAG.unpack_from(data, di)[0])
+                di += 8
+            else:
+                return None
+        return args
 
 #########################################
 #
-#   extracts a null terminated string starting at index si
+#   padded returns n rounded up to a multiple of 4
 #
 #########################################
-        
-    def stringFrom(self, si):
-        i = si
-        noterm = True
-        s = ''
-        while noterm and i<len(self.data):
-            if self.data[i] == '\x00':
-                noterm = False
+
+    def padded(n):
+        return (n + 3) & ~3
+
+##################################################################################
+#                               OSCScheduler
+#
+#           Holds groups of OSC messages from bundles until their timetag
+#           and then passes them to delegate.receivedOSC.
+#
+#           dispatchDue is called by the render loop at the start of each
+#           frame so that all of the messages in a group are applied before
+#           the frame is rendered, never part way through one.
+#           Immediate and late groups call wake (the render loop's wake)
+#           so that the frame that dispatches them is rendered at once.
+#           For a future group, a timer thread waits on an Event until its
+#           time and then calls wake, so that the frame that dispatches it
+#           is rendered at that time, not at the next regular frame.
+#
+#           Timetags are NTP time (seconds since 1900 in the upper 32 bits,
+#           fraction in the lower).  They are converted to time.perf_counter()
+#           when they are received.
+#
+##################################################################################
+
+class OSCScheduler(object):
+
+    IMMEDIATE = 1
+    NTP_OFFSET = 2208988800         # seconds from 1900 to 1970
+
+    def __init__(self, delegate, wake=None):
+        self.delegate = delegate        # object with receivedOSC(addressPattern, args)
+        self.wake = wake                # called when a future group is due
+        self.lock = threading.Lock()
+        self.immediate = []             # groups to dispatch at the next frame
+        self.scheduled = []             # heap of (perf_counter time, serial, group)
+        self.serial = 0
+        self.timer_event = threading.Event()
+        self.timer_thread = None
+        self.running = False
+        self.dispatched = 0             # messages passed to the delegate
+        self.late = 0                   # groups received after their time
+
+#########################################
+#
+#   post adds a group of messages that have the same timetag
+#
+#########################################
+
+    def post(self, timetag, group):
+        due = None
+        if timetag != OSCScheduler.IMMEDIATE:
+            delay = OSCScheduler.timeForTimetag(timetag) - time.time()
+            if delay > 0:
+                due = time.perf_counter() + delay
+            else:
+                self.late += 1
+        with self.lock:
+            if due == None:
+                self.immediate.append(group)
+                first = len(self.immediate) == 1
             else:
-                s += self.data[i]
-            i += 1
-        return s
-            
\ No newline at end of file
+                heapq.heappush(self.scheduled, (due, self.serial, group))
+                self.serial += 1
+        if due == None:
+            if first and self.wake != None:     # dispatched by a frame rendered now
+                self.wake()
+            return
+        self.startTimer()
+        self.timer_event.set()
+
+#########################################
+#
+#   timeForTimetag converts an NTP timetag to time.time() seconds
+#
+#########################################
+
+    def timeForTimetag(timetag):
+        return (timetag >> 32) - OSCScheduler.NTP_OFFSET + (timetag & 0xFFFFFFFF) / 4294967296.0
+
+#########################################
+#
+#   dispatchDue passes the immediate groups and the groups due at now
+#   (time.perf_counter()) to the delegate, in order
+#   called by the render thread before it renders a frame
+#
+#########################################
+
+    def dispatchDue(self, now):
+        if len(self.immediate) == 0 and ( len(self.scheduled) == 0 or self.scheduled[0][0] > now ):
+            return
+        with self.lock:
+            groups = self.immediate
+            self.immediate = []
+            scheduled = len(groups)
+            while len(self.scheduled) > 0 and self.scheduled[0][0] <= now:
+                groups.append(heapq.heappop(self.scheduled)[2])
+            if len(groups) > scheduled:
+                self.timer_event.set()          # the timer waits for the next group
+        delegate = self.delegate
+        if delegate != None:
+            for group in groups:
+                for msg in group:
+                    delegate.receivedOSC(msg[0], msg[1])
+                self.dispatched += len(group)
+
+#########################################
+#
+#   startTimer starts the timer thread if it is not running
+#   stop ends it, discarding any scheduled groups
+#
+#########################################
+
+    def startTimer(self):
+        if self.timer_thread is None:
+            self.running = True
+            self.timer_thread = threading.Thread(target=self.timer)
+            self.timer_thread.daemon = True
+            self.timer_thread.start()
+
+    def stop(self):
+        self.running = False
+        self.timer_event.set()
+        thread = self.timer_thread
+        if thread != None and thread != threading.current_thread():
+            thread.join()
+        self.timer_thread = None
+        with self.lock:
+            self.scheduled = []
+
+#########################################
+#
+#   timer is the method attached to the timer thread (don't call directly)
+#   it waits for the earliest scheduled group, then calls wake
+#   timer_event is set by post (a new group may be earlier), by dispatchDue
+#   (the woken group was dispatched) and by stop
+#
+#########################################
+
+    def timer(self):
+        woken = None
+        while self.running:
+            with self.lock:
+                due = None
+                if len(self.scheduled) > 0:
+                    due = self.scheduled[0][0]
+            if due == None or due == woken:     # nothing to do until timer_event is set
+                self.timer_event.wait(1.0)
+                self.timer_event.clear()
+                continue
+            delay = due - time.perf_counter()
+            if delay > 0:
+                self.timer_event.wait(delay)
+                self.timer_event.clear()
+                continue
+            woken = due
+            if self.wake != None:
+                self.wake()
@@ -7,9 +7,9 @@
 #  https://www.claudeheintzdesign.com/lx/opensource.html
 #
 
-from http.server import HTTPServer
+from http.server import ThreadingHTTPServer
 from myRequestHandler import myRequestHandler
-import threading
+from CTReactor import CTReactor
 
 #################################################################
 #
@@ -38,29 +38,23 @@ class lxWebServer:
 #
 #   createWebServer makes web server object
 #   uses myRequestHandler class calls back with requests
+#   each request is handled on its own thread
 #
 #########################################
     def createWebServer(self, hostname, serverport):
-        self.web_server = HTTPServer((hostname, serverport), myRequestHandler)
+        self.web_server = ThreadingHTTPServer((hostname, serverport), myRequestHandler)
         myRequestHandler.setOwner(self)
 
 #########################################
 #
 #   runWebServer
-#      serve_forever BLOCKS until KeyboardInterrupt throws an exception
+#      registers the server socket with the shared reactor
+#      the reactor accepts connections as they arrive
 #
 #########################################
     def runWebServer(self):
-        serve_thread = threading.Thread(target=self.do_run_web_server)
-        serve_thread.daemon = True
-        serve_thread.start()
-
-    def do_run_web_server(self):
         print("Starting web server http://%s:%s" % (self.hostname, self.serverport))
-        try:
-            self.web_server.serve_forever()
-        except KeyboardInterrupt:
-            pass
+        CTReactor.shared().register(self.web_server.socket, self.web_server.handle_request)
 
 #########################################
 #
@@ -68,7 +62,7 @@ class lxWebServer:
 #
 #########################################
     def closeWebServer(self):
-        self.web_server.shutdown()
+        CTReactor.shared().unregister(self.web_server.socket)
         self.web_server.server_close()
         print("Web server stopped.")
 
@@ -34,6 +34,9 @@ from LXChannelDisplay import LXChannelDisplay
 from LXCues import LXCues
 from LXCues import LXLiveCue
 from LXCuesAsciiParser import LXCuesAsciiParser
+from LXPatch import LXPatch
+from LXFadeCurve import LXFadeCurve
+from DMXInputMerge import DMXInputMerge
 from OSCListener import OSCListener
 from CTNetUtil import CTNetUtil
 from lxWebServer import lxWebServer
@@ -56,10 +59,13 @@ class App:
         self.props.parseFile( self.pylxdir + "/lxconsole.properties")
         chans = self.props.intForKey("channels", 300)
         dims = self.props.intForKey("dimmers", 512)
+        self.engine = self.props.stringForKey("fade_engine", "auto")
+        self.frame_rate = float(self.props.stringForKey("frame_rate", "44"))
     
         #create cues
-        self.cues = LXCues(chans, dims)
+        self.cues = LXCues(chans, dims, self.engine)
         self.cues.delegate = self
+        self.cues.startRendering(self.frame_rate)
         self.update_thread = None
         self.updating = False
         self.path = ""
@@ -68,10 +74,24 @@ class App:
         self.oscin = None
         self.webserver = None
         
+        #setup DMX input merge
+        self.dmxinput = None
+        self.sacn_input = self.props.stringForKey("sacn_input", "off") == "on"
+        self.widget_input = self.props.stringForKey("widget_input", "off") == "on"
+        if self.props.stringForKey("artnet_input", "off") == "on" or self.sacn_input or self.widget_input:
+            self.dmxinput = DMXInputMerge(self.cues.livecue.patch.universes(),
+                                          self.props.intForKey("input_sources", 4),
+                                          float(self.props.stringForKey("input_timeout", "10")))
+            self.cues.livecue.input = self.dmxinput
+        
         #setup output interface
         use_interface = self.props.stringForKey("interface", "")
         if use_interface == "widget":
             self.set_usb_out()
+        elif use_interface == "sacn":
+            self.set_sacn_out()
+        elif use_interface == "artnet,sacn":
+            self.set_sacn_out(True)
         else:
             self.set_artnet_out()
         self.oscport = int(self.props.stringForKey("oscport", "7688"))
@@ -154,6 +174,7 @@ class App:
         livemenu.add_checkbutton(label="Web Server", onvalue=True, offvalue=False, variable=self.webIN, command=self.menuWebServer)
         livemenu.add_command(label='Set Output to USB', command=self.menu_set_usb_out)
         livemenu.add_command(label='Set Output to Art-Net', command=self.menu_set_artnet_out)
+        livemenu.add_command(label='Set Output to sACN', command=self.menu_set_sacn_out)
         menubar.add_cascade(label='Live', menu=livemenu)
         
         helpmenu=Menu(menubar, tearoff=0)
@@ -179,17 +200,49 @@ class App:
             from DMXUSBPro import DMXUSBProInterface
             serial_port = self.props.stringForKey("widget", "")
             iface = DMXUSBProInterface(serial_port)
+            iface.setRefreshInterval(float(self.props.stringForKey("refresh_interval", "1")))
+            if self.widget_input:
+                iface.input = self.dmxinput
+                iface.startListening()
             self.cues.livecue.output = iface
             iface.startSending()
         except:
             tkmsg_box.showinfo("Error Connecting", sys.exc_info()[0])
             
     def set_artnet_out(self):
-        from ArtNet import ArtNetInterface
         if self.cues.livecue.output != None:
             self.cues.livecue.output.close()
+        iface = self.new_artnet_interface()
+        self.cues.livecue.output = iface
+        iface.startSending()
+
+    def new_artnet_interface(self):
+        from ArtNet import ArtNetInterface
         artout = self.props.stringForKey("artnet_output", "auto")
-        iface = ArtNetInterface(CTNetUtil.get_ip_address(), artout)
+        artsync = self.props.stringForKey("artnet_sync", "auto")
+        iface = ArtNetInterface(CTNetUtil.get_ip_address(), artout, universes=self.cues.livecue.patch.universes(), sync=artsync)
+        iface.setRefreshInterval(float(self.props.stringForKey("refresh_interval", "1")))
+        if self.props.stringForKey("artnet_input", "off") == "on":
+            iface.input = self.dmxinput
+        return iface
+
+    def set_sacn_out(self, with_artnet=False):
+        from sACN import SACNInterface
+        from ArtNet import DMXInterfaceGroup
+        if self.cues.livecue.output != None:
+            self.cues.livecue.output.close()
+        iface = SACNInterface(CTNetUtil.get_ip_address(),
+                              self.props.stringForKey("sacn_output", "multicast"),
+                              self.props.intForKey("sacn_universe", 1),
+                              self.cues.livecue.patch.universes(),
+                              self.props.intForKey("sacn_priority", 100),
+                              self.props.intForKey("sacn_sync", 0))
+        iface.setRefreshInterval(float(self.props.stringForKey("refresh_interval", "1")))
+        if self.sacn_input:
+            iface.input = self.dmxinput
+            iface.startListening()
+        if with_artnet:
+            iface = DMXInterfaceGroup([self.new_artnet_interface(), iface])
         self.cues.livecue.output = iface
         iface.startSending()
         
@@ -203,10 +256,21 @@ class App:
     def menuOpen(self):
         filename = tkfile_dialog.askopenfilename(filetypes=[('ASCII files','*.asc')])
         if len(filename) > 0:
-            p = LXCuesAsciiParser(self.cues.channels, self.cues.livecue.patch.addresses, self.cues.livecue.output)
-            message = p.parseFile(filename)
+            p = LXCuesAsciiParser(self.cues.channels, self.cues.livecue.patch.addresses, self.cues.livecue.output, self.engine)
+            try:
+                message = p.parseFile(filename)
+            finally:
+                if not p.success:
+                    p.cues.stopRendering()      # closes the unused cues' OSC socket
             if p.success:
+                self.cues.delegate = None
+                self.cues.stopRendering()
                 self.cues = p.cues
+                self.cues.livecue.input = self.dmxinput
+                self.cues.startRendering(self.frame_rate)
+                if self.oscin != None:
+                    self.oscin.delegate = self.cues
+                    self.oscin.scheduler = self.cues.oscscheduler
                 self.cues.next = None
                 self.lastcomplete = None
                 self.back = None
@@ -239,10 +303,14 @@ class App:
         if tkmsg_box.askokcancel("Art-Net", "Set Art-Net as output interface?"):
             self.set_artnet_out()
 
+    def menu_set_sacn_out(self):
+        if tkmsg_box.askokcancel("sACN", "Set sACN as output interface?"):
+            self.set_sacn_out()
+
     def menuOSC(self):
         if self.oscin == None:
             self.oscin = OSCListener()
-            self.oscin.startListening(self.oscport, self.cues)
+            self.oscin.startListening(self.oscport, self.cues, self.cues.oscscheduler)
         else:
             self.oscin.stopListening()
             self.oscin = None
@@ -338,7 +406,7 @@ class App:
         
     def updateOutput(self):
         self.cues.updateDisplay(self.chandisp)
-        self.cues.livecue.writeToInterface()
+        self.cues.livecue.setNeedsOutput()
         
     def updateCurrent(self):
         if self.cues.current != None:
@@ -391,6 +459,22 @@ class App:
     def displayDimmerOptions(self):
         self.displayMessage(self.cues.livecue.patch.optionString(), "Dimmer Options")
 
+    def displayInput(self):
+        if self.dmxinput != None:
+            self.displayMessage(self.dmxinput.statsString(), "DMX Input")
+        else:
+            self.displayMessage("DMX input is off (artnet_input=on, sacn_input=on or widget_input=on in lxconsole.properties)", "DMX Input")
+
+    def displayOutput(self):
+        from ArtNet import DMXInterfaceGroup
+        output = self.cues.livecue.output
+        if output == None:
+            self.displayMessage("DMX output is off", "DMX Output")
+        elif isinstance(output, DMXInterfaceGroup):
+            self.displayMessage(output.statsString(), "DMX Output")
+        else:
+            self.displayMessage(type(output).__name__ + " " + output.statsString(), "DMX Output")
+
 #########################################
 #
 #   The channel display only shows a certain number of channels
@@ -451,6 +535,8 @@ class App:
             self.e.insert(END, ' ')
         elif k == "@":
             self.e.insert(END, '@')
+        elif k == "period":
+            self.e.insert(END, '.')
         elif k == "a":
             self.e.insert(END, '@')
         elif k == "f":
@@ -575,6 +661,16 @@ class App:
             self.process_delete_cue_cmd(cp)
         elif n.startswith("osc"):
             self.process_osc_cmd(cp)
+        elif n.startswith("curve"):
+            self.process_curve_cmd(cp)
+        elif n.startswith("pla"):
+            self.process_playback_cmd(cp)
+        elif n.startswith("ltp") or n.startswith("htp"):
+            self.process_merge_cmd(cp)
+        elif n.startswith("inp"):
+            self.displayInput()
+        elif n.startswith("out"):
+            self.displayOutput()
             
 
  #########################################
@@ -667,11 +763,11 @@ class App:
             
     def process_patch_cmd(self, cp):
         if len(cp) == 3:
-            self.cues.patchAddressToChannel( int(cp[1]), int(cp[2]) )
+            self.cues.patchAddressToChannel( LXPatch.addressForString(cp[1]), int(cp[2]) )
         elif len(cp) == 4:
-            self.cues.patchAddressToChannel( int(cp[1]), int(cp[2]), float(cp[3]) )
+            self.cues.patchAddressToChannel( LXPatch.addressForString(cp[1]), int(cp[2]), float(cp[3]) )
         elif len(cp) == 5:
-            self.cues.patchAddressToChannel( int(cp[1]), int(cp[2]), float(cp[3]), int(cp[4]) )
+            self.cues.patchAddressToChannel( LXPatch.addressForString(cp[1]), int(cp[2]), float(cp[3]), int(cp[4]) )
             #option 0=normal 1=non-dim 2=always on 3=no-master
         else:
             self.displayPatch()
@@ -684,9 +780,9 @@ class App:
             
     def process_dimmer_cmd(self, cp):
         if len(cp) == 3:
-            self.cues.setOptionForAddress( int(cp[1]), int(cp[2]) )
+            self.cues.setOptionForAddress( LXPatch.addressForString(cp[1]), int(cp[2]) )
         elif len(cp) == 4:
-            self.cues.setOptionForAddress( int(cp[1]), int(cp[2]), int(cp[4]) )
+            self.cues.setOptionForAddress( LXPatch.addressForString(cp[1]), int(cp[2]), int(cp[3]) )
         else:
             self.displayDimmerOptions()
             
@@ -735,16 +831,87 @@ class App:
 #########################################
             
     def process_osc_cmd(self, cp):  
-        if self.cues.current != None:
+        strings = [s for s in cp[1:] if len(s) > 0]
+        if strings == ['?']:
+            self.displayOSC()
+        elif self.cues.current != None and len(cp) >= 2:
+            self.cues.current.setOSCStrings(strings)        # no strings clears the messages
+
+#########################################
+#
+#   This is called when the command line starts with "curve"
+#
+#########################################
+            
+    def process_curve_cmd(self, cp):
+        if len(cp) == 2 and cp[1] != '?':
+            if self.cues.current != None:
+                if cp[1] == "linear" or LXFadeCurve.curveNamed(cp[1]) != None:
+                    self.cues.current.curve = cp[1]
+                    self.updateCurrent()
+        else:
+            self.displayMessage("\n".join(LXFadeCurve.curveNames()), "Fade Curves")
+
+#########################################
+#
+#   This is called when the command line starts with "pla"
+#   playback number [cue | stop | release [time]]
+#
+#########################################
+            
+    def process_playback_cmd(self, cp):
+        if len(cp) < 2 or not cp[1].isdigit():
+            return
+        if int(cp[1]) == 1:
             if len(cp) == 2:
-                if len(cp[1]) > 0 and cp[1] != '?':
-                    self.cues.current.oscstring = cp[1]
-                elif cp[1] == '?':
-                    self.displayOSC()
+                self.go_cmd()
+            elif cp[2] == "stop":
+                self.stop_cmd()
+            return
+        pb = self.cues.playback(cp[1])
+        if pb == None:
+            return
+        if len(cp) == 2:
+            pb.go()
+        elif cp[2] == "stop":
+            pb.stop()
+        elif cp[2] == "release":
+            if len(cp) > 3:
+                pb.release(float(cp[3]))
+            else:
+                pb.release()
+        else:
+            q = self.cues.cueForNumber(float(cp[2]))
+            if q != None:
+                pb.go(q)
+
+#########################################
+#
+#   This is called when the command line starts with "ltp" or "htp"
+#   ltp channel, ltp channel>channel, ltp ?
+#
+#########################################
+            
+    def process_merge_cmd(self, cp):
+        if len(cp) == 2 and len(cp[1]) > 0 and cp[1] != '?':
+            ltp = cp[0] == "ltp"
+            r = cp[1].split(">")
+            try:
+                if len(r) == 2:
+                    chans = list(range(int(r[0]), int(r[1])+1))
                 else:
-                    self.cues.current.oscstring = None
-        elif cp[1] == '?':
-            self.displayOSC()
+                    chans = [int(c) for c in cp[1].split(",")]
+            except ValueError:
+                chans = None
+            if chans == None or len(chans) == 0 or min(chans) < 1 or max(chans) > self.cues.channels:
+                self.displayMessage("Invalid channel " + cp[1] + " (channels are 1-" + str(self.cues.channels) + ")", "LTP Channels")
+                return
+            for c in chans:
+                self.cues.setLTP(c, ltp)
+            self.updateOutput()
+        else:
+            chans = self.cues.merge.ltpChannels()
+            self.displayMessage(" ".join(str(c) for c in chans), "LTP Channels")
 
 #########################################
 #
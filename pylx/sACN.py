@@ -0,0 +1,450 @@
+#   sACN.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+#   ANSI E1.31 Streaming ACN (sACN)
+
+
+import socket
+import struct
+import time
+import uuid
+from ArtNet import DMXInterface
+from ArtNet import DMXTransmitter
+
+##################################################################################
+#                               SACNInterface
+#
+#           Implements E1.31 (sACN) output
+#
+#           Like ArtNetInterface, output can span several consecutive universes.
+#           Universe i of the frame is sent as sACN universe first_universe + i
+#           to its multicast address 239.255.hi.lo or to a unicast target.
+#           Each universe has a complete data packet buffer with the headers
+#           filled in once, so sending only sets the sequence and the slots.
+#
+#           If sync_universe is not zero, data packets carry it as their
+#           synchronization address and a sync packet follows each frame's
+#           universes so that receivers output all universes together.
+#
+#           When listening, the interface joins the multicast group of each
+#           of its universes and passes data from other sources to its input
+#           (DMXInputMerge) with the source's priority.  Packets are read
+#           into DMXInterface's preallocated buffers and decoded in place.
+#
+##################################################################################
+
+class SACNInterface(DMXInterface):
+
+    MAX_UNIVERSES = 64
+    DATA_START = 126            # offset of slot 1 in a data packet
+    ACN_ID = b"ASC-E1.17\x00\x00\x00"
+    SOURCE_TIMEOUT = 2.5        # E1.31 network data loss timeout
+    ROOT_HEADER = struct.Struct("!12s2xI")        # ACN packet identifier, root vector (at 4)
+    FRAMING_HEADER = struct.Struct("!2xI64sB2xBBH")   # framing vector, source name, priority, sequence, options, universe (at 38)
+
+    def __init__(self, iface_ip, target="multicast", universe=1, universes=1, priority=100, sync_universe=0):
+        super().__init__()
+        self.localip = iface_ip
+        if ( target == "multicast" ):
+            self.unicast_ip = None
+        else:
+            self.unicast_ip = target
+        self.first_universe = universe
+        self.priority = max(0, min(200, priority))
+        self.sync_universe = sync_universe
+        self.sync_sequence = 0
+        self.cid = uuid.uuid5(uuid.NAMESPACE_DNS, socket.gethostname() + ".lxconsole").bytes
+        self.namebytes = bytes("LXConsole", 'utf-8')
+        self.source_names = {}      # cid -> "source name (ip)"
+        self.joined = []            # (socket, mreq) of multicast groups joined while listening
+        self.join_sockets = []      # extra sockets used only for group membership
+
+        self.setupSocket()
+        self.setupSendBuffer()
+        self.setUniverseCount(universes)
+        self.frame.resize(self.universes*512)
+        self.setupSyncBuffer()
+
+########################################
+#
+#   port   ACN_SDT_MULTICAST_PORT = 5568
+#
+#########################################
+    def port(self):
+        return 5568
+
+########################################
+#
+#   multicastAddress returns the multicast group for an sACN universe
+#
+#########################################
+    def multicastAddress(universe):
+        return "239.255." + str((universe >> 8) & 0xFF) + "." + str(universe & 0xFF)
+
+########################################
+#
+#   setupSocket
+#   bind to any interface and the sACN port, multicast is sent on the local interface
+#
+#########################################
+    def setupSocket(self):
+        try:
+            self.udpsocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udpsocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.udpsocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.udpsocket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 8)
+            self.udpsocket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            try:
+                self.udpsocket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.localip))
+            except OSError as e:
+                print ("sACN multicast interface ", self.localip, e)
+            self.udpsocket.bind(("0.0.0.0", self.port()))
+
+            self.udpsocket.setblocking(False)
+            self.transmitter = DMXTransmitter(self.udpsocket)
+            self.transmitter.start()
+            self.ok = True
+        except Exception as e:
+            print ("Socket Error ", e)
+
+########################################
+#
+#   setupSendBuffer
+#   creates the list of data packet buffers, one for each universe
+#
+#########################################
+    def setupSendBuffer(self):
+        self.send_buffers = []
+        self.seqcounters = []
+        self.changed = []           # True if universe has changed since it was sent
+        self.last_sent = []         # time.time() each universe was last sent
+        self.lengths = []           # slots sent in each universe's data packet
+        self.blanking = []          # True if the packet zeroes slots dropped from the frame
+        self.setUniverseCount(1)
+
+########################################
+#
+#   newSendBuffer
+#   pre-fill the root, framing and DMP layers of a data packet for universe
+#   the buffer also holds DMX data for output
+#
+#########################################
+    def newSendBuffer(self, universe):
+        buffer = bytearray(638)
+        buffer[0:2] = (0x0010).to_bytes(2, 'big')          # preamble size
+        buffer[4:16] = SACNInterface.ACN_ID
+        buffer[16:18] = (0x7000 | 622).to_bytes(2, 'big')  # root flags and length
+        buffer[18:22] = (0x00000004).to_bytes(4, 'big')    # VECTOR_ROOT_E131_DATA
+        buffer[22:38] = self.cid
+        buffer[38:40] = (0x7000 | 600).to_bytes(2, 'big')  # framing flags and length
+        buffer[40:44] = (0x00000002).to_bytes(4, 'big')    # VECTOR_E131_DATA_PACKET
+        buffer[44:44+len(self.namebytes)] = self.namebytes  # source name (64)
+        buffer[108] = self.priority
+        buffer[109:111] = (self.sync_universe & 0xFFFF).to_bytes(2, 'big')
+        buffer[111] = 0                                    # sequence
+        buffer[112] = 0                                    # options
+        buffer[113:115] = (universe & 0xFFFF).to_bytes(2, 'big')
+        buffer[115:117] = (0x7000 | 523).to_bytes(2, 'big')  # DMP flags and length
+        buffer[117] = 0x02                                 # VECTOR_DMP_SET_PROPERTY
+        buffer[118] = 0xA1                                 # address and data type
+        buffer[119:121] = (0).to_bytes(2, 'big')           # first property address
+        buffer[121:123] = (1).to_bytes(2, 'big')           # address increment
+        buffer[123:125] = (513).to_bytes(2, 'big')         # property value count
+        buffer[125] = 0                                    # DMX start code
+        return buffer
+
+########################################
+#
+#   setupSyncBuffer
+#   pre-fill the universe synchronization packet
+#
+#########################################
+    def setupSyncBuffer(self):
+        self.sync_buffer = bytearray(49)
+        self.sync_buffer[0:2] = (0x0010).to_bytes(2, 'big')
+        self.sync_buffer[4:16] = SACNInterface.ACN_ID
+        self.sync_buffer[16:18] = (0x7000 | 33).to_bytes(2, 'big')
+        self.sync_buffer[18:22] = (0x00000008).to_bytes(4, 'big')  # VECTOR_ROOT_E131_EXTENDED
+        self.sync_buffer[22:38] = self.cid
+        self.sync_buffer[38:40] = (0x7000 | 11).to_bytes(2, 'big')
+        self.sync_buffer[40:44] = (0x00000001).to_bytes(4, 'big')  # VECTOR_E131_EXTENDED_SYNCHRONIZATION
+        self.sync_buffer[44] = 0                                   # sequence
+        self.sync_buffer[45:47] = (self.sync_universe & 0xFFFF).to_bytes(2, 'big')
+
+########################################
+#
+#   setUniverseCount
+#   adds buffers so that there is one for each of n universes
+#
+#########################################
+    def setUniverseCount(self, n):
+        if n > SACNInterface.MAX_UNIVERSES:
+            n = SACNInterface.MAX_UNIVERSES
+        while len(self.send_buffers) < n:
+            self.send_buffers.append(self.newSendBuffer(self.first_universe + len(self.send_buffers)))
+            self.seqcounters.append(0)
+            self.changed.append(True)
+            self.last_sent.append(0.0)
+            self.lengths.append(512)
+            self.blanking.append(False)
+        self.universes = max(n, 1)
+
+########################################
+#
+#   send
+#   override of send() so that each universe is refreshed on its own schedule
+#
+#########################################
+    def send(self):
+        while self.sending:
+            rt = self.refreshDue()
+            if self.frame.fresh or rt <= 0:
+                try:
+                    self.transmitFrame(rt <= 0)
+                except:
+                    self.sending = False
+            else:
+                self.send_event.wait(rt)
+                self.send_event.clear()
+        self.send_thread = None
+        self.sending = False
+
+########################################
+#
+#   updateCounter
+#   increment packet sequence counter of universe index u
+#   (sACN sequence numbers include zero)
+#
+#########################################
+    def updateCounter(self, u=0):
+        c = (self.seqcounters[u] + 1) & 0xFF
+        self.seqcounters[u] = c
+        self.send_buffers[u][111] = c
+
+########################################
+#
+#   transmitFrame
+#   copies the newest frame into the data packet buffers and
+#   sends a data packet for each universe that has changed
+#   if refresh is True, also sends each universe that has not been
+#   sent for refresh_interval (keep-alive)
+#
+#   if anything is sent and sync is on, a sync packet is sent after the universes
+#
+#########################################
+    def transmitFrame(self, refresh):
+        now = time.time()
+        sent = False
+        with self.lock:
+            frame = self.frame.take()
+            if frame != None:
+                self.copyFrame(frame)
+            for u in range(self.universes):
+                if self.changed[u] or ( refresh and now - self.last_sent[u] >= self.refresh_interval ):
+                    self.changed[u] = False
+                    self.last_sent[u] = now
+                    self.updateCounter(u)
+                    self.transmitter.post(self.packetKey(u), self.packet(u), self.targetsForUniverse(u))
+                    self.frames_sent += 1
+                    sent = True
+                elif not refresh:
+                    self.frames_suppressed += 1
+            if sent and self.sync_universe > 0:
+                self.sendSync()
+        self.last_send_time = now
+
+########################################
+#
+#   sendSync
+#   posts a universe synchronization packet after the data packets
+#
+#########################################
+    def sendSync(self):
+        self.sync_sequence = (self.sync_sequence + 1) & 0xFF
+        self.sync_buffer[44] = self.sync_sequence
+        self.transmitter.post("sync", bytes(self.sync_buffer), [self.targetForUniverseNumber(self.sync_universe)])
+
+########################################
+#
+#   refreshDue
+#   returns seconds until a universe needs a keep-alive refresh
+#
+#########################################
+    def refreshDue(self):
+        oldest = min(self.last_sent[0:self.universes])
+        return oldest + self.refresh_interval - time.time()
+
+########################################
+#
+#   targetsForUniverse
+#   returns list of (ip, port) to send universe index u
+#
+#########################################
+    def targetsForUniverse(self, u):
+        return [self.targetForUniverseNumber(self.first_universe + u)]
+
+    def targetForUniverseNumber(self, universe):
+        if ( self.unicast_ip == None ):
+            return (SACNInterface.multicastAddress(universe), self.port())
+        return (self.unicast_ip, self.port())
+
+########################################
+#
+#   copyFrame copies a frame of one or more universes of 512 slots
+#   into the data packet buffers (send thread, lock held)
+#   a universe is marked as changed if its slots or its length are different
+#   each universe is sent with the slots of the frame that fall in it
+#   (at least one)
+#
+#########################################
+    def copyFrame(self, frame):
+        n = (len(frame)+511) // 512
+        if n > self.universes:
+            self.setUniverseCount(n)
+        d = SACNInterface.DATA_START
+        for u in range(self.universes):
+            s = u*512
+            count = max(0, min(512, len(frame)-s))
+            buffer = self.send_buffers[u]
+            if buffer[d:d+count] != frame[s:s+count]:
+                buffer[d:d+count] = frame[s:s+count]
+                self.changed[u] = True
+            length = max(1, count)
+            if length != count:
+                buffer[d] = 0
+            length = self.blankDroppedSlots(u, d, length)
+            if length != self.lengths[u]:
+                self.lengths[u] = length
+                self.setPacketLength(buffer, length)
+                self.changed[u] = True
+
+########################################
+#
+#   setPacketLength sets the lengths of the root, framing and DMP layers
+#   and the property value count of a data packet with slots slots
+#
+#   packet returns the data packet of universe index u for sending
+#
+#########################################
+    def setPacketLength(self, buffer, slots):
+        buffer[16:18] = (0x7000 | (110+slots)).to_bytes(2, 'big')  # root flags and length
+        buffer[38:40] = (0x7000 | (88+slots)).to_bytes(2, 'big')   # framing flags and length
+        buffer[115:117] = (0x7000 | (11+slots)).to_bytes(2, 'big') # DMP flags and length
+        buffer[123:125] = (1+slots).to_bytes(2, 'big')             # property value count
+
+    def packet(self, u):
+        return bytes(self.send_buffers[u][0:SACNInterface.DATA_START+self.lengths[u]])
+
+########################################
+#
+#   startListening joins the multicast group of each universe
+#   then registers with the reactor
+#   stopListening leaves the groups
+#
+#########################################
+    def startListening(self):
+        if self.ok and not self.listening:
+            for u in range(self.universes):
+                self.joinGroup(SACNInterface.multicastAddress(self.first_universe + u))
+            super().startListening()
+
+    def stopListening(self):
+        super().stopListening()
+        for sock, mreq in self.joined:
+            try:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_DROP_MEMBERSHIP, mreq)
+            except OSError:
+                pass
+        self.joined = []
+        for sock in self.join_sockets:
+            sock.close()
+        self.join_sockets = []
+
+#########################################
+#
+#   joinGroup joins a multicast group on the local interface
+#   Linux limits a socket to 20 groups (igmp_max_memberships).  Membership
+#   is per host, so when udpsocket is full, the group is joined with
+#   another socket that is never read and udpsocket still receives it.
+#
+#########################################
+    def joinGroup(self, group):
+        mreq = socket.inet_aton(group) + socket.inet_aton(self.localip)
+        for sock in [self.udpsocket] + self.join_sockets:
+            try:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+                self.joined.append((sock, mreq))
+                return
+            except OSError:
+                pass
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((self.localip, 0))
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+            self.join_sockets.append(sock)
+            self.joined.append((sock, mreq))
+        except OSError as e:
+            print ("sACN join ", group, e)
+
+#########################################
+#
+#   packetReceived decodes a data packet in place (self.data is a memoryview)
+#   and passes its slots, as a memoryview, to the input
+#   packets from this interface (same CID), preview data and
+#   start codes other than zero are ignored
+#   a stream terminated packet drops the source immediately
+#
+#########################################
+    def packetReceived(self):
+        buffer = self.data
+        n = len(buffer)
+        if ( self.input == None or n < SACNInterface.DATA_START ):
+            return
+        acnid, vector = SACNInterface.ROOT_HEADER.unpack_from(buffer, 4)
+        if ( acnid != SACNInterface.ACN_ID or vector != 0x00000004 ):
+            return                              # not E1.31 data (sync packets are not used)
+        cid = bytes(buffer[22:38])
+        if ( cid == self.cid ):
+            return
+        vector, name, priority, sequence, options, universe = SACNInterface.FRAMING_HEADER.unpack_from(buffer, 38)
+        u = universe - self.first_universe
+        if ( vector != 0x00000002 or u < 0 or u >= self.universes or (options & 0x80) != 0 ):
+            return
+        if ( options & 0x40 ):
+            self.input.dropSource(cid, u)
+            return
+        if ( buffer[117] != 0x02 or buffer[125] != 0 ):
+            return
+        count = ((buffer[123] << 8) | buffer[124]) - 1
+        count = min(count, 512, n - SACNInterface.DATA_START)
+        if ( count < 0 ):
+            return
+        sname = self.source_names.get(cid)
+        if ( sname == None ):
+            sname = name.split(b"\x00")[0].decode('utf-8', 'replace') + " (" + self.recdaddr[0] + ")"
+            self.source_names[cid] = sname
+        self.input.receivedDMX(cid, u, buffer[SACNInterface.DATA_START:SACNInterface.DATA_START+count],
+                               sequence, False, priority, SACNInterface.SOURCE_TIMEOUT, sname)
+
+########################################
+#
+#   close
+#   sends each universe three times with the Stream_Terminated option
+#   so that receivers release it immediately instead of waiting for a timeout
+#
+#########################################
+    def close(self):
+        self.stopSending()
+        if self.ok:
+            with self.lock:
+                for u in range(self.universes):
+                    self.send_buffers[u][112] = 0x40
+                    for i in range(3):
+                        self.updateCounter(u)
+                        self.transmitter.post(None, self.packet(u), self.targetsForUniverse(u))
+        super().close()
@@ -0,0 +1,112 @@
+#   fakewidget.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+#   FakeWidget stands in for an ENTTEC DMX USB Pro on a pseudo-terminal.
+#   DMXUSBProInterface opens FakeWidget.port as its serial port.
+#   The fake collects the messages the interface writes and can stream
+#   Received DMX (label 5) messages as a widget with a DMX input would.
+
+import os
+import pty
+import threading
+import time
+import tty
+
+RECEIVED_DMX = 5
+SEND_DMX = 6
+
+#####
+#     message returns a widget message with label and data
+#####
+
+def message(label, data):
+    return bytes([0x7E, label, len(data) & 0xFF, len(data) >> 8]) + bytes(data) + bytes([0xE7])
+
+#####
+#     receivedDMX returns a Received DMX message (status 0, start code 0) with slots
+#####
+
+def receivedDMX(slots, status=0):
+    return message(RECEIVED_DMX, bytes([status, 0]) + bytes(slots))
+
+class FakeWidget(object):
+
+    def __init__(self):
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.lock = threading.Lock()
+        self.messages = []              # (label, data) written by the interface
+        self.streamed = 0               # Received DMX messages written by stream
+        self.running = True
+        self.read_thread = threading.Thread(target=self.read)
+        self.read_thread.daemon = True
+        self.read_thread.start()
+
+    def write(self, data):
+        os.write(self.master, data)
+
+#####
+#     stream writes count Received DMX messages, rate per second
+#     (DMX at full rate is about 44 per second), rate 0 writes them back to back
+#####
+
+    def stream(self, count, rate=44.0):
+        for i in range(count):
+            self.write(receivedDMX(bytes([i & 0xFF]) * 512))
+            self.streamed += 1
+            if rate > 0:
+                time.sleep(1.0 / rate)
+
+    def messagesWithLabel(self, label):
+        with self.lock:
+            return [data for l, data in self.messages if l == label]
+
+    def waitForMessages(self, label, count, timeout=2.0):
+        end = time.time() + timeout
+        while len(self.messagesWithLabel(label)) < count and time.time() < end:
+            time.sleep(0.01)
+        return self.messagesWithLabel(label)
+
+#####
+#     read collects the messages written by the interface (reader thread)
+#####
+
+    def read(self):
+        buf = b""
+        while self.running:
+            try:
+                buf += os.read(self.master, 4096)
+            except OSError:
+                return
+            while True:
+                s = buf.find(b"\x7e")
+                if s < 0:
+                    buf = b""
+                    break
+                buf = buf[s:]
+                if len(buf) < 4:
+                    break
+                end = 4 + (buf[2] | (buf[3] << 8))
+                if len(buf) <= end:
+                    break
+                if buf[end] == 0xE7:
+                    with self.lock:
+                        self.messages.append((buf[1], buf[4:end]))
+                    buf = buf[end+1:]
+                else:
+                    buf = buf[1:]
+
+    def close(self):
+        self.running = False
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
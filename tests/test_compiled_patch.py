@@ -0,0 +1,59 @@
+#   test_compiled_patch.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+#   frames written through the compiled patch must be identical to
+#   LXPatchableAddress.dmxForLevel for every address
+
+import random
+
+import pytest
+
+import LXPatch
+from LXPatch import LXCompiledPatch
+
+CHANNELS = 300
+ADDRESSES = 1024
+OPTIONS = (0, 1, 2, 3, 7)           # 7 is not an option, the address stays off
+MASTERS = (1.0, 0.77, 0.5, 0.0)
+
+def randomPatch():
+    random.seed(2)
+    patch = LXPatch.LXPatch(CHANNELS, ADDRESSES)
+    patch.unpatchAll()
+    for address in random.sample(range(1, ADDRESSES+1), 900):
+        level = random.choice([1.0, 0.5, 0.0, random.uniform(0, 1)])
+        patch.patchAddressToChannel(address, random.randint(1, CHANNELS), level, random.choice(OPTIONS))
+    return patch
+
+def channelLevels():
+    levels = [random.uniform(0, 100) for i in range(CHANNELS)]
+    levels[0:4] = [0.0, 100.0, 50.0, 0.2]
+    return levels
+
+def expectedFrame(patch, levels, master):
+    frame = bytearray(ADDRESSES)
+    for i in range(CHANNELS):
+        for pa in patch.patch[i].list:
+            frame[pa.number] = pa.dmxForLevel(levels[i], master)
+    return frame
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_compiled_patch_matches_dmx_for_level(use_numpy, monkeypatch):
+    if use_numpy and LXPatch.numpy == None:
+        pytest.skip("numpy is not installed")
+    if not use_numpy:
+        monkeypatch.setattr(LXPatch, "numpy", None)
+    patch = randomPatch()
+    compiled = LXCompiledPatch(patch)
+    assert set(int(row) for row in compiled.row) == {0, 1, 2, 3, 4}       # every LUT row is used
+    for k in range(5):
+        levels = channelLevels()
+        for master in MASTERS:
+            frame = bytearray(ADDRESSES)
+            compiled.writeFrame(frame, levels, master)
+            assert frame == expectedFrame(patch, levels, master)
@@ -0,0 +1,61 @@
+#   test_fade_curves.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+import pytest
+
+from LXCuesAsciiParser import LXCuesAsciiParser
+from LXFadeCurve import LXFadeCurve
+
+@pytest.fixture(autouse=True)
+def noCustomCurves():
+    LXFadeCurve.removeCustomCurves()
+    yield
+    LXFadeCurve.removeCustomCurves()
+
+def showFile(tmp_path, name, curvedefs, enddata=True):
+    s = "Ident 3:0\nPatch 1 1<1@100\n\nCue 1.0\nUp 5\nDown 5\nChan 1@50\n"
+    s += "".join(d + "\n" for d in curvedefs)
+    if enddata:
+        s += "enddata\n"
+    path = tmp_path / name
+    path.write_text(s)
+    return str(path)
+
+def parse(path):
+    parser = LXCuesAsciiParser(16, 16, None)
+    message = parser.parseFile(path)
+    return parser, message
+
+def test_define_curve_rejects_bad_points():
+    assert not LXFadeCurve.defineCurve("bad", ["0", "x", "100"])
+    assert not LXFadeCurve.defineCurve("nan", ["0", "nan", "100"])
+    assert not LXFadeCurve.defineCurve("scurve", ["0", "100"])       # built-in
+    assert LXFadeCurve.curveNames() == ["linear", "exp", "log", "scurve"]
+    assert LXFadeCurve.defineCurve("mine", ["0", "20", "100"])
+    assert LXFadeCurve.curveNamed("mine").valueAt(0.5) == pytest.approx(0.2)
+
+def test_bad_curvedef_is_ignored(tmp_path):
+    parser, message = parse(showFile(tmp_path, "a.asc", ["$$curvedef bad 0 x 100", "$$curvedef good 0 50 100"]))
+    assert parser.success
+    assert "bad $$curvedef" in message
+    assert len(parser.cues.cues) == 1
+    assert [c.name for c in LXFadeCurve.customCurves()] == ["good"]
+
+def test_curves_do_not_leak_into_the_next_show(tmp_path):
+    parser, message = parse(showFile(tmp_path, "a.asc", ["$$curvedef first 0 10 100"]))
+    assert LXFadeCurve.curveNamed("first") != None
+    parser, message = parse(showFile(tmp_path, "b.asc", ["$$curvedef second 0 90 100"]))
+    assert parser.success
+    assert [c.name for c in LXFadeCurve.customCurves()] == ["second"]
+    assert "first" not in parser.cues.asciiString()
+
+def test_failed_parse_keeps_the_current_curves(tmp_path):
+    parse(showFile(tmp_path, "a.asc", ["$$curvedef first 0 10 100"]))
+    parser, message = parse(showFile(tmp_path, "b.asc", ["$$curvedef second 0 90 100"], enddata=False))
+    assert not parser.success
+    assert [c.name for c in LXFadeCurve.customCurves()] == ["first"]
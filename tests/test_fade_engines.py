@@ -0,0 +1,37 @@
+#   test_fade_engines.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+#   the numpy fade engine must compute exactly the levels of the list engine
+#   (bench/bench_fade.py measures their speed)
+
+import random
+
+import pytest
+
+from LXCues import LXCue, LXLiveCue, numpy
+
+def fadeStates(engine, channels=600):
+    random.seed(1)
+    livecue = LXLiveCue(channels, 512, engine)
+    a = LXCue(channels)
+    b = LXCue(channels)
+    for i in range(channels):
+        a.livestate[i] = random.uniform(0, 100)
+        b.livestate[i] = random.choice([0, random.uniform(0, 100)])
+    livecue.prepareFade(a)
+    livecue.fadeFrame(1.0, 1.0)
+    livecue.prepareFade(b)
+    states = []
+    for k in range(11):
+        livecue.fadeFrame(k/10.0, (k*0.07) % 1)
+        states.append([float(level) for level in livecue.livestate])
+    return states
+
+@pytest.mark.skipif(numpy == None, reason="numpy is not installed")
+def test_engines_match():
+    assert fadeStates("numpy") == fadeStates("list")
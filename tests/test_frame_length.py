@@ -0,0 +1,87 @@
+#   test_frame_length.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+#   frames are sent up to the highest patched address
+#   slots dropped when the frame shrinks must be sent as zero once
+
+import os
+import time
+
+import pytest
+
+from ArtNet import ArtNetInterface
+from sACN import SACNInterface
+
+def postedPackets(interface):
+    posted = []
+    interface.transmitter.post = lambda key, packet, targets: posted.append((key, packet))
+    return posted
+
+def sendFrame(interface, frame):
+    interface.setDMXValues(frame)
+    interface.sendDMXNow()
+
+def artDmxSlots(packet):
+    return packet[18:18+((packet[16] << 8) | packet[17])]
+
+def sacnSlots(packet):
+    return packet[126:126+int.from_bytes(packet[123:125], 'big')-1]
+
+@pytest.mark.parametrize("kind", ["artnet", "sacn"])
+def test_shrinking_frame_zeroes_dropped_slots(kind):
+    if kind == "artnet":
+        interface = ArtNetInterface("127.0.0.1", "127.0.0.2")
+        slots = artDmxSlots
+        data = lambda packets: [p for k, p in packets if p[9] == 0x50]
+    else:
+        interface = SACNInterface("127.0.0.1", "127.0.0.2")
+        slots = sacnSlots
+        data = lambda packets: [p for k, p in packets if len(p) > 126]
+    try:
+        posted = postedPackets(interface)
+        sendFrame(interface, bytes([255]) * 100)
+        assert bytes(slots(data(posted)[-1])) == bytes([255]) * 100
+        posted.clear()
+        sendFrame(interface, bytes([255]) * 10)         # addresses 11-100 unpatched
+        blank = data(posted)
+        assert len(blank) == 1
+        assert bytes(slots(blank[0])) == bytes([255]) * 10 + bytes(90)
+        assert posted[0][0] == None                     # not replaced by the next frame
+        posted.clear()
+        sendFrame(interface, bytes([255]) * 10)
+        assert bytes(slots(data(posted)[-1])) == bytes([255]) * 10
+        posted.clear()
+        sendFrame(interface, bytes([255]) * 10 + bytes(20))
+        sendFrame(interface, bytes([255]) * 10)         # dropped slots already zero, no blank frame
+        assert [len(slots(p)) for p in data(posted)] == [30, 10]
+    finally:
+        interface.close()
+
+def test_usb_pro_shrinking_frame_zeroes_dropped_slots():
+    pytest.importorskip("serial")
+    pty = pytest.importorskip("pty")
+    import tty
+    from DMXUSBPro import DMXUSBProInterface
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    interface = DMXUSBProInterface(os.ttyname(slave))
+    try:
+        received = []
+        for n in (100, 30, 30):
+            sendFrame(interface, bytes([255]) * n)
+            time.sleep(0.1)
+            received.append(os.read(master, 4096))
+        full, blank, short = received
+        assert full[2] | (full[3] << 8) == 101
+        assert blank[2] | (blank[3] << 8) == 101
+        assert blank[5:5+100] == bytes([255]) * 30 + bytes(70)
+        assert short[2] | (short[3] << 8) == 31
+    finally:
+        interface.close()
+        os.close(master)
+        os.close(slave)
@@ -0,0 +1,84 @@
+#   test_go_latency.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+#   GO during a fade, with other Python threads competing for the interpreter,
+#   must return at once and reach the output within a frame.
+#   Stopping the render and send threads must also take at most a frame.
+
+import threading
+import time
+
+import pytest
+
+from ArtNet import DMXInterface
+from LXCues import LXCues
+
+RATE = 44.0
+FRAME = 1.0 / RATE
+LOAD_THREADS = 1            # CPU-bound Python threads running during the test
+
+class TimedOutput(DMXInterface):
+
+    def __init__(self):
+        super().__init__()
+        self.go_time = None
+        self.latencies = []
+
+    def transmitFrame(self, refresh):
+        frame = self.frame.take()
+        if frame != None and self.go_time != None:
+            self.latencies.append(time.perf_counter() - self.go_time)
+            self.go_time = None
+        self.last_send_time = time.time()
+
+def load(stop):
+    x = 0
+    while not stop.is_set():
+        x += 1
+
+@pytest.mark.parametrize("engine", ["list", "numpy"])
+def test_go_during_fade_under_load(engine):
+    stop = threading.Event()
+    loaders = [threading.Thread(target=load, args=(stop,), daemon=True) for i in range(LOAD_THREADS)]
+    for t in loaders:
+        t.start()
+    cues = LXCues(4096, 512, engine)
+    output = TimedOutput()
+    cues.livecue.output = output
+    try:
+        for n in (1, 2):
+            q = cues.createCueForNumber(n)
+            q.setNewLevel(1, 50*n)
+            q.uptime = 5
+            q.downtime = 5
+        output.startSending()
+        cues.startRendering(RATE)
+        cues.startFadingToCue(cues.cues[0])
+        time.sleep(0.2)
+        returns = []
+        for i in range(20):
+            output.go_time = time.perf_counter()
+            t = time.perf_counter()
+            cues.startFadingToCue(cues.cues[i % 2])     # always during the 5 second fade
+            returns.append(time.perf_counter() - t)
+            time.sleep(0.05)
+        latencies = sorted(output.latencies)
+        assert len(latencies) >= 19
+        assert max(returns) < FRAME
+        assert latencies[len(latencies)//2] < FRAME / 2
+        assert latencies[-1] < FRAME
+    finally:
+        t = time.perf_counter()
+        output.stopSending()
+        stopsend = time.perf_counter() - t
+        t = time.perf_counter()
+        cues.stopRendering()
+        stoprender = time.perf_counter() - t
+        stop.set()
+    assert stopsend < FRAME
+    assert stoprender < FRAME
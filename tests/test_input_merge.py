@@ -0,0 +1,50 @@
+#   test_input_merge.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+import time
+
+from DMXInputMerge import DMXInputMerge
+
+def merged(merge):
+    merge.update(time.perf_counter())
+    return merge.frame[0]
+
+def test_highest_priority_sources_are_merged_htp():
+    merge = DMXInputMerge(1)
+    merge.receivedDMX("a", 0, bytes([10]), priority=100)
+    merge.receivedDMX("b", 0, bytes([20]), priority=100)
+    assert merged(merge) == 20
+    merge.receivedDMX("c", 0, bytes([5]), priority=150)
+    assert merged(merge) == 5
+
+def test_full_universe_rejects_equal_or_lower_priority():
+    merge = DMXInputMerge(1, max_sources=2)
+    merge.receivedDMX("a", 0, bytes([10]), priority=100)
+    merge.receivedDMX("b", 0, bytes([20]), priority=120)
+    assert not merge.receivedDMX("c", 0, bytes([30]), priority=100)
+    assert merge.rejected == 1
+    assert merged(merge) == 20
+
+def test_full_universe_replaces_lowest_priority_source():
+    merge = DMXInputMerge(1, max_sources=2)
+    merge.receivedDMX("a", 0, bytes([10]), priority=100)
+    merge.receivedDMX("b", 0, bytes([20]), priority=50)
+    merge.receivedDMX("c", 0, bytes([20]), priority=50)        # rejected, table is full
+    assert merge.receivedDMX("d", 0, bytes([40]), priority=200)
+    assert sorted(src.sourceid for src in merge.universe_sources[0]) == ["a", "d"]
+    assert merge.replaced == 1
+    assert merged(merge) == 40
+    assert "replaced 1" in merge.statsString()
+
+def test_stalest_of_the_lowest_priority_is_replaced():
+    merge = DMXInputMerge(1, max_sources=2)
+    merge.receivedDMX("a", 0, bytes([10]), priority=100)
+    merge.receivedDMX("b", 0, bytes([10]), priority=100)
+    merge.receivedDMX("a", 0, bytes([10]), priority=100)       # a is newer than b
+    assert merge.receivedDMX("c", 0, bytes([10]), priority=101)
+    assert sorted(src.sourceid for src in merge.universe_sources[0]) == ["a", "c"]
@@ -0,0 +1,89 @@
+#   test_osc_decoder.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+import struct
+
+import pytest
+
+from OSCListener import OSCListener
+
+#####
+#     oscString and oscMessage encode test messages
+#     args are (type tag, value) pairs, T F and N have no value
+#####
+
+def oscString(s):
+    b = s.encode('utf-8')
+    return b + bytes(4 - len(b) % 4)
+
+def oscMessage(address, *args):
+    data = b""
+    tags = ","
+    for tag, value in args:
+        tags += tag
+        if tag == "i":
+            data += struct.pack(">i", value)
+        elif tag == "f":
+            data += struct.pack(">f", value)
+        elif tag == "h":
+            data += struct.pack(">q", value)
+        elif tag == "d":
+            data += struct.pack(">d", value)
+        elif tag == "t":
+            data += struct.pack(">Q", value)
+        elif tag == "s":
+            data += oscString(value)
+        elif tag == "b":
+            data += struct.pack(">i", len(value)) + value + bytes((4 - len(value) % 4) % 4)
+    return oscString(address) + oscString(tags) + data
+
+def decode(listener, message):
+    data = bytearray(message)
+    return listener.decodeMessage(data, 0, len(data))
+
+@pytest.fixture
+def listener():
+    return OSCListener()
+
+def test_fixed_size_numbers(listener):
+    assert decode(listener, oscMessage("/1/dmx/0", ("f", 0.5))) == ("/1/dmx/0", [0.5])
+    assert decode(listener, oscMessage("/a", ("i", -7), ("h", -2**40), ("d", 2.25), ("t", 2**63+5))) == \
+        ("/a", [-7, -2**40, 2.25, 2**63+5])
+
+def test_strings_and_constants(listener):
+    assert decode(listener, oscMessage("/cmd", ("s", "hello"), ("T", None), ("F", None), ("N", None), ("s", "abcd"))) == \
+        ("/cmd", ["hello", True, False, None, "abcd"])
+
+def test_blob(listener):
+    address, args = decode(listener, oscMessage("/blob", ("i", 1), ("b", b"\x01\x02\x03"), ("h", 9)))
+    assert address == "/blob"
+    assert isinstance(args[1], memoryview)
+    assert [args[0], bytes(args[1]), args[2]] == [1, b"\x01\x02\x03", 9]
+
+def test_address_only(listener):
+    assert decode(listener, oscString("/go")) == ("/go", [])
+    assert decode(listener, oscMessage("/go")) == ("/go", [])
+
+@pytest.mark.parametrize("message", [
+    oscMessage("/a", ("i", 1))[:-2],                # truncated fixed size argument
+    oscMessage("/a", ("s", "text"), ("d", 1.0))[:-4],
+    oscMessage("/a", ("b", bytes(16)))[:-8],        # blob longer than the packet
+    oscMessage("/a", ("s", "unterminated"))[:-4],
+    oscString("/a") + b",ii",                       # type tags without a zero
+    oscMessage("/a", ("x", None)),                  # unknown type tag
+    b"junk",
+    b"/a",
+])
+def test_invalid_messages_return_none(listener, message):
+    assert decode(listener, message) == None
+
+def test_plans_are_bounded(listener):
+    for n in range(OSCListener.PLANS_SIZE * 3):
+        tags = [("i", 1) if (n >> b) & 1 else ("f", 1.0) for b in range(10)]
+        assert decode(listener, oscMessage("/a", *tags)) != None
+        assert len(listener.plans) <= OSCListener.PLANS_SIZE
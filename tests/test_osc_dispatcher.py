@@ -0,0 +1,55 @@
+#   test_osc_dispatcher.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+import pytest
+
+from OSCDispatcher import OSCDispatcher
+
+@pytest.fixture
+def dispatcher():
+    d = OSCDispatcher()
+    d.calls = []
+    for address in ("/cue/*/start", "/cmd.lxconsole/GO", "/cmd.lxconsole/STOP", "/cmd.lxconsole/*", "/1/dmx/*"):
+        d.register(address, lambda params, args, address=address: d.calls.append((address, params, args)))
+    return d
+
+def test_literal_parts_before_parameters(dispatcher):
+    assert dispatcher.dispatch("/cmd.lxconsole/GO", [1])
+    assert dispatcher.dispatch("/cmd.lxconsole/clear", [1])
+    assert dispatcher.dispatch("/cue/2.5/start", [])
+    assert dispatcher.calls == [
+        ("/cmd.lxconsole/GO", (), [1]),
+        ("/cmd.lxconsole/*", ("clear",), [1]),
+        ("/cue/*/start", ("2.5",), []),
+    ]
+
+def test_wildcards_match_literal_parts(dispatcher):
+    assert dispatcher.dispatch("/cmd.lxconsole/{GO,STOP}", [1])
+    assert dispatcher.dispatch("/[0-9]/dmx/7", [0.5])
+    assert dispatcher.calls[0:2] == [("/cmd.lxconsole/GO", (), [1]), ("/cmd.lxconsole/STOP", (), [1])]
+    assert dispatcher.calls[-1] == ("/1/dmx/*", ("7",), [0.5])
+
+def test_wildcards_reach_parameters(dispatcher):
+    assert dispatcher.dispatch("/cue/*/start", [])
+    assert dispatcher.calls == [("/cue/*/start", ("*",), [])]
+    dispatcher.calls.clear()
+    assert dispatcher.dispatch("/cmd.lxconsole/*", [1])
+    assert sorted(dispatcher.calls) == [
+        ("/cmd.lxconsole/*", ("*",), [1]),
+        ("/cmd.lxconsole/GO", (), [1]),
+        ("/cmd.lxconsole/STOP", (), [1]),
+    ]
+    dispatcher.calls.clear()
+    assert dispatcher.dispatch("/*/dmx/?", [0.5])
+    assert dispatcher.calls == [("/1/dmx/*", ("?",), [0.5])]
+
+def test_unmatched(dispatcher):
+    assert not dispatcher.dispatch("/cue/1/stop", [])
+    assert not dispatcher.dispatch("/cmd.lxconsole/[GO", [1])     # invalid pattern
+    assert dispatcher.unmatched == 2
+    assert dispatcher.calls == []
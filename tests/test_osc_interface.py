@@ -0,0 +1,42 @@
+#   test_osc_interface.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+import socket
+
+from LXCues import LXCues
+from LXCuesAsciiParser import LXCuesAsciiParser
+from OSC import OSCInterface
+
+def test_stop_sends_pending_and_closes_socket():
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.bind(("127.0.0.1", 0))
+    rx.settimeout(1)
+    osc = OSCInterface()
+    osc.sendOSC("127.0.0.1", rx.getsockname()[1], "/cue/1/start")
+    osc.stop()
+    assert rx.recvfrom(1024)[0] == OSCInterface.encodeMessage("/cue/1/start")
+    assert osc.udpsocket.fileno() == -1
+    osc.sendOSC("127.0.0.1", rx.getsockname()[1], "/cue/2/start")     # dropped
+    assert osc.transmitter.transmit_thread == None
+    assert len(osc.transmitter.errors) == 0
+    rx.close()
+
+def test_stopped_cues_close_their_socket():
+    cues = LXCues(16, 16)
+    cues.startRendering(44)
+    cues.stopRendering()
+    assert cues.oscinterface.udpsocket.fileno() == -1
+
+def test_failed_parse_cues_can_be_stopped(tmp_path):
+    path = tmp_path / "bad.asc"
+    path.write_text("CLEAR ALL\nCUE 1\nUP 5\n")       # no ENDDATA, fails
+    p = LXCuesAsciiParser(16, 16, None)
+    p.parseFile(str(path))
+    assert not p.success
+    p.cues.stopRendering()
+    assert p.cues.oscinterface.udpsocket.fileno() == -1
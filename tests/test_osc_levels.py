@@ -0,0 +1,71 @@
+#   test_osc_levels.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+import pytest
+
+from LXCues import LXCues
+from LXPatch import LXPatch
+
+ENGINES = ["list", "numpy"]
+
+def cuesWithOnePatch(engine, dimmers=512):
+    cues = LXCues(512, dimmers, engine)
+    patch = cues.livecue.patch
+    patch.unpatchAll()
+    for a in range(1, dimmers+1):
+        patch.patchAddressToChannel(a, (a-1) % 512 + 1)
+    return cues
+
+def test_channel_indexes_always_count_entries():
+    patch = LXPatch(512, 512)
+    assert patch.channelIndexesForDimmers(1, 3) == [0, 1, 2]
+    assert patch.channelIndexesForDimmers(511, 4) == [510, 511, -1, -1]
+    assert patch.channelIndexesForDimmers(-1, 4) == [-1, -1, 0, 1]
+    assert patch.channelIndexesForDimmers(-10, 2) == [-1, -1]
+    assert patch.channelIndexesForDimmers(1025, 10) == [-1] * 10
+    assert patch.channelIndexesForDimmers(513, 1) == [-1]
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_blob_and_float_blocks(engine):
+    cues = cuesWithOnePatch(engine)
+    livestate = cues.livecue.livestate
+    cues.receivedOSC("/0/dmx", [bytes([255, 0, 51])])
+    assert list(livestate[0:3]) == pytest.approx([100, 0, 20])
+    cues.receivedOSC("/0/dmx/510", [0.5, 0.25, 1.0])        # the last level is past the patch
+    assert list(livestate[510:512]) == pytest.approx([50, 25])
+    cues.receivedOSC("/channel/5", [0.1, 0.2])
+    assert list(livestate[4:6]) == pytest.approx([10, 20])
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("address, args", [
+    ("/2/dmx", [bytes(10)]),            # universe past the patch
+    ("/1/dmx", [bytes([255]) * 10]),
+    ("/-1/dmx/0", [0.5, 0.5]),          # negative universe
+    ("/0/dmx/-3", [0.5, 0.5]),          # negative slot
+    ("/x/dmx", [0.5, 0.5]),
+    ("/channel/0", [0.5, 0.5]),
+    ("/channel/513", [bytes(4)]),
+])
+def test_out_of_range_blocks_are_ignored(engine, address, args):
+    cues = cuesWithOnePatch(engine)
+    cues.receivedOSC(address, args)
+    assert max(cues.livecue.livestate) == 0
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("address, args", [
+    ("/0/dmx/4", [True]),               # T decodes to bool, which is an int
+    ("/0/dmx/4", ["full"]),
+    ("/0/dmx/4", [0.5, False]),
+    ("/channel/5", ["full", 0.5]),
+    ("/channel/5", [True, True]),
+])
+def test_non_level_arguments_are_ignored(engine, address, args):
+    cues = cuesWithOnePatch(engine)
+    cues.receivedOSC("/0/dmx/4", [0.3])
+    cues.receivedOSC(address, args)
+    assert list(cues.livecue.livestate[4:6]) == pytest.approx([30, 0])
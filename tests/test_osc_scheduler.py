@@ -0,0 +1,88 @@
+#   test_osc_scheduler.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+import resource
+import time
+
+from LXRenderLoop import LXRenderLoop
+from OSCListener import OSCScheduler
+
+def timetagIn(seconds):
+    t = time.time() + seconds + OSCScheduler.NTP_OFFSET
+    return (int(t) << 32) | int((t % 1) * 4294967296)
+
+def cpuTime():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+class Target(object):
+
+    def __init__(self):
+        self.received = []
+        self.scheduler = None
+
+    def renderFrame(self, now):
+        self.scheduler.dispatchDue(time.perf_counter())
+
+    def receivedOSC(self, addressPattern, args):
+        self.received.append((addressPattern, time.perf_counter()))
+
+def test_immediate_group_wakes_once_until_dispatched():
+    wakes = []
+    target = Target()
+    scheduler = OSCScheduler(target, lambda: wakes.append(1))
+    scheduler.post(OSCScheduler.IMMEDIATE, [("/a", [])])
+    scheduler.post(OSCScheduler.IMMEDIATE, [("/b", [])])
+    assert len(wakes) == 1
+    scheduler.dispatchDue(time.perf_counter())
+    assert [a for a, t in target.received] == ["/a", "/b"]
+    scheduler.post(OSCScheduler.IMMEDIATE, [("/c", [])])
+    assert len(wakes) == 2
+
+def renderingTarget(rate):
+    target = Target()
+    loop = LXRenderLoop(target, rate)
+    target.scheduler = OSCScheduler(target, loop.wake)
+    loop.start()
+    time.sleep(0.05)
+    return target, loop
+
+def test_immediate_group_is_not_held_for_the_next_frame():
+    target, loop = renderingTarget(2.0)         # 500 ms between frames
+    try:
+        posted = time.perf_counter()
+        target.scheduler.post(OSCScheduler.IMMEDIATE, [("/now", [])])
+        time.sleep(0.1)
+        assert len(target.received) == 1
+        assert target.received[0][1] - posted < 0.05
+    finally:
+        loop.stop()
+        target.scheduler.stop()
+
+def test_future_group_is_dispatched_at_its_time():
+    target, loop = renderingTarget(2.0)
+    try:
+        due = time.perf_counter() + 0.2
+        target.scheduler.post(timetagIn(0.2), [("/later", [])])
+        time.sleep(0.3)
+        assert len(target.received) == 1
+        assert abs(target.received[0][1] - due) < 0.02
+    finally:
+        loop.stop()
+        target.scheduler.stop()
+
+def test_timer_waits_without_spinning():
+    target = Target()
+    scheduler = OSCScheduler(target, lambda: None)      # the woken group is never dispatched
+    try:
+        scheduler.post(timetagIn(0.3), [("/x", [])])
+        start = cpuTime()
+        time.sleep(0.8)
+        assert cpuTime() - start < 0.005
+    finally:
+        scheduler.stop()
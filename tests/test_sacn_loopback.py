@@ -0,0 +1,92 @@
+#   test_sacn_loopback.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+#
+#   sends sACN to multicast groups on the loopback interface
+#   and checks the received E1.31 packets
+
+import socket
+import struct
+
+import pytest
+
+from sACN import SACNInterface
+
+SYNC_UNIVERSE = 0x3039
+
+@pytest.fixture
+def receiver():
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    rx.bind(("", 5568))
+    try:
+        for u in (1, 2, SYNC_UNIVERSE):
+            mreq = struct.pack("4s4s", socket.inet_aton(SACNInterface.multicastAddress(u)), socket.inet_aton("127.0.0.1"))
+            rx.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    except OSError as e:
+        rx.close()
+        pytest.skip("no multicast on the loopback interface " + str(e))
+    rx.settimeout(1.0)
+    yield rx
+    rx.close()
+
+def receive(rx, count):
+    packets = []
+    try:
+        while len(packets) < count:
+            packets.append(rx.recv(2048))
+    except socket.timeout:
+        pass
+    return packets
+
+def field(packet, start, end):
+    return int.from_bytes(packet[start:end], 'big')
+
+def test_data_and_sync_packets(receiver):
+    sender = SACNInterface("127.0.0.1", "multicast", 1, 2, 150, SYNC_UNIVERSE)
+    try:
+        frame = bytearray(600)
+        for n in range(3):
+            frame[0] = n + 1
+            frame[599] = 200 + n
+            sender.setDMXValues(frame)
+            sender.sendDMXNow()
+            packets = receive(receiver, 3)
+            data = {field(p, 113, 115): p for p in packets if field(p, 18, 22) == 4}
+            sync = [p for p in packets if field(p, 18, 22) == 8]
+            assert sorted(data.keys()) == [1, 2]
+            assert len(sync) == 1
+            for universe, slots in ((1, 512), (2, 88)):
+                p = data[universe]
+                assert len(p) == 126 + slots
+                assert field(p, 0, 2) == 0x0010 and field(p, 2, 4) == 0
+                assert p[4:16] == SACNInterface.ACN_ID
+                assert field(p, 16, 18) == 0x7000 | (110 + slots)
+                assert p[22:38] == sender.cid
+                assert field(p, 38, 40) == 0x7000 | (88 + slots)
+                assert field(p, 40, 44) == 2
+                assert p[44:53] == b"LXConsole"
+                assert p[108] == 150
+                assert field(p, 109, 111) == SYNC_UNIVERSE
+                assert p[111] == n + 1                  # sequence of this universe
+                assert p[112] == 0
+                assert field(p, 115, 117) == 0x7000 | (11 + slots)
+                assert p[117] == 0x02 and p[118] == 0xA1
+                assert field(p, 119, 121) == 0 and field(p, 121, 123) == 1
+                assert field(p, 123, 125) == 1 + slots
+                assert p[125] == 0                      # start code
+            assert data[1][126] == n + 1
+            assert data[2][126+87] == 200 + n
+            s = sync[0]
+            assert len(s) == 49
+            assert field(s, 40, 44) == 1
+            assert s[44] == n + 1
+            assert field(s, 45, 47) == SYNC_UNIVERSE
+        sender.sendDMXNow()                             # unchanged, nothing is sent
+        assert receive(receiver, 1) == []
+    finally:
+        sender.close()
@@ -0,0 +1,111 @@
+#   test_usb_pro_input.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+import time
+
+import pytest
+
+pytest.importorskip("serial")
+pytest.importorskip("pty")              # the fake widget needs a pseudo-terminal
+
+from DMXInputMerge import DMXInputMerge
+from DMXUSBPro import DMXUSBProInterface, DMXUSBProParser
+from fakewidget import FakeWidget, message, receivedDMX, RECEIVED_DMX
+
+def parsed(chunks):
+    messages = []
+    parser = DMXUSBProParser(lambda label, data: messages.append((label, bytes(data))))
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser, messages
+
+def frames(count):
+    return [bytes([i]) * 512 for i in range(count)]
+
+def test_split_messages():
+    stream = b"".join(receivedDMX(f) for f in frames(3))
+    for size in (1, 3, 7, 515, 600):
+        parser, messages = parsed(stream[i:i+size] for i in range(0, len(stream), size))
+        assert messages == [(RECEIVED_DMX, bytes(2) + f) for f in frames(3)]
+        assert parser.resyncs == 0
+        assert len(parser.buffer) == 0
+
+def test_partial_message_is_kept():
+    m = receivedDMX(bytes([9]) * 512)
+    parser, messages = parsed([m[0:3], m[3:100]])
+    assert messages == []
+    assert len(parser.buffer) == 100
+    parser.feed(m[100:])
+    assert messages == [(RECEIVED_DMX, bytes(2) + bytes([9]) * 512)]
+
+def test_garbage_prefix():
+    m = receivedDMX(bytes([7]) * 512)
+    parser, messages = parsed([b"\x00\x12\xE7\x33" + m])
+    assert messages == [(RECEIVED_DMX, bytes(2) + bytes([7]) * 512)]
+    assert parser.resyncs == 1
+
+def test_false_start_resynchronizes():
+    good = receivedDMX(bytes([5]) * 512)
+    toolong = bytes([0x7E, RECEIVED_DMX, 0xFF, 0xFF])        # length past MAX_DATA
+    badend = message(RECEIVED_DMX, bytes([0, 0, 1, 2]))[:-1] + b"\x00"
+    parser, messages = parsed([toolong + good, badend + good])
+    assert messages == [(RECEIVED_DMX, bytes(2) + bytes([5]) * 512)] * 2
+    assert parser.resyncs == 2
+
+def test_back_to_back_messages():
+    parser, messages = parsed([b"".join(receivedDMX(f) for f in frames(50))])
+    assert [data[2:] for label, data in messages] == frames(50)
+    assert parser.messages == 50
+
+@pytest.fixture
+def widget():
+    fake = FakeWidget()
+    yield fake
+    fake.close()
+
+def listeningInterface(widget):
+    interface = DMXUSBProInterface(widget.port)
+    interface.input = DMXInputMerge(1)
+    interface.startListening()
+    return interface
+
+def test_receive_mode_is_requested(widget):
+    interface = listeningInterface(widget)
+    try:
+        assert widget.waitForMessages(8, 1) == [bytes([0])]
+    finally:
+        interface.close()
+
+@pytest.mark.parametrize("rate", [44.0, 0])
+def test_fake_widget_streams_into_merge(widget, rate):
+    interface = listeningInterface(widget)
+    try:
+        count = 88 if rate > 0 else 500
+        widget.stream(count, rate)
+        end = time.time() + 2
+        while interface.input_packets < count and time.time() < end:
+            time.sleep(0.01)
+        assert interface.input_packets == count
+        assert interface.parser.resyncs == 0
+        merge = interface.input
+        merge.update(time.perf_counter())
+        assert merge.frame[0:512] == bytes([(count-1) & 0xFF]) * 512
+    finally:
+        interface.close()
+
+def test_bad_status_is_counted(widget):
+    interface = listeningInterface(widget)
+    try:
+        widget.write(receivedDMX(bytes(512), status=1) + receivedDMX(bytes([3]) * 512))
+        end = time.time() + 2
+        while interface.input_packets < 1 and time.time() < end:
+            time.sleep(0.01)
+        assert interface.input_errors == 1
+        assert interface.input_packets == 1
+    finally:
+        interface.close()
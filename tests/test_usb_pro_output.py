@@ -0,0 +1,118 @@
+#   test_usb_pro_output.py
+#
+#   by Claude Heintz
+#   copyright 2024 by Claude Heintz Design
+#
+#  see license included with this distribution or
+#  https://www.claudeheintzdesign.com/lx/opensource.html
+
+import time
+
+import pytest
+
+pytest.importorskip("serial")
+pytest.importorskip("pty")              # the fake widget needs a pseudo-terminal
+
+import DMXUSBPro
+from DMXUSBPro import DMXUSBProInterface
+from fakewidget import FakeWidget, SEND_DMX
+
+#####
+#     FakeSerial replaces serial.Serial, each write takes write_time seconds
+#     and the first fail_writes writes raise as if the device was unplugged
+#####
+
+class FakeSerial(object):
+
+    instances = []
+    write_time = 0.0
+    fail_writes = 0
+
+    def __init__(self, port, baudrate, **kwargs):
+        self.port = port
+        self.writes = []
+        self.in_waiting = 0
+        FakeSerial.instances.append(self)
+
+    def write(self, data):
+        if FakeSerial.fail_writes > 0:
+            FakeSerial.fail_writes -= 1
+            raise OSError("device disconnected")
+        time.sleep(FakeSerial.write_time)
+        self.writes.append(bytes(data))
+        return len(data)
+
+    def read(self, n):
+        time.sleep(0.01)
+        return b""
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def fakeserial(monkeypatch):
+    FakeSerial.instances = []
+    FakeSerial.write_time = 0.0
+    FakeSerial.fail_writes = 0
+    monkeypatch.setattr(DMXUSBPro.serial, "Serial", FakeSerial)
+    return FakeSerial
+
+def waitFor(condition, timeout=2.0):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.005)
+    return condition()
+
+def test_frame_packing_on_pty():
+    widget = FakeWidget()
+    interface = DMXUSBProInterface(widget.port)
+    try:
+        interface.setDMXValues(bytes(range(256)) * 2)
+        interface.sendDMXNow()
+        sent = widget.waitForMessages(SEND_DMX, 1)
+        assert sent[-1] == bytes([0]) + bytes(range(256)) * 2       # start code and 512 slots
+        interface.setDMXValues(bytes(512))
+        interface.sendDMXNow()
+        assert waitFor(lambda: widget.messagesWithLabel(SEND_DMX)[-1] == bytes(513))
+        interface.setDMXValues(bytes([1]) * 10)                     # shorter than MIN_SLOTS
+        interface.sendDMXNow()
+        assert waitFor(lambda: widget.messagesWithLabel(SEND_DMX)[-1] == bytes([0]) + bytes([1]) * 10 + bytes(14))
+    finally:
+        interface.close()
+        widget.close()
+
+def test_slow_writes_never_block_the_caller(fakeserial):
+    fakeserial.write_time = 0.02
+    interface = DMXUSBProInterface("fake")
+    try:
+        handoff = []
+        for i in range(50):
+            t = time.perf_counter()
+            interface.setDMXValues(bytes([i]) * 512)
+            interface.sendDMXNow()
+            handoff.append(time.perf_counter() - t)
+            time.sleep(0.002)
+        widget = fakeserial.instances[-1]
+        assert waitFor(lambda: len(widget.writes) > 0 and widget.writes[-1][5] == 49)
+        assert max(handoff) < 0.005
+        assert len(widget.writes) < 25                  # older frames were replaced, not queued
+        assert interface.write_max >= 0.02
+        assert "write avg" in interface.statsString()
+    finally:
+        interface.close()
+
+def test_reconnect_after_write_error(fakeserial, monkeypatch):
+    monkeypatch.setattr(DMXUSBProInterface, "RECONNECT_INTERVAL", 0.05)
+    interface = DMXUSBProInterface("fake")
+    try:
+        fakeserial.fail_writes = 1
+        interface.setDMXValues(bytes([1]) * 512)
+        interface.sendDMXNow()
+        assert waitFor(lambda: interface.write_errors == 1)
+        interface.setDMXValues(bytes([2]) * 512)
+        interface.sendDMXNow()
+        assert waitFor(lambda: interface.reconnects == 1 and len(fakeserial.instances[-1].writes) > 0)
+        assert len(fakeserial.instances) == 2
+        assert fakeserial.instances[-1].writes[-1][5] == 2
+    finally:
+        interface.close()